@@ -0,0 +1,239 @@
+"""Simulated annealing over block positions and rotations, as an
+alternative to the CP-SAT model.
+
+Every state is a legal layout: a move that would leave the grid or overlap
+something is rejected outright, using the occupancy grid of a
+construct.Placer as the spatial index. A move is scored by rescoring only
+the connections touching the blocks it moved, each with its cheapest ports.
+"""
+
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from construct import Placer, connection_ports, construct_layout
+from evaluate import verify_layout
+from main import ConnectionIndex
+from spec import is_fixed
+
+
+def _move(placer, rng, names, step):
+    """Propose a move and return [(name, new position)], or None."""
+    kind = rng.random()
+    name = rng.choice(names)
+    x, y, is_rotated = placer.layout[name]
+    if kind < 0.6:
+        return [(name, (x + rng.randint(-step, step), y + rng.randint(-step, step), is_rotated))]
+    if kind < 0.75 and len(placer.rotations(name)) > 1:
+        # turn about the middle
+        width, height = placer.footprint(name, is_rotated)
+        return [(name, (x + (width - height) // 2, y + (height - width) // 2, not is_rotated))]
+    if kind < 0.9:
+        # next to a neighbour, wherever it is
+        others = [end[0] for end in placer.ends[name]]
+        if not others:
+            return None
+        other_x, other_y, other_rotated = placer.layout[rng.choice(others)]
+        width, height = placer.footprint(name, is_rotated)
+        return [(name, (other_x + rng.randint(-width, width), other_y + rng.randint(-height, height), is_rotated))]
+    other = rng.choice(names)
+    if other == name:
+        return None
+    other_x, other_y, other_rotated = placer.layout[other]
+    return [(name, (other_x, other_y, is_rotated)), (other, (x, y, other_rotated))]
+
+
+def _apply(placer, moves):
+    """Make moves if the blocks fit there. Returns the old positions, or
+    None (changing nothing) if they don't fit."""
+    old = [(name, placer.layout[name]) for name, _ in moves]
+    for name, _ in moves:
+        placer.mark(name, -1)
+    placed = []
+    for name, position in moves:
+        if not placer.fits(name, position):
+            break
+        placer.layout[name] = position
+        placer.mark(name, 1)
+        placed.append(name)
+    else:
+        return old
+    for name in placed:
+        placer.mark(name, -1)
+    for name, position in old:
+        placer.layout[name] = position
+        placer.mark(name, 1)
+    return None
+
+
+def _cost(placer, names):
+    """Weighted distance of every connection touching names, each counted
+    once."""
+    names = set(names)
+    total = 0
+    for name in names:
+        for other, own_ports, other_ports, weight in placer.ends[name]:
+            if other in names and other < name:
+                continue
+            starts = placer.ports(name, own_ports)
+            ends = placer.ports(other, other_ports)
+            total += weight * min(abs(sx - ex) + abs(sy - ey) for sx, sy in starts for ex, ey in ends)
+    return total
+
+
+def _place_hint(placer, names, hint_positions):
+    """Place names where hint_positions has them, if they fit there, and
+    the rest wherever Placer.best_spot says. A stored hint can predate a
+    mask or a resized block. Returns False, with nothing placed, if some
+    block fits nowhere."""
+    misplaced = []
+    for name in names:
+        position = hint_positions.get(name)
+        if position is not None:
+            position = (int(position[0]), int(position[1]), bool(position[2]))
+        if position is None or (position[2] and not placer.allow_rotation) or not placer.fits(name, position):
+            misplaced.append(name)
+            continue
+        placer.layout[name] = position
+        placer.mark(name, 1)
+    for name in misplaced:
+        spot = placer.best_spot(name)
+        if spot is None:
+            for placed in names:
+                if placed in placer.layout:
+                    placer.mark(placed, -1)
+                    del placer.layout[placed]
+            return False
+        placer.layout[name] = spot[1]
+        placer.mark(name, 1)
+    return True
+
+
+def anneal_layout(blocks, connections, grid_size, max_time, allow_rotation=True, seed=None, hint_positions=None,
+                  obstacles=None, start_temperature=None, end_temperature=0.5):
+    """Anneal a layout for max_time seconds, starting from hint_positions
+    (blocks that are missing from it or don't fit where it says placed
+    greedily) or else construct.construct_layout.
+
+    The temperature falls geometrically with elapsed time from
+    start_temperature (by default the mean uphill move of a short random
+    walk) to end_temperature, and so does the size of a random shift.
+    Returns a dict like lns.run_lns, or None if there's no starting layout.
+    """
+    started = time.monotonic()
+    rng = random.Random(seed)
+    index = ConnectionIndex(blocks, connections)
+    placer = Placer(blocks, index, grid_size, allow_rotation, obstacles)
+    names = [name for name, block_info in blocks.items() if not is_fixed(block_info)]
+    if not (hint_positions and _place_hint(placer, names, hint_positions)):
+        constructed = construct_layout(blocks, index, grid_size, allow_rotation, obstacles, time_limit=0,
+                                       greedy_time=max_time)
+        if constructed is None:
+            return None
+        for name in names:
+            placer.layout[name] = constructed[0][name]
+            placer.mark(name, 1)
+    if not names:
+        max_time = 0
+
+    cost = _cost(placer, placer.layout)
+    best_cost, best_layout = cost, dict(placer.layout)
+    history = [(time.monotonic() - started, cost)]
+    max_step = max(grid_size) // 4
+
+    if start_temperature is None:
+        uphill = []
+        for _ in range(200):
+            moves = _move(placer, rng, names, max_step) if names else None
+            if not moves:
+                continue
+            moved = [name for name, _ in moves]
+            before = _cost(placer, moved)
+            old = _apply(placer, moves)
+            if old is not None:
+                delta = _cost(placer, moved) - before
+                if delta > 0:
+                    uphill.append(delta)
+                _apply(placer, old)
+        start_temperature = sum(uphill) / len(uphill) if uphill else 10
+    start_temperature = max(start_temperature, end_temperature)
+
+    moves_tried = accepted = 0
+    deadline = started + max_time
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        progress = (now - started) / max_time
+        temperature = start_temperature * (end_temperature / start_temperature) ** progress
+        step = max(1, int(max_step * (1 - progress) ** 2))
+        for _ in range(100):
+            moves = _move(placer, rng, names, step)
+            if not moves:
+                continue
+            moves_tried += 1
+            moved = [name for name, _ in moves]
+            before = _cost(placer, moved)
+            old = _apply(placer, moves)
+            if old is None:
+                continue
+            delta = _cost(placer, moved) - before
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                cost += delta
+                accepted += 1
+                if cost < best_cost:
+                    best_cost, best_layout = cost, dict(placer.layout)
+                    history.append((time.monotonic() - started, cost))
+            else:
+                _apply(placer, old)
+
+    return _result(blocks, connections, grid_size, best_layout, history, moves_tried, accepted, obstacles)
+
+
+def _result(blocks, connections, grid_size, layout, history, moves_tried, accepted, obstacles):
+    index = ConnectionIndex(blocks, connections)
+    distance = 0
+    ports = {}
+    chosen_connections = []
+    for (name1, name2, _, _, weight), (start_pos, end_pos, start, end) in zip(
+            index.connections, connection_ports(blocks, index, layout)):
+        distance += weight * (abs(start[0] - end[0]) + abs(start[1] - end[1]))
+        ports.setdefault((name1, name2), (start_pos, end_pos))
+        chosen_connections.append({"start_x": start[0], "start_y": start[1], "end_x": end[0], "end_y": end[1]})
+    problems = verify_layout(blocks, connections, grid_size, layout, obstacles=obstacles)
+    if problems:
+        raise ValueError(f"annealed layout isn't legal: {problems}")
+    return {
+        "positions": layout,
+        "distance": distance,
+        "ports": ports,
+        "chosen_connections": chosen_connections,
+        "history": history,
+        "moves": moves_tried,
+        "accepted": accepted,
+    }
+
+
+def _anneal_worker(args):
+    seed, blocks, connections, grid_size, max_time, kwargs = args
+    return anneal_layout(blocks, connections, grid_size, max_time, seed=seed, **kwargs)
+
+
+def run_anneal(blocks, connections, grid_size, max_time, workers=None, seed=None, **kwargs):
+    """Run one annealer per core (or workers of them), each with its own
+    seed, in separate processes, and return the best result."""
+    workers = workers or os.cpu_count()
+    seed = random.randint(0, 10000) if seed is None else seed
+    jobs = [(seed + i, blocks, connections, grid_size, max_time, kwargs) for i in range(workers)]
+    if workers == 1:
+        results = [_anneal_worker(jobs[0])]
+    else:
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            results = pool.map(_anneal_worker, jobs)
+    results = [result for result in results if result is not None]
+    for i, result in enumerate(results):
+        print(f"annealer {i}: distance {result['distance']} after {result['moves']} moves "
+              f"({result['accepted']} accepted)")
+    return min(results, key=lambda result: result["distance"], default=None)
@@ -0,0 +1,34 @@
+from anneal import anneal_layout, run_anneal
+from construct import construct_layout
+from main import ConnectionIndex
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+
+
+def test_anneal_layout():
+    index = ConnectionIndex(test_blocks, test_connections)
+    start, _, start_distance = construct_layout(test_blocks, index, test_grid_size, time_limit=0)
+    best = anneal_layout(test_blocks, test_connections, test_grid_size, 1, seed=1, hint_positions=start)
+    assert_valid_layout(test_blocks, best["positions"], test_grid_size)
+    assert best["positions"]["Coal Mine"] == (0, 0, False)
+    assert best["moves"] > 0
+    # the incrementally tracked cost agrees with scoring the layout afresh
+    assert best["history"][0][1] == start_distance
+    assert best["history"][-1][1] == best["distance"] <= start_distance
+
+
+
+def test_anneal_layout_moves_hinted_blocks_off_a_mask():
+    index = ConnectionIndex(test_blocks, test_connections)
+    start, _, _ = construct_layout(test_blocks, index, test_grid_size, time_limit=0)
+    x, y, _ = start["Red Science"]
+    mask = [(x, y, 1, 1)]
+    best = anneal_layout(test_blocks, test_connections, test_grid_size, 0, seed=1, hint_positions=start,
+                         obstacles=mask)
+    assert best is not None
+    assert_valid_layout(test_blocks, best["positions"], test_grid_size)
+    assert best["positions"]["Red Science"][:2] != (x, y)
+
+def test_run_anneal():
+    best = run_anneal(test_blocks, test_connections, test_grid_size, 0.5, workers=1, seed=2)
+    assert_valid_layout(test_blocks, best["positions"], test_grid_size)
+    assert len(best["chosen_connections"]) == 3
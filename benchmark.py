@@ -0,0 +1,224 @@
+"""Benchmarks for optimize_factory_layout, and a comparison of two runs of
+them that flags regressions.
+
+    python benchmark.py run --out before.json
+    (change the encoding)
+    python benchmark.py run --out after.json
+    python benchmark.py compare before.json after.json
+
+Each instance and seed is solved in a fresh process, so peak RSS is that
+solve's alone. A result records the model build time and size, the solver
+time to the first layout, the best objective at each checkpoint, and the
+final objective, bound, gap and status.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+import factorio
+from generate import generate_spec
+from main import OVERLAP_MODES, optimize_factory_layout
+from report import BuildReport
+from spec import Block, Connection, is_fixed, unpack_connection
+
+CHECKPOINTS = (5, 15, 60)
+
+
+def tile_spec(blocks, connections, grid_size, copies):
+    """A bigger spec: copies of blocks side by side on a grid copies times
+    as wide, the blocks of copy k named "<name> #k" and fixed blocks moved
+    along with their copy."""
+    tiled_blocks, tiled_connections = {}, []
+    for k in range(copies):
+        for name, block_info in blocks.items():
+            if is_fixed(block_info):
+                block_info = Block(block_info.width, block_info.height, block_info.weight,
+                                   block_info.fixed_x + k * grid_size[0], block_info.fixed_y, block_info.rotated)
+            tiled_blocks[f"{name} #{k}"] = block_info
+        for conn in connections:
+            name1, name2, pos1, pos2, weight = unpack_connection(conn)
+            if name1 in blocks and name2 in blocks:
+                tiled = Connection(f"{name1} #{k}", f"{name2} #{k}", pos1, pos2)
+                tiled.weight = weight
+                tiled_connections.append(tiled)
+    return tiled_blocks, tiled_connections, (grid_size[0] * copies, grid_size[1])
+
+
+INSTANCES = {
+    "rocket": lambda: (factorio.rocket_blocks, factorio.connections, factorio.grid_size),
+    "base": lambda: (factorio.blocks, factorio.connections, factorio.grid_size),
+    "everything": lambda: (factorio.everything_blocks, factorio.connections, factorio.grid_size),
+    "base-x2": lambda: tile_spec(factorio.blocks, factorio.connections, factorio.grid_size, 2),
+    "synthetic-50": lambda: generate_spec(50, seed=0),
+    "synthetic-200": lambda: generate_spec(200, seed=0),
+}
+
+
+def objective_at(history, seconds):
+    """Best objective found by seconds of solver time, or None."""
+    found = [objective for wall_time, objective, _ in history if wall_time <= seconds]
+    return min(found) if found else None
+
+
+def _peak_rss_mb():
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_instance(name, spec, seed, max_time, checkpoints=CHECKPOINTS, **kwargs):
+    """Solve spec, a (blocks, connections, grid size), once and measure it.
+    kwargs go to optimize_factory_layout."""
+    blocks, connections, grid_size = spec
+    report = BuildReport()
+    started = time.perf_counter()
+    optimize_factory_layout(blocks, connections, grid_size, max_time, report=report, seed=seed,
+                            log_search=False, **kwargs)
+    solve = report.extra["solve"]
+    objective, bound = solve["objective"], solve["best_bound"]
+    history = solve["history"]
+    totals = report.to_dict()["totals"]
+    return {
+        "instance": name,
+        "seed": seed,
+        "max_time": max_time,
+        "build_seconds": report.build_seconds(),
+        "total_seconds": time.perf_counter() - started,
+        "variables": totals.get("int_vars", 0) + totals.get("bool_vars", 0) + totals.get("constants", 0),
+        "constraints": totals.get("constraints", 0),
+        "first_solution_seconds": history[0][0] if history else None,
+        "checkpoints": {str(seconds): objective_at(history, seconds) if seconds <= max_time else None
+                        for seconds in checkpoints},
+        "objective": objective,
+        "best_bound": bound,
+        "gap": (objective - bound) / objective if objective else None,
+        "status": solve["status"],
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _run_worker(args):
+    name, spec, seed, max_time, checkpoints, kwargs = args
+    if spec is None:
+        spec = INSTANCES[name]()
+    return run_instance(name, spec, seed, max_time, checkpoints, **kwargs)
+
+
+def run_benchmarks(names, seeds, max_time, checkpoints=CHECKPOINTS, specs=None, **kwargs):
+    """Run every instance in names (keys of INSTANCES, or of specs, a dict of
+    extra (blocks, connections, grid size)) with every seed, one fresh
+    process each. Returns the results, ready to dump as JSON."""
+    specs = specs or {}
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name in names:
+        for seed in seeds:
+            # maxtasksperchild=1 and a pool per job: a new process, so its
+            # peak RSS is its own
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                result = pool.apply(_run_worker, ((name, specs.get(name), seed, max_time, checkpoints, kwargs),))
+            print(f"{name} seed {seed}: objective {result['objective']}, gap {_percent(result['gap'])}, "
+                  f"first layout after {result['first_solution_seconds'] or 0:.1f}s, build {result['build_seconds']:.1f}s, "
+                  f"peak {result['peak_rss_mb']:.0f} MB")
+            results.append(result)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "max_time": max_time,
+        "options": kwargs,
+        "results": results,
+    }
+
+
+def _percent(value):
+    return "-" if value is None else f"{value:.1%}"
+
+
+def _worse(before, after, relative, absolute=0):
+    """Whether after (lower is better) is worse than before by more than the
+    larger of relative and absolute. A value going missing is worse."""
+    if before is None:
+        return False
+    if after is None:
+        return True
+    return after - before > max(abs(before) * relative, absolute)
+
+
+def compare(before, after, objective_tolerance=0.01, time_tolerance=0.25, size_tolerance=0.1, memory_tolerance=0.25):
+    """Regressions from before to after (two run_benchmarks outputs), as a
+    list of messages, for every instance and seed both of them ran."""
+    earlier = {(r["instance"], r["seed"]): r for r in before["results"]}
+    regressions = []
+    for result in after["results"]:
+        key = (result["instance"], result["seed"])
+        if key not in earlier:
+            continue
+        old = earlier[key]
+        label = f"{key[0]} seed {key[1]}"
+        checks = [
+            ("objective", old["objective"], result["objective"], objective_tolerance, 0),
+            ("build seconds", old["build_seconds"], result["build_seconds"], time_tolerance, 0.5),
+            ("seconds to first layout", old["first_solution_seconds"], result["first_solution_seconds"],
+             time_tolerance, 1),
+            ("constraints", old["constraints"], result["constraints"], size_tolerance, 0),
+            ("variables", old["variables"], result["variables"], size_tolerance, 0),
+            ("peak RSS MB", old["peak_rss_mb"], result["peak_rss_mb"], memory_tolerance, 0),
+        ]
+        for seconds, objective in result["checkpoints"].items():
+            checks.append((f"objective at {seconds}s", old["checkpoints"].get(seconds), objective,
+                           objective_tolerance, 0))
+        for what, old_value, new_value, relative, absolute in checks:
+            if _worse(old_value, new_value, relative, absolute):
+                regressions.append(f"{label}: {what} went from {old_value} to {new_value}")
+        if old["status"] == "OPTIMAL" and result["status"] != "OPTIMAL":
+            regressions.append(f"{label}: no longer proved optimal ({result['status']})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark optimize_factory_layout, or compare two benchmark runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run the benchmarks and write the results as JSON")
+    run.add_argument("--out", required=True, help="JSON file to write")
+    run.add_argument("--instances", nargs="+", choices=list(INSTANCES), default=list(INSTANCES))
+    run.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3])
+    run.add_argument("--time", type=float, default=60, help="Solver seconds per instance and seed")
+    run.add_argument("--checkpoints", type=float, nargs="+", default=list(CHECKPOINTS),
+                     help="Solver seconds at which to record the best objective")
+    run.add_argument("--overlap", choices=OVERLAP_MODES, default="pairwise", help="Overlap encoding (see main.py --overlap)")
+    run.add_argument("--workers", type=int, help="CP-SAT search workers (default: all cores)")
+    diff = commands.add_parser("compare", help="Flag regressions from one results file to another")
+    diff.add_argument("before")
+    diff.add_argument("after")
+    diff.add_argument("--objective-tolerance", type=float, default=0.01, help="Relative objective slack")
+    diff.add_argument("--time-tolerance", type=float, default=0.25, help="Relative build/first-layout time slack")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        checkpoints = [int(c) if c == int(c) else c for c in args.checkpoints]
+        results = run_benchmarks(args.instances, args.seeds, args.time, checkpoints, overlap=args.overlap,
+                                 num_workers=args.workers)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        return
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    regressions = compare(before, after, args.objective_tolerance, args.time_tolerance)
+    for regression in regressions:
+        print(regression)
+    if regressions:
+        sys.exit(1)
+    print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import copy
+
+from benchmark import compare, objective_at, run_benchmarks, tile_spec
+from main_test import test_blocks, test_connections, test_grid_size
+
+
+def test_tile_spec():
+    blocks, connections, grid_size = tile_spec(test_blocks, test_connections, test_grid_size, 2)
+    assert grid_size == (32, 16)
+    assert len(blocks) == 8
+    assert blocks["Coal Mine #1"].fixed_x == 16
+    assert blocks["Iron Smelting #1"] == test_blocks["Iron Smelting"]
+    # the connection to a block that isn't in the spec is dropped
+    assert len(connections) == 6
+    assert {c.weight for c in connections} == {1, 20}
+
+
+def test_objective_at():
+    history = [(0.5, 100, 0), (3, 80, 10), (9, 70, 20)]
+    assert objective_at(history, 0.1) is None
+    assert objective_at(history, 5) == 80
+    assert objective_at(history, 60) == 70
+
+
+def test_run_and_compare():
+    before = run_benchmarks(["test"], [1], 3, checkpoints=(1, 60), specs={"test": (
+        test_blocks, test_connections, test_grid_size)}, num_workers=1)
+    result, = before["results"]
+    assert result["status"] == "OPTIMAL"
+    assert result["gap"] == 0
+    assert result["checkpoints"]["60"] is None
+    assert result["peak_rss_mb"] > 0
+    assert result["first_solution_seconds"] is not None
+    assert compare(before, before) == []
+
+    after = copy.deepcopy(before)
+    worse = after["results"][0]
+    worse["objective"] *= 2
+    worse["constraints"] *= 2
+    worse["status"] = "FEASIBLE"
+    regressions = compare(before, after)
+    assert len(regressions) == 3
+    assert any("objective went from" in regression for regression in regressions)
+    assert any("no longer proved optimal" in regression for regression in regressions)
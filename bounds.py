@@ -0,0 +1,135 @@
+"""Lower bounds on belt distance that hold for every legal layout, for the
+model to add as redundant constraints.
+
+Blocks can't overlap, so a port in the middle of a block is at least half
+the block's shorter side from any port of another block, and two
+midpoints are further apart still. A fixed port is at least as far from a
+movable block's port as the box that port can reach: the block has to fit
+on the grid, and inside its position_bounds if it has any.
+"""
+
+import math
+
+from geometry import port_point
+from spec import OneOf, block_size, is_fixed
+
+
+def _options(pos):
+    return list(pos.conns) if isinstance(pos, OneOf) else [pos]
+
+
+def _half_dims(block_info):
+    width, height = block_size(block_info)
+    return min(width, height) // 2
+
+
+def _fixed_ports(block_info, pos):
+    width, height = block_size(block_info)
+    if block_info.rotated:
+        width, height = height, width
+    return port_point(block_info.fixed_x, block_info.fixed_y, width, height, pos, block_info.rotated)
+
+
+def _midpoints_apart(block1, block2):
+    # centres of two blocks that don't overlap are apart by at least
+    # floor(a/2) + floor(b/2) + min(a%2, b%2) along whichever axis separates
+    # them, for some side a of one and b of the other
+    return min(a // 2 + b // 2 + min(a % 2, b % 2) for a in block_size(block1) for b in block_size(block2))
+
+
+def _reaches(block_info, pos, grid_size, bounds):
+    """Boxes (x min, x max, y min, y max) port pos of a movable block stays
+    in, one for each way round the block fits: the block's corner ranges
+    over the grid less its footprint, and position_bounds if any."""
+    width, height = block_size(block_info)
+    boxes = []
+    for is_rotated, (w, h) in ((False, (width, height)), (True, (height, width))):
+        dx, dy = port_point(0, 0, w, h, pos, is_rotated)
+        x_min, x_max, y_min, y_max = 0, grid_size[0] - w, 0, grid_size[1] - h
+        if bounds is not None:
+            x_min, x_max = max(x_min, bounds[0]), min(x_max, bounds[1])
+            y_min, y_max = max(y_min, bounds[2]), min(y_max, bounds[3])
+        if x_min <= x_max and y_min <= y_max:
+            boxes.append((x_min + dx, x_max + dx, y_min + dy, y_max + dy))
+    return boxes
+
+
+def _to_box(point, box):
+    x, y = point
+    x_min, x_max, y_min, y_max = box
+    return max(x_min - x, 0, x - x_max) + max(y_min - y, 0, y - y_max)
+
+
+def _pair_bound(blocks, name1, name2, pos1, pos2, grid_size, position_bounds):
+    block1, block2 = blocks[name1], blocks[name2]
+    fixed1, fixed2 = is_fixed(block1), is_fixed(block2)
+    if fixed1 and fixed2:
+        (x1, y1), (x2, y2) = _fixed_ports(block1, pos1), _fixed_ports(block2, pos2)
+        return abs(x1 - x2) + abs(y1 - y2)
+    bound = 0
+    if pos1 == "MM" and pos2 == "MM":
+        bound = _midpoints_apart(block1, block2)
+    elif pos1 == "MM":
+        bound = _half_dims(block1)
+    elif pos2 == "MM":
+        bound = _half_dims(block2)
+    if fixed1 or fixed2:
+        fixed, movable, fixed_pos, movable_pos, movable_name = (
+            (block1, block2, pos1, pos2, name2) if fixed1 else (block2, block1, pos2, pos1, name1))
+        point = _fixed_ports(fixed, fixed_pos)
+        boxes = _reaches(movable, movable_pos, grid_size, (position_bounds or {}).get(movable_name))
+        if boxes:
+            bound = max(bound, min(_to_box(point, box) for box in boxes))
+    return bound
+
+
+def connection_lower_bound(blocks, name1, name2, pos1, pos2, grid_size, position_bounds=None):
+    """Least Manhattan distance between the ends of a connection (not
+    weighted) over all its port choices, in any legal layout."""
+    return min(_pair_bound(blocks, name1, name2, p1, p2, grid_size, position_bounds)
+               for p1 in _options(pos1) for p2 in _options(pos2))
+
+
+def hub_lower_bound(blocks, hub, ends):
+    """Least total weighted distance from hub to its movable neighbours.
+
+    ends is [(neighbour, weight)], at most one per neighbour. Say the k-th
+    closest neighbour's port is d_k from the hub's port. The hub's port is
+    within reach (half its width plus half its height) of its middle, and
+    every tile of a neighbour within its width plus height of that
+    neighbour's port, so the hub and its k closest neighbours all lie in an
+    L1 ball of radius d_k + reach + extent around the hub's middle, where
+    extent is the largest width plus height among all of ends. They can't
+    overlap, and a ball of radius r covers 2r^2, so d_k is at least
+    sqrt(area / 2) - reach - extent, with area the hub's plus the k smallest
+    neighbours'. The heaviest weights going with the closest neighbours
+    makes the least total. Mostly this only says something for hubs with a
+    lot of neighbours. Returns 0 if it says nothing.
+    """
+    if not ends:
+        return 0
+    width, height = block_size(blocks[hub])
+    reach = math.ceil(width / 2) + math.ceil(height / 2)
+    extent = max(sum(block_size(blocks[name])) for name, _ in ends)
+    area = width * height
+    radii = []
+    for neighbour_area in sorted(math.prod(block_size(blocks[name])) for name, _ in ends):
+        area += neighbour_area
+        radii.append(math.sqrt(area / 2))
+    weights = sorted((weight for _, weight in ends), reverse=True)
+    bound = sum(weight * max(0, radius - reach - extent) for weight, radius in zip(weights, radii))
+    return math.floor(bound)
+
+
+def hub_ends(blocks, index, hub):
+    """[(neighbour, weight)] for hub's movable neighbours, keeping only the
+    heaviest connection to each, along with the indices of those
+    connections in index.connections."""
+    heaviest = {}
+    for i, (name1, name2, _, _, weight) in enumerate(index.connections):
+        other = name2 if name1 == hub else name1 if name2 == hub else None
+        if other is None or other == hub or is_fixed(blocks[other]):
+            continue
+        if other not in heaviest or weight > heaviest[other][1]:
+            heaviest[other] = (i, weight)
+    return [(name, weight) for name, (_, weight) in heaviest.items()], [i for i, _ in heaviest.values()]
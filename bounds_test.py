@@ -0,0 +1,99 @@
+from itertools import product
+
+from bounds import connection_lower_bound, hub_lower_bound
+from geometry import port_point
+from spec import Block
+
+SIZES = [(3, 2), (2, 2), (1, 3)]
+
+
+def least_distance(size1, size2, pos1, pos2, grid=8):
+    """Brute force: the closest the two ports get over every legal
+    placement and rotation of the two blocks."""
+    best = None
+    for x1, y1, r1, x2, y2, r2 in product(range(grid), range(grid), (False, True), range(grid), range(grid), (False, True)):
+        w1, h1 = size1[::-1] if r1 else size1
+        w2, h2 = size2[::-1] if r2 else size2
+        if x1 + w1 > grid or y1 + h1 > grid or x2 + w2 > grid or y2 + h2 > grid:
+            continue
+        if not (x1 + w1 <= x2 or x2 + w2 <= x1 or y1 + h1 <= y2 or y2 + h2 <= y1):
+            continue
+        px, py = port_point(x1, y1, w1, h1, pos1, r1)
+        qx, qy = port_point(x2, y2, w2, h2, pos2, r2)
+        distance = abs(px - qx) + abs(py - qy)
+        best = distance if best is None else min(best, distance)
+    return best
+
+
+def test_connection_lower_bound_is_valid():
+    for size1, size2 in product(SIZES, SIZES):
+        for pos1, pos2 in [("MM", "MM"), ("MM", "TL"), ("BR", "MM"), ("LM", "RM")]:
+            blocks = {"a": size1, "b": size2}
+            bound = connection_lower_bound(blocks, "a", "b", pos1, pos2, (8, 8))
+            assert bound <= least_distance(size1, size2, pos1, pos2), (size1, size2, pos1, pos2)
+    # two midpoints can't get closer than the blocks' half sizes allow
+    assert connection_lower_bound({"a": (4, 6), "b": (2, 2)}, "a", "b", "MM", "MM", (8, 8)) == 3
+    assert connection_lower_bound({"a": (4, 6), "b": (2, 2)}, "a", "b", "MM", "TL", (8, 8)) == 2
+
+
+def test_fixed_lower_bounds():
+    blocks = {"Mine": Block(2, 2, fixed_x=0, fixed_y=0), "Smelting": (3, 2), "Chest": Block(1, 1, fixed_x=5, fixed_y=6)}
+    assert connection_lower_bound(blocks, "Mine", "Chest", "MM", "TL", (16, 16)) == 4 + 5
+    # held to the far corner, the smelter's ports are at least 10 + 10 away
+    bounds = {"Smelting": (10, 13, 10, 13)}
+    assert connection_lower_bound(blocks, "Mine", "Smelting", "MM", "TL", (16, 16), bounds) == 18
+    assert connection_lower_bound(blocks, "Mine", "Smelting", "MM", "TL", (16, 16)) == 1
+
+
+def least_distance_to_fixed(fixed, pos1, size, pos2, grid=8):
+    """Brute force: the closest port pos2 of a movable block gets to port
+    pos1 of a fixed 1 x 1 block at fixed, over every legal placement."""
+    point = port_point(*fixed, 1, 1, pos1, False)
+    best = None
+    for x, y, rotated in product(range(grid), range(grid), (False, True)):
+        w, h = size[::-1] if rotated else size
+        if x + w > grid or y + h > grid:
+            continue
+        if not (x + w <= fixed[0] or fixed[0] + 1 <= x or y + h <= fixed[1] or fixed[1] + 1 <= y):
+            continue
+        px, py = port_point(x, y, w, h, pos2, rotated)
+        distance = abs(px - point[0]) + abs(py - point[1])
+        best = distance if best is None else min(best, distance)
+    return best
+
+
+def test_fixed_lower_bound_is_valid():
+    for fixed, size in product([(0, 0), (7, 7), (3, 0)], SIZES + [(5, 2)]):
+        for pos1, pos2 in product(["TL", "MM", "BR"], ["TL", "MM", "BR", "RM", "BM"]):
+            blocks = {"a": Block(1, 1, fixed_x=fixed[0], fixed_y=fixed[1]), "b": size}
+            bound = connection_lower_bound(blocks, "a", "b", pos1, pos2, (8, 8))
+            assert bound <= least_distance_to_fixed(fixed, pos1, size, pos2), (fixed, size, pos1, pos2)
+    # with no position_bounds, the smelter still has to fit on the grid, so
+    # its bottom right port, turned or not, is at least 3 from the top left
+    blocks = {"Mine": Block(1, 1, fixed_x=0, fixed_y=0), "Smelting": (3, 2)}
+    assert connection_lower_bound(blocks, "Mine", "Smelting", "TL", "BR", (16, 16)) == 3
+
+
+def test_hub_lower_bound():
+    blocks = {"Hub": (1, 1)}
+    blocks.update({f"Consumer {i}": (1, 1) for i in range(200)})
+    assert hub_lower_bound(blocks, "Hub", [("Consumer 0", 1), ("Consumer 1", 1)]) == 0
+    assert hub_lower_bound(blocks, "Hub", [(f"Consumer {i}", 1) for i in range(200)]) > 0
+
+
+def least_hub_distance(weights, grid=41):
+    """Exact for a 1x1 hub with 1x1 neighbours, whose MM ports are their
+    top left corners: the hub in the middle of a grid big enough, and the
+    heaviest neighbours on the tiles closest to it."""
+    middle = grid // 2
+    distances = sorted(abs(x - middle) + abs(y - middle) for x, y in product(range(grid), range(grid)))[1:]
+    return sum(weight * distance for weight, distance in zip(sorted(weights, reverse=True), distances))
+
+
+def test_hub_lower_bound_is_valid():
+    blocks = {"Hub": (1, 1)}
+    blocks.update({f"Consumer {i}": (1, 1) for i in range(200)})
+    for count in (40, 100, 200):
+        for weights in ([10] * count, [10 * (i % 7 + 1) for i in range(count)]):
+            ends = [(f"Consumer {i}", weight) for i, weight in enumerate(weights)]
+            assert hub_lower_bound(blocks, "Hub", ends) <= least_hub_distance(weights), (count, weights[:3])
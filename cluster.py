@@ -0,0 +1,211 @@
+import math
+import time
+
+from incremental import freeze_layout
+from lns import run_lns
+from main import get_chosen_connections, get_chosen_ports, optimize_factory_layout
+from spec import Block, Connection, block_size, is_fixed, unpack_connection
+
+
+def cluster_blocks(blocks, connections, max_cluster_size=8):
+    """Partition the movable blocks into clusters of at most
+    max_cluster_size blocks.
+
+    Greedy agglomerative: connections are merged heaviest first (the total
+    weight between two clusters), as long as the merged cluster stays small
+    enough. Fixed blocks are never clustered. Returns a list of sets of
+    block names, biggest first.
+    """
+    movable = [name for name, block_info in blocks.items() if not is_fixed(block_info)]
+    cluster_of = {name: i for i, name in enumerate(movable)}
+    members = {i: {name} for i, name in enumerate(movable)}
+
+    while True:
+        between = {}
+        for conn in connections:
+            name1, name2, _, _, weight = unpack_connection(conn)
+            if name1 not in cluster_of or name2 not in cluster_of:
+                continue
+            a, b = sorted((cluster_of[name1], cluster_of[name2]))
+            if a != b and len(members[a]) + len(members[b]) <= max_cluster_size:
+                between[(a, b)] = between.get((a, b), 0) + weight
+        if not between:
+            break
+        # prefer merging small clusters so one hub doesn't swallow everything
+        (a, b), _ = max(between.items(),
+                        key=lambda item: (item[1] / (len(members[item[0][0]]) * len(members[item[0][1]])), item[0]))
+        for name in members[b]:
+            cluster_of[name] = a
+        members[a] |= members.pop(b)
+
+    return sorted(members.values(), key=lambda names: (-len(names), sorted(names)))
+
+
+def internal_connections(names, connections):
+    return [conn for conn in connections if unpack_connection(conn)[0] in names and unpack_connection(conn)[1] in names]
+
+
+def solve_cluster(names, blocks, connections, max_time, slack=1.5, **kwargs):
+    """Lay out one cluster on its own, as compactly as we can get away with.
+
+    The cluster gets a square grid with slack times its blocks' area, grown
+    by a quarter until it fits, all within max_time. Returns (width, height, offsets), where
+    offsets are the blocks' positions relative to the cluster's bounding
+    box, or None if no layout was found.
+    """
+    sub_blocks = {name: blocks[name] for name in names}
+    sub_connections = internal_connections(names, connections)
+    area = sum(w * h for w, h in map(block_size, sub_blocks.values()))
+    side = max(max(max(block_size(b)) for b in sub_blocks.values()), math.ceil(math.sqrt(area * slack)))
+    # a grid too small is usually proved infeasible quickly, so each try
+    # gets whatever the ones before it left
+    deadline = time.monotonic() + max_time
+    for _ in range(4):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        _, positions, _, _ = optimize_factory_layout(sub_blocks, sub_connections, (side, side), remaining,
+                                                     log_search=False, **kwargs)
+        if positions is not None:
+            break
+        side = math.ceil(side * 1.25)
+    else:
+        return None
+
+    extents = []
+    for name, (x, y, is_rotated) in positions.items():
+        width, height = block_size(sub_blocks[name])
+        if is_rotated:
+            width, height = height, width
+        extents.append((x, y, x + width, y + height))
+    min_x, min_y = min(e[0] for e in extents), min(e[1] for e in extents)
+    max_x, max_y = max(e[2] for e in extents), max(e[3] for e in extents)
+    offsets = {name: (x - min_x, y - min_y, is_rotated) for name, (x, y, is_rotated) in positions.items()}
+    return max_x - min_x, max_y - min_y, offsets
+
+
+def macro_spec(blocks, connections, clusters, shapes):
+    """The spec the clusters are placed with: one unrotatable macro block per
+    cluster of two or more blocks, plus the singletons and fixed blocks
+    as they are.
+
+    Connections between clusters attach to the middle of the macro block,
+    with their weights summed. Returns (blocks, connections, macro of),
+    where macro of maps each block name to the name it's placed under.
+    """
+    macro_blocks = {}
+    macro_of = {}
+    for i, names in enumerate(clusters):
+        if len(names) == 1:
+            name = next(iter(names))
+            macro_blocks[name] = blocks[name]
+            macro_of[name] = name
+            continue
+        macro_name = f"cluster {i}"
+        width, height, _ = shapes[i]
+        macro_blocks[macro_name] = Block(width, height)
+        for name in names:
+            macro_of[name] = macro_name
+    for name, block_info in blocks.items():
+        if is_fixed(block_info):
+            macro_blocks[name] = block_info
+            macro_of[name] = name
+
+    weights = {}
+    for conn in connections:
+        name1, name2, pos1, pos2, weight = unpack_connection(conn)
+        if name1 not in macro_of or name2 not in macro_of:
+            continue
+        source, target = macro_of[name1], macro_of[name2]
+        if source == target:
+            continue
+        source_pos = pos1 if source == name1 else "MM"
+        target_pos = pos2 if target == name2 else "MM"
+        key = (source, target, source_pos, target_pos)
+        weights[key] = weights.get(key, 0) + weight
+
+    macro_connections = []
+    for (source, target, source_pos, target_pos), weight in weights.items():
+        conn = Connection(source, target, source_pos, target_pos)
+        # already scaled by unpack_connection
+        conn.weight = weight
+        macro_connections.append(conn)
+    return macro_blocks, macro_connections, macro_of
+
+
+def hierarchical_solve(blocks, connections, grid_size, max_time, max_cluster_size=8, refine=True,
+                       max_iterations=None, obstacles=None, **kwargs):
+    """Solve a big spec in two levels.
+
+    Clusters the connection graph (cluster_blocks), lays each cluster out
+    on its own as a macro block, places the macro blocks on the grid
+    around the fixed blocks, and expands them back into a full layout. With
+    refine, the rest of the budget goes to an LNS pass over the whole spec,
+    which can move blocks across cluster boundaries; otherwise the layout is
+    just scored; max_iterations caps the LNS pass. obstacles only apply
+    once clusters are placed on the grid.
+
+    The budget is split 40/20/40 between the clusters, the placement and
+    the refinement (or 45/45/10 between the clusters, the placement and
+    scoring the layout without refinement); the last step gets whatever
+    is left. Returns a dict like
+    run_lns does, plus "clusters", or None if any level found nothing.
+    """
+    started = time.monotonic()
+    clusters = cluster_blocks(blocks, connections, max_cluster_size)
+    print(f"{len(clusters)} clusters: " + ", ".join(str(len(names)) for names in clusters))
+    big = [names for names in clusters if len(names) > 1]
+    cluster_share, place_share = (0.4, 0.2) if refine else (0.45, 0.45)
+    cluster_time = max_time * cluster_share / max(1, len(big))
+
+    shapes = {}
+    for i, names in enumerate(clusters):
+        if len(names) == 1:
+            continue
+        shape = solve_cluster(names, blocks, connections, cluster_time, **kwargs)
+        if shape is None:
+            print(f"No layout for cluster {i} ({len(names)} blocks)")
+            return None
+        shapes[i] = shape
+        print(f"cluster {i}: {len(names)} blocks in {shape[0]}x{shape[1]}")
+
+    macro_blocks, macro_connections, macro_of = macro_spec(blocks, connections, clusters, shapes)
+    _, macro_positions, _, _ = optimize_factory_layout(macro_blocks, macro_connections, grid_size,
+                                                       max_time * place_share, allow_rotation=False,
+                                                       log_search=False, obstacles=obstacles, **kwargs)
+    if macro_positions is None:
+        print(f"No placement for {len(macro_blocks)} macro blocks")
+        return None
+
+    layout = {}
+    for i, names in enumerate(clusters):
+        if len(names) == 1:
+            name = next(iter(names))
+            layout[name] = macro_positions[name]
+            continue
+        macro_x, macro_y, _ = macro_positions[f"cluster {i}"]
+        for name, (x, y, is_rotated) in shapes[i][2].items():
+            layout[name] = (macro_x + x, macro_y + y, is_rotated)
+
+    if refine:
+        # whatever the clusters and placement left over
+        best = run_lns(blocks, connections, grid_size, max(1, max_time - (time.monotonic() - started)),
+                       hint_positions=layout, max_iterations=max_iterations, obstacles=obstacles, **kwargs)
+    else:
+        # pin every block to score the layout and pick its ports
+        frozen, _ = freeze_layout(blocks, layout, set())
+        solver, positions, distance, details = optimize_factory_layout(
+            frozen, connections, grid_size, max(1, max_time - (time.monotonic() - started)),
+            log_search=False, obstacles=obstacles, **kwargs)
+        best = None
+        if positions is not None:
+            best = {
+                "positions": positions,
+                "distance": distance,
+                "ports": get_chosen_ports(solver, details),
+                "chosen_connections": get_chosen_connections(solver, details),
+                "history": [],
+            }
+    if best is not None:
+        best["clusters"] = clusters
+    return best
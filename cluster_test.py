@@ -0,0 +1,48 @@
+import time
+
+import cluster
+from cluster import cluster_blocks, hierarchical_solve, macro_spec
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+from spec import unpack_connection
+
+
+def test_cluster_blocks():
+    clusters = cluster_blocks(test_blocks, test_connections, max_cluster_size=2)
+    # the weight-2 connection is merged first, and the fixed mine stays out
+    assert clusters == [{"Iron Smelting", "Green Circuit Assembly"}, {"Red Science"}]
+    assert cluster_blocks(test_blocks, test_connections, max_cluster_size=1) == [
+        {"Green Circuit Assembly"}, {"Iron Smelting"}, {"Red Science"}]
+
+
+def test_macro_spec():
+    clusters = [{"Iron Smelting", "Green Circuit Assembly"}, {"Red Science"}]
+    shapes = {0: (10, 4, {})}
+    macro_blocks, macro_connections, macro_of = macro_spec(test_blocks, test_connections, clusters, shapes)
+    assert sorted(macro_blocks) == ["Coal Mine", "Red Science", "cluster 0"]
+    assert macro_of["Iron Smelting"] == "cluster 0"
+    assert sorted(unpack_connection(conn) for conn in macro_connections) == [
+        ("Coal Mine", "cluster 0", "MM", "MM", 1),
+        ("cluster 0", "Red Science", "MM", "TL", 1),
+    ]
+
+
+def test_hierarchical_solve():
+    for refine in (False, True):
+        best = hierarchical_solve(test_blocks, test_connections, test_grid_size, 10, max_cluster_size=2,
+                                  refine=refine, num_workers=1, max_iterations=2)
+        assert best is not None
+        assert_valid_layout(test_blocks, best["positions"], test_grid_size)
+        assert best["positions"]["Coal Mine"] == (0, 0, False)
+
+
+def test_solve_cluster_stays_in_budget(monkeypatch):
+    # every grid too small: the tries share max_time between them
+    budgets = []
+    def no_layout(blocks, connections, grid_size, max_time, **kwargs):
+        budgets.append(max_time)
+        time.sleep(max_time / 2)
+        return None, None, None, None
+    monkeypatch.setattr(cluster, "optimize_factory_layout", no_layout)
+    assert cluster.solve_cluster({"Iron Smelting", "Red Science"}, test_blocks, test_connections, 0.4) is None
+    assert len(budgets) == 4
+    assert sum(budgets) < 0.8 and budgets == sorted(budgets, reverse=True)
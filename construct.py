@@ -0,0 +1,243 @@
+"""A quick legal layout to start the solver from.
+
+Blocks are placed one at a time, most connected to what's already placed
+first, each at the free spot (and rotation) that's cheapest given the blocks
+placed so far. Then blocks are moved to their best free spot and swapped
+with each other while that helps and there's time left.
+"""
+
+import time
+
+import numpy as np
+
+from geometry import port_point
+from obstacles import obstacle_rects
+from spec import OneOf, block_size, is_fixed
+
+
+def _port_names(pos):
+    return list(pos.conns) if isinstance(pos, OneOf) else [pos]
+
+
+class Placer:
+    """Occupancy and connection cost of a layout being built or changed
+    one block at a time."""
+
+    def __init__(self, blocks, index, grid_size, allow_rotation, obstacles):
+        self.blocks = blocks
+        self.grid_size = grid_size
+        self.allow_rotation = allow_rotation
+        self.occupied = np.zeros(grid_size, dtype=np.int32)
+        for x, y, width, height in obstacle_rects(blocks, obstacles):
+            self.occupied[max(x, 0):x + width, max(y, 0):y + height] = 1
+        self.layout = {}
+        for name, block_info in blocks.items():
+            if is_fixed(block_info):
+                self.layout[name] = (block_info.fixed_x, block_info.fixed_y, bool(block_info.rotated))
+        # name -> [(other, own ports, other's ports, weight)]
+        self.ends = {name: [] for name in blocks}
+        for name1, name2, pos1, pos2, weight in index.connections:
+            self.ends[name1].append((name2, _port_names(pos1), _port_names(pos2), weight))
+            self.ends[name2].append((name1, _port_names(pos2), _port_names(pos1), weight))
+        self.__summed = None
+
+    def footprint(self, name, is_rotated):
+        width, height = block_size(self.blocks[name])
+        return (height, width) if is_rotated else (width, height)
+
+    def rotations(self, name):
+        width, height = block_size(self.blocks[name])
+        return (False, True) if self.allow_rotation and width != height else (False,)
+
+    def ports(self, name, pos_names, position=None):
+        x, y, is_rotated = position or self.layout[name]
+        width, height = self.footprint(name, is_rotated)
+        return [port_point(x, y, width, height, pos, is_rotated) for pos in pos_names]
+
+    def mark(self, name, value):
+        x, y, is_rotated = self.layout[name]
+        width, height = self.footprint(name, is_rotated)
+        self.occupied[x:x + width, y:y + height] += value
+        self.__summed = None
+
+    def free_corners(self, width, height):
+        """Boolean array over top left corners: True where a width x height
+        block fits."""
+        if self.__summed is None:
+            summed = np.zeros((self.grid_size[0] + 1, self.grid_size[1] + 1), dtype=np.int64)
+            summed[1:, 1:] = (self.occupied > 0).cumsum(0).cumsum(1)
+            self.__summed = summed
+        s = self.__summed
+        if width > self.grid_size[0] or height > self.grid_size[1]:
+            return np.zeros((0, 0), dtype=bool)
+        covered = s[width:, height:] - s[:-width or None, height:] - s[width:, :-height or None] + s[:-width or None, :-height or None]
+        return covered == 0
+
+    def cost_grid(self, name, is_rotated, shape):
+        """Weighted distance to the placed blocks for every top left corner
+        in shape, plus a small pull towards them to break ties."""
+        width, height = self.footprint(name, is_rotated)
+        xs = np.arange(shape[0])
+        ys = np.arange(shape[1])
+        cost = np.zeros(shape)
+        pull_x, pull_y, pull_weight = 0.0, 0.0, 0
+        for other, own_ports, other_ports, weight in self.ends[name]:
+            if other not in self.layout:
+                continue
+            targets = self.ports(other, other_ports)
+            best = None
+            for pos in own_ports:
+                port_x, port_y = port_point(0, 0, width, height, pos, is_rotated)
+                for target_x, target_y in targets:
+                    distance = np.abs(xs + port_x - target_x)[:, None] + np.abs(ys + port_y - target_y)[None, :]
+                    best = distance if best is None else np.minimum(best, distance)
+            cost += weight * best
+            for target_x, target_y in targets:
+                pull_x += weight * target_x / len(targets)
+                pull_y += weight * target_y / len(targets)
+            pull_weight += weight
+        if pull_weight:
+            pull_x, pull_y = pull_x / pull_weight, pull_y / pull_weight
+        else:
+            pull_x, pull_y = self.grid_size[0] / 2, self.grid_size[1] / 2
+        pull = np.abs(xs + width / 2 - pull_x)[:, None] + np.abs(ys + height / 2 - pull_y)[None, :]
+        return cost + pull * 1e-3
+
+    def best_spot(self, name):
+        """(cost, (x, y, is_rotated)) of the cheapest free spot, or None."""
+        best = None
+        for is_rotated in self.rotations(name):
+            free = self.free_corners(*self.footprint(name, is_rotated))
+            if not free.any():
+                continue
+            cost = np.where(free, self.cost_grid(name, is_rotated, free.shape), np.inf)
+            x, y = np.unravel_index(np.argmin(cost), cost.shape)
+            if best is None or cost[x, y] < best[0]:
+                best = (cost[x, y], (int(x), int(y), is_rotated))
+        return best
+
+    def block_cost(self, name, position=None):
+        total = 0
+        for other, own_ports, other_ports, weight in self.ends[name]:
+            if other not in self.layout:
+                continue
+            starts = self.ports(name, own_ports, position)
+            ends = self.ports(other, other_ports)
+            total += weight * min(abs(sx - ex) + abs(sy - ey) for sx, sy in starts for ex, ey in ends)
+        return total
+
+    def fits(self, name, position):
+        x, y, is_rotated = position
+        width, height = self.footprint(name, is_rotated)
+        if x < 0 or y < 0 or x + width > self.grid_size[0] or y + height > self.grid_size[1]:
+            return False
+        return not self.occupied[x:x + width, y:y + height].any()
+
+
+def connection_ports(blocks, index, layout):
+    """For every connection in index, the cheapest ports for layout, like the
+    solver would pick: a list of (source port, target port, (start x, start
+    y), (end x, end y))."""
+    placer = Placer(blocks, index, (0, 0), False, None)
+    placer.layout = dict(layout)
+    chosen = []
+    for name1, name2, pos1, pos2, weight in index.connections:
+        best = None
+        for start_pos, start in zip(_port_names(pos1), placer.ports(name1, _port_names(pos1))):
+            for end_pos, end in zip(_port_names(pos2), placer.ports(name2, _port_names(pos2))):
+                distance = abs(start[0] - end[0]) + abs(start[1] - end[1])
+                if best is None or distance < best[0]:
+                    best = (distance, start_pos, end_pos, start, end)
+        chosen.append(best[1:])
+    return chosen
+
+
+def layout_cost(blocks, index, layout):
+    """(total weighted distance, {(source, target): (source port, target
+    port)}) of a full layout, taking the cheapest ports for each connection
+    like the solver would."""
+    total = 0
+    ports = {}
+    for (name1, name2, _, _, weight), (start_pos, end_pos, start, end) in zip(
+            index.connections, connection_ports(blocks, index, layout)):
+        total += weight * (abs(start[0] - end[0]) + abs(start[1] - end[1]))
+        ports.setdefault((name1, name2), (start_pos, end_pos))
+    return total, ports
+
+
+def construct_layout(blocks, index, grid_size, allow_rotation=True, obstacles=None, time_limit=0.5,
+                     greedy_time=None):
+    """A legal layout of blocks, built greedily and then improved with
+    moves and swaps for up to time_limit seconds in all.
+
+    The greedy placement scans the whole grid for every block, so its cost
+    grows with blocks times grid area: about 0.4s for the specs in
+    factorio.py, 15s for generate.generate_spec(200) and 100s for 500
+    blocks. It gives up after greedy_time seconds, if set.
+
+    index is a main.ConnectionIndex for blocks. Returns (layout, ports,
+    total weighted distance) in the forms optimize_factory_layout takes as
+    hints, or None if some block didn't fit anywhere or greedy_time ran out.
+    """
+    started = time.monotonic()
+    placer = Placer(blocks, index, grid_size, allow_rotation, obstacles)
+    movable = [name for name, block_info in blocks.items() if not is_fixed(block_info)]
+    total_weight = {name: sum(end[3] for end in placer.ends[name]) for name in movable}
+
+    unplaced = list(movable)
+    while unplaced:
+        def priority(name):
+            placed_weight = sum(weight for other, _, _, weight in placer.ends[name] if other in placer.layout)
+            width, height = block_size(blocks[name])
+            return placed_weight, total_weight[name], width * height
+        name = max(unplaced, key=priority)
+        unplaced.remove(name)
+        spot = placer.best_spot(name)
+        if spot is None:
+            return None
+        placer.layout[name] = spot[1]
+        placer.mark(name, 1)
+        if greedy_time is not None and unplaced and time.monotonic() - started >= greedy_time:
+            return None
+
+    improved = True
+    while improved and time.monotonic() - started < time_limit:
+        improved = False
+        for name in movable:
+            if time.monotonic() - started >= time_limit:
+                break
+            current = placer.block_cost(name)
+            placer.mark(name, -1)
+            position = placer.layout.pop(name)
+            spot = placer.best_spot(name)
+            if spot is not None and placer.block_cost(name, spot[1]) < current:
+                position = spot[1]
+                improved = True
+            placer.layout[name] = position
+            placer.mark(name, 1)
+
+        for i, name1 in enumerate(movable):
+            for name2 in movable[i + 1:]:
+                if time.monotonic() - started >= time_limit:
+                    break
+                position1, position2 = placer.layout[name1], placer.layout[name2]
+                before = placer.block_cost(name1) + placer.block_cost(name2)
+                placer.mark(name1, -1)
+                placer.mark(name2, -1)
+                swapped1 = (position2[0], position2[1], position1[2])
+                swapped2 = (position1[0], position1[1], position2[2])
+                placer.layout[name1], placer.layout[name2] = swapped1, swapped2
+                ok = placer.fits(name1, swapped1)
+                if ok:
+                    placer.mark(name1, 1)
+                    ok = placer.fits(name2, swapped2)
+                    placer.mark(name1, -1)
+                if ok and placer.block_cost(name1) + placer.block_cost(name2) < before:
+                    improved = True
+                else:
+                    placer.layout[name1], placer.layout[name2] = position1, position2
+                placer.mark(name1, 1)
+                placer.mark(name2, 1)
+
+    cost, ports = layout_cost(blocks, index, placer.layout)
+    return placer.layout, ports, cost
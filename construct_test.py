@@ -0,0 +1,41 @@
+from construct import construct_layout, layout_cost
+from geometry import port_point
+from incremental import freeze_layout
+from main import ConnectionIndex, optimize_factory_layout
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+from report import BuildReport
+
+
+def test_port_point():
+    # 5x3 block at (10, 20); rotated, its footprint is 3x5
+    assert port_point(10, 20, 5, 3, "MM", False) == (12, 21)
+    assert port_point(10, 20, 5, 3, "TR", False) == (15, 20)
+    assert port_point(10, 20, 3, 5, "TL", True) == (13, 20)
+    assert port_point(10, 20, 3, 5, "BM", True) == (10, 22)
+
+
+def test_construct_layout():
+    index = ConnectionIndex(test_blocks, test_connections)
+    layout, ports, distance = construct_layout(test_blocks, index, test_grid_size)
+    assert_valid_layout(test_blocks, layout, test_grid_size)
+    assert layout["Coal Mine"] == (0, 0, False)
+    assert layout_cost(test_blocks, index, layout) == (distance, ports)
+
+    # out of time before every block is placed
+    assert construct_layout(test_blocks, index, test_grid_size, greedy_time=0) is None
+
+    # the solver scores the same layout the same way
+    frozen, _ = freeze_layout(test_blocks, layout, set())
+    _, _, solved, _ = optimize_factory_layout(frozen, test_connections, test_grid_size, 10, num_workers=1)
+    assert solved == distance
+
+
+def test_construct_seeds_solver():
+    report = BuildReport()
+    _, positions, distance, _ = optimize_factory_layout(test_blocks, test_connections, test_grid_size, 10,
+                                                        report=report, num_workers=1)
+    result = report.to_dict()
+    assert result["construct"]["distance"] is not None
+    assert result["hint"]["completed"]
+    assert distance <= result["construct"]["distance"]
+    assert_valid_layout(test_blocks, positions, test_grid_size)
@@ -0,0 +1,203 @@
+"""Scoring and checking layouts with NumPy instead of the solver.
+
+A LayoutArrays turns a spec into arrays once; after that evaluate and
+check_layout take either one layout as an (n, 3) array of (x, y,
+is_rotated) rows, in the order of LayoutArrays.names, or a batch of them as
+a (batch, n, 3) array, and handle the whole batch at once.
+"""
+
+import numpy as np
+
+from geometry import PORT_OFFSETS
+from spec import OneOf, block_size, is_fixed, unpack_connection
+
+PORT_NAMES = list(PORT_OFFSETS)
+# (port, rotated, axis) -> 0 for the left/top edge, 1 the middle, 2 the
+# right/bottom edge
+_PORT_HALVES = np.array([PORT_OFFSETS[pos] for pos in PORT_NAMES])
+_NO_PORT = -1
+
+
+class LayoutArrays:
+    """A spec's blocks and connections as arrays. Connections to blocks
+    that aren't in the spec are dropped, like the model does."""
+
+    def __init__(self, blocks, connections):
+        self.names = list(blocks)
+        self.block_index = {name: i for i, name in enumerate(self.names)}
+        self.sizes = np.array([block_size(block_info) for block_info in blocks.values()], dtype=np.int64).reshape(-1, 2)
+        self.fixed = np.array([is_fixed(block_info) for block_info in blocks.values()], dtype=bool)
+
+        rows = []
+        for conn in connections:
+            name1, name2, pos1, pos2, weight = unpack_connection(conn)
+            if name1 in self.block_index and name2 in self.block_index:
+                rows.append((name1, name2, _options(pos1), _options(pos2), weight))
+        self.connections = [(name1, name2) for name1, name2, _, _, _ in rows]
+        self.sources = np.array([self.block_index[row[0]] for row in rows], dtype=np.int64)
+        self.targets = np.array([self.block_index[row[1]] for row in rows], dtype=np.int64)
+        self.weights = np.array([row[4] for row in rows], dtype=np.int64)
+        self.source_options = _pad([row[2] for row in rows])
+        self.target_options = _pad([row[3] for row in rows])
+
+    def positions(self, layout):
+        """layout, a {name: (x, y, is_rotated)} dict, as an (n, 3) array."""
+        return np.array([layout[name] for name in self.names], dtype=np.int64).reshape(-1, 3)
+
+    def layout(self, positions):
+        return {name: (int(x), int(y), bool(r)) for name, (x, y, r) in zip(self.names, positions)}
+
+    def chosen_ports(self, source_choice, target_choice):
+        """{(source, target): (source port, target port)} for one layout's
+        choices from evaluate, in the form get_chosen_ports returns."""
+        ports = {}
+        for i, key in enumerate(self.connections):
+            ports.setdefault(key, (PORT_NAMES[self.source_options[i, source_choice[i]]],
+                                   PORT_NAMES[self.target_options[i, target_choice[i]]]))
+        return ports
+
+
+def _options(pos):
+    return [PORT_NAMES.index(p) for p in (pos.conns if isinstance(pos, OneOf) else [pos])]
+
+
+def _pad(options):
+    width = max((len(o) for o in options), default=1)
+    padded = np.full((len(options), width), _NO_PORT, dtype=np.int64)
+    for i, o in enumerate(options):
+        padded[i, :len(o)] = o
+    return padded
+
+
+def footprints(arrays, positions):
+    """(..., n, 2) width and height of every block, rotation applied."""
+    rotated = positions[..., 2:3].astype(bool)
+    return np.where(rotated, arrays.sizes[:, ::-1], arrays.sizes)
+
+
+def _port_points(arrays, positions, blocks, options):
+    # -> (batch, connections, options, 2)
+    sizes = footprints(arrays, positions)[:, blocks]
+    corners = positions[:, blocks, :2]
+    rotated = positions[:, blocks, 2].astype(np.int64)
+    halves = _PORT_HALVES[np.maximum(options, 0)[None], rotated[:, :, None]]
+    offsets = np.where(halves == 0, 0, np.where(halves == 1, sizes[:, :, None] // 2, sizes[:, :, None]))
+    return corners[:, :, None] + offsets
+
+
+def _distances(arrays, positions):
+    # -> (batch, connections, source options, target options), with
+    # padding options at the largest int64
+    starts = _port_points(arrays, positions, arrays.sources, arrays.source_options)
+    ends = _port_points(arrays, positions, arrays.targets, arrays.target_options)
+    distances = np.abs(starts[:, :, :, None] - ends[:, :, None, :]).sum(-1)
+    unused = (arrays.source_options[:, :, None] == _NO_PORT) | (arrays.target_options[:, None, :] == _NO_PORT)
+    return np.where(unused[None], np.iinfo(np.int64).max, distances)
+
+
+def evaluate(arrays, positions):
+    """Score layouts like the solver does at its best, each connection
+    taking its cheapest pair of ports.
+
+    Returns (total weighted distance, unweighted distance per connection,
+    source choice, target choice), each with a leading batch axis if
+    positions had one. The choices index each connection's OneOf options.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    single = positions.ndim == 2
+    if single:
+        positions = positions[None]
+    distances = _distances(arrays, positions)
+    flat = distances.reshape(distances.shape[0], distances.shape[1], -1)
+    best = flat.argmin(-1)
+    connection_distances = np.take_along_axis(flat, best[..., None], -1)[..., 0]
+    source_choice, target_choice = np.divmod(best, distances.shape[3])
+    totals = (connection_distances * arrays.weights).sum(-1)
+    if single:
+        return totals[0], connection_distances[0], source_choice[0], target_choice[0]
+    return totals, connection_distances, source_choice, target_choice
+
+
+def ports_distance(arrays, positions, ports):
+    """Total weighted distance of one layout with the given ports: a list of
+    (source port, target port), one per connection."""
+    distances = _distances(arrays, np.asarray(positions, dtype=np.int64)[None])[0]
+    total = 0
+    for i, (source_port, target_port) in enumerate(ports):
+        source = list(arrays.source_options[i]).index(PORT_NAMES.index(source_port))
+        target = list(arrays.target_options[i]).index(PORT_NAMES.index(target_port))
+        total += int(distances[i, source, target]) * int(arrays.weights[i])
+    return total
+
+
+def connection_lines(arrays, positions):
+    """(connections, 2, 2) start and end (x, y) of every connection in one
+    layout, from the ports evaluate picks for it."""
+    if not arrays.connections:
+        return np.zeros((0, 2, 2), dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.int64)[None]
+    _, _, source_choice, target_choice = evaluate(arrays, positions)
+    starts = _port_points(arrays, positions, arrays.sources, arrays.source_options)[0]
+    ends = _port_points(arrays, positions, arrays.targets, arrays.target_options)[0]
+    rows = np.arange(len(arrays.sources))
+    return np.stack([starts[rows, source_choice[0]], ends[rows, target_choice[0]]], axis=1)
+
+
+def check_layout(arrays, positions, grid_size, obstacles=None):
+    """Find blocks that leave the grid, overlap each other or cover an
+    obstacle (an (x, y, width, height) rectangle). Two fixed blocks are
+    never checked against each other.
+
+    Returns boolean arrays (out of bounds per block, overlap per pair of
+    blocks, obstacle hit per block and obstacle), each with a leading batch
+    axis if positions had one.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    single = positions.ndim == 2
+    if single:
+        positions = positions[None]
+    lo = positions[..., :2]
+    hi = lo + footprints(arrays, positions)
+    out_of_bounds = ((lo < 0) | (hi > np.array(grid_size))).any(-1)
+
+    separated = ((hi[:, :, None] <= lo[:, None, :]) | (hi[:, None, :] <= lo[:, :, None])).any(-1)
+    considered = np.triu(~(arrays.fixed[:, None] & arrays.fixed[None, :]), 1)
+    overlaps = ~separated & considered
+
+    rects = np.array(obstacles or [], dtype=np.int64).reshape(-1, 4)
+    rect_lo, rect_hi = rects[:, :2], rects[:, :2] + rects[:, 2:]
+    clear = ((hi[:, :, None] <= rect_lo[None, None]) | (rect_hi[None, None] <= lo[:, :, None])).any(-1)
+    hits = ~clear & ~arrays.fixed[None, :, None]
+
+    if single:
+        return out_of_bounds[0], overlaps[0], hits[0]
+    return out_of_bounds, overlaps, hits
+
+
+def verify_layout(blocks, connections, grid_size, layout, distance=None, ports=None, obstacles=None):
+    """Everything wrong with a solved layout, as a list of messages: blocks
+    outside the grid, overlapping or on an obstacle, and distance (the
+    solver's objective) not matching the layout's.
+
+    With ports, one (source port, target port) per connection, the distance
+    is checked against those ports; otherwise against the cheapest ones,
+    which only a solution proven optimal is sure to use.
+    """
+    arrays = LayoutArrays(blocks, connections)
+    positions = arrays.positions(layout)
+    problems = []
+    out_of_bounds, overlaps, hits = check_layout(arrays, positions, grid_size, obstacles)
+    for i in np.flatnonzero(out_of_bounds):
+        problems.append(f"{arrays.names[i]} is outside the {grid_size[0]}x{grid_size[1]} grid")
+    for i, j in zip(*np.nonzero(overlaps)):
+        problems.append(f"{arrays.names[i]} overlaps {arrays.names[j]}")
+    for i, k in zip(*np.nonzero(hits)):
+        problems.append(f"{arrays.names[i]} covers obstacle {tuple(int(v) for v in obstacles[k])}")
+    if distance is not None:
+        if ports is not None:
+            total = ports_distance(arrays, positions, ports)
+        else:
+            total = int(evaluate(arrays, positions)[0])
+        if total != distance:
+            problems.append(f"solver distance {distance} doesn't match evaluated distance {total}")
+    return problems
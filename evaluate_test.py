@@ -0,0 +1,54 @@
+import numpy as np
+
+from construct import construct_layout, layout_cost
+from evaluate import LayoutArrays, check_layout, evaluate, verify_layout
+from main import ConnectionIndex, optimize_factory_layout
+from main_test import test_blocks, test_connections, test_grid_size
+from report import BuildReport
+
+layout = {
+    "Coal Mine": (0, 0, False),
+    "Iron Smelting": (1, 0, False),
+    "Green Circuit Assembly": (1, 3, False),
+    "Red Science": (5, 3, True),
+}
+
+
+def test_evaluate():
+    arrays = LayoutArrays(test_blocks, test_connections)
+    index = ConnectionIndex(test_blocks, test_connections)
+    total, distances, source_choice, target_choice = evaluate(arrays, arrays.positions(layout))
+    expected, ports = layout_cost(test_blocks, index, layout)
+    assert total == expected
+    assert arrays.chosen_ports(source_choice, target_choice) == ports
+
+    # a batch gives the same answer for every copy
+    batch = np.stack([arrays.positions(layout)] * 3)
+    totals, distances, _, _ = evaluate(arrays, batch)
+    assert list(totals) == [expected] * 3
+    assert distances.shape == (3, 3)
+
+
+def test_check_layout():
+    arrays = LayoutArrays(test_blocks, test_connections)
+    positions = arrays.positions(dict(layout, **{"Red Science": (14, 3, False), "Green Circuit Assembly": (2, 2, False)}))
+    out_of_bounds, overlaps, hits = check_layout(arrays, positions, test_grid_size, [(0, 10, 16, 6)])
+    assert [arrays.names[i] for i in np.flatnonzero(out_of_bounds)] == ["Red Science"]
+    assert [(arrays.names[i], arrays.names[j]) for i, j in zip(*np.nonzero(overlaps))] == [
+        ("Iron Smelting", "Green Circuit Assembly")]
+    assert not hits.any()
+
+    problems = verify_layout(test_blocks, test_connections, test_grid_size,
+                             dict(layout, **{"Red Science": (8, 12, False)}), distance=1, obstacles=[(0, 10, 16, 6)])
+    assert problems[0] == "Red Science covers obstacle (0, 10, 16, 6)"
+    assert problems[1].startswith("solver distance 1 doesn't match")
+
+
+def test_solver_is_verified():
+    report = BuildReport()
+    optimize_factory_layout(test_blocks, test_connections, test_grid_size, 10, report=report, num_workers=1)
+    assert report.to_dict()["verify"] == {"problems": []}
+
+    index = ConnectionIndex(test_blocks, test_connections)
+    constructed, _, distance = construct_layout(test_blocks, index, test_grid_size)
+    assert verify_layout(test_blocks, test_connections, test_grid_size, constructed, distance) == []
@@ -1,27 +1,6 @@
 import math
 
-class Block:
-    def __init__(self, width, height, weight=1, fixed_x=None, fixed_y=None):
-        self.width = width
-        self.height = height
-        self.weight = weight
-        self.fixed_x = fixed_x
-        self.fixed_y = fixed_y
-
-    def fixed_position(self):
-        return self.fixed_x is not None and self.fixed_y is not None
-
-class Connection:
-    def __init__(self, source, target, source_pos, target_pos, weight=1):
-        self.source = source
-        self.target = target
-        self.source_pos = source_pos
-        self.target_pos = target_pos
-        self.weight = int(weight * 10)
-
-class OneOf:
-    def __init__(self, *args):
-        self.conns = args
+from spec import Block, Connection, OneOf, block_size, is_fixed, unpack_connection
 
 def rocket_control_unit(total_units):
     num_units = math.ceil(total_units / 4)
@@ -162,52 +141,54 @@ def power_plant(power_mw):
 
 # 2 rocket parts a minute, full rocket silo in 10 minutes
 # https://kirkmcdonald.github.io/calc.html#zip=dY2xDsIwDET/JhMRpbBQKR9jOQasOnGUOAN/32ZhCrrl9J50F8Eg3PyZp0ucw+penSQ0FY5+VJdK1RjWxbFRagG6aQJjzb4hU0byBXDf6nZfLqJvbsY4UfihxAgyUeOg45/Jbixs34mpijuZbyw6wPXxQwWqnWg9AA==
-rocket_blocks = {
-    "Copper Mine": (1, 1),
-    "Iron Mine": (1, 1),
-    "Coal Mine": (1, 1),
-    "Water": (1, 1),
-    "Oil": (1, 1),
-    "Stone": (1, 1),
+def _rocket_blocks():
+    """2 rocket parts a minute."""
+    return {
+        "Copper Mine": (1, 1),
+        "Iron Mine": (1, 1),
+        "Coal Mine": (1, 1),
+        "Water": (1, 1),
+        "Oil": (1, 1),
+        "Stone": (1, 1),
 
-    "Copper Smelting": electric_smelter(72.3),
+        "Copper Smelting": electric_smelter(72.3),
 
-    "Iron Smelting": electric_smelter(58.6),
+        "Iron Smelting": electric_smelter(58.6),
 
-    "Steel Smelting": electric_smelter(21.4),
-    "Stone Smelting": electric_smelter(1.4),
+        "Steel Smelting": electric_smelter(21.4),
+        "Stone Smelting": electric_smelter(1.4),
 
-    "Plastic": plastic(3.9),
+        "Plastic": plastic(3.9),
 
-    # No separate copper coil block - all assembly part of green or red circuits
-    "Green Circuit Assembly": green_circuit(23),
-    "Red Circuit Assembly": red_circuit(47.4),
-    "Blue Circuit Assembly": blue_circuit(12.3),
+        # No separate copper coil block - all assembly part of green or red circuits
+        "Green Circuit Assembly": green_circuit(23),
+        "Red Circuit Assembly": red_circuit(47.4),
+        "Blue Circuit Assembly": blue_circuit(12.3),
 
-    "Advanced Oil Processing": advanced_oil(10.7),
+        "Advanced Oil Processing": advanced_oil(10.7),
 
-    # these are included in the Advanced Oil processing footprint
-    # need 1.5 light oil crackers
-    # "Light Oil Cracking": (1, 1),
-    # 1.2 crackers
-    # "Heavy Oil Cracking": (1, 1),
+        # these are included in the Advanced Oil processing footprint
+        # need 1.5 light oil crackers
+        # "Light Oil Cracking": (1, 1),
+        # 1.2 crackers
+        # "Heavy Oil Cracking": (1, 1),
 
-    "Sulfur": plastic(1),
-    "Sulfuric Acid": (15, 10),
+        "Sulfur": plastic(1),
+        "Sulfuric Acid": (15, 10),
 
-    "Low Density Structure": low_density_structure(13.4),
+        "Low Density Structure": low_density_structure(13.4),
 
-    "Electric Engine Unit": plastic(4.5),
-    "Concrete": plastic(2.3),
+        "Electric Engine Unit": plastic(4.5),
+        "Concrete": plastic(2.3),
 
-    "Solid Fuel": solid_fuel(6.7),
-    "Rocket Fuel": rocket_fuel(13.4),
+        "Solid Fuel": solid_fuel(6.7),
+        "Rocket Fuel": rocket_fuel(13.4),
 
-    "Rocket Control Unit": rocket_control_unit(20),
+        "Rocket Control Unit": rocket_control_unit(20),
 
-    "Rocket Silo Assembler": (6, 6),
-    "Rocket": (11, 11),
-}
+        "Rocket Silo Assembler": (6, 6),
+        "Rocket": (11, 11),
+    }
 
 # ratios:
 #
@@ -256,155 +237,157 @@ everything_total_steel_smelting = 87.4
 
 everything_total_copper_smelting = 157.4
 
-everything_blocks = {
-    # top left is (0, 0)
-    "Copper Mine": Block(28, 28, fixed_x=7*32+2, fixed_y=38),
-    # the ore mine a little narrower than reality so it doesn't conflict with
-    # the stone mine
-    "Iron Mine": Block(24, 32, fixed_x=1, fixed_y=2*32+10),
-    "Coal Mine": Block(1, 1, fixed_x=1, fixed_y=max_y-3*32+16),
-    # the stone mine is a bit narrower so it doesn't conflict with Cliffs 6.
-    "Stone Mine": Block(10, 20, fixed_x=32, fixed_y=2*32-2),
-    "Water": Block(60, 52, fixed_x=3*32+2, fixed_y=max_y-53),
-    "Oil": Block(1, 1, fixed_x=7*32+10, fixed_y=3*32-5),
-
-    # stone mine and cliffs 6, also cliffs 3 and 5.
-
-    # down and left of cliffs 2
-    "Cliffs": Block(20, 25, fixed_x=6*32+17, fixed_y=3*32+1),
+def _everything_blocks():
+    """Every science and a rocket."""
+    return {
+        # top left is (0, 0)
+        "Copper Mine": Block(28, 28, fixed_x=7*32+2, fixed_y=38),
+        # the ore mine a little narrower than reality so it doesn't conflict with
+        # the stone mine
+        "Iron Mine": Block(24, 32, fixed_x=1, fixed_y=2*32+10),
+        "Coal Mine": Block(1, 1, fixed_x=1, fixed_y=max_y-3*32+16),
+        # the stone mine is a bit narrower so it doesn't conflict with Cliffs 6.
+        "Stone Mine": Block(10, 20, fixed_x=32, fixed_y=2*32-2),
+        "Water": Block(60, 52, fixed_x=3*32+2, fixed_y=max_y-53),
+        "Oil": Block(1, 1, fixed_x=7*32+10, fixed_y=3*32-5),
 
-    # down from copper mine
-    "Cliffs 2": Block(24, 30, fixed_x=7*32+9, fixed_y=2*32+10),
+        # stone mine and cliffs 6, also cliffs 3 and 5.
 
-    # left of copper mine, closest to the base
-    "Cliffs 3": Block(34, 14, fixed_x=5*32-6, fixed_y=2*32-12),
-
-    # right, up of cliffs 3
-    "Cliffs 4": Block(18, 36, fixed_x=6*32-2, fixed_y=16),
+        # down and left of cliffs 2
+        "Cliffs": Block(20, 25, fixed_x=6*32+17, fixed_y=3*32+1),
 
-    # left, up of cliffs 3
-    "Cliffs 5": Block(35, 32-10, fixed_x=4*32-8, fixed_y=32-3),
+        # down from copper mine
+        "Cliffs 2": Block(24, 30, fixed_x=7*32+9, fixed_y=2*32+10),
 
-    # next to stone mine
-    "Cliffs 6": Block(24, 26, fixed_x=1*32+12, fixed_y=2*32+1),
+        # left of copper mine, closest to the base
+        "Cliffs 3": Block(34, 14, fixed_x=5*32-6, fixed_y=2*32-12),
+
+        # right, up of cliffs 3
+        "Cliffs 4": Block(18, 36, fixed_x=6*32-2, fixed_y=16),
+
+        # left, up of cliffs 3
+        "Cliffs 5": Block(35, 32-10, fixed_x=4*32-8, fixed_y=32-3),
+
+        # next to stone mine
+        "Cliffs 6": Block(24, 26, fixed_x=1*32+12, fixed_y=2*32+1),
 
-    "Power Plant": power_plant(power_mw=everything_required_power_mw),
+        "Power Plant": power_plant(power_mw=everything_required_power_mw),
 
-    # ~34.7 for LDS
-    "Copper Smelting - LDS": electric_smelter(24),
-    # 98.4 for green circuits
-    "Copper Smelting - GC": electric_smelter(24*4),
-    "Copper Smelting - Other": electric_smelter(everything_total_copper_smelting - 24*4 - 24),
+        # ~34.7 for LDS
+        "Copper Smelting - LDS": electric_smelter(24),
+        # 98.4 for green circuits
+        "Copper Smelting - GC": electric_smelter(24*4),
+        "Copper Smelting - Other": electric_smelter(everything_total_copper_smelting - 24*4 - 24),
 
-    "Iron Smelting - Steel": electric_smelter(24*3),
-    "Iron Smelting - GC": electric_smelter(24*2),
-    "Iron Smelting - Other": electric_smelter(everything_total_iron_smelting - 24*3 - 24*2),
+        "Iron Smelting - Steel": electric_smelter(24*3),
+        "Iron Smelting - GC": electric_smelter(24*2),
+        "Iron Smelting - Other": electric_smelter(everything_total_iron_smelting - 24*3 - 24*2),
 
-    "Steel Smelting - Purple": electric_smelter(24*2),
-    "Steel Smelting - Other": electric_smelter(everything_total_steel_smelting - 24*2),
+        "Steel Smelting - Purple": electric_smelter(24*2),
+        "Steel Smelting - Other": electric_smelter(everything_total_steel_smelting - 24*2),
 
-    "Stone Smelting": electric_smelter(3.7),
+        "Stone Smelting": electric_smelter(3.7),
 
-    "Advanced Oil Processing": advanced_oil(12.5),
-    # 1.2 crackers
-    # "Heavy Oil Cracking": (10, 10),
-    # need 4.9 light oil crackers - these are covered in advanced oil
-    # "Light Oil Cracking": (10, 10),
+        "Advanced Oil Processing": advanced_oil(12.5),
+        # 1.2 crackers
+        # "Heavy Oil Cracking": (10, 10),
+        # need 4.9 light oil crackers - these are covered in advanced oil
+        # "Light Oil Cracking": (10, 10),
 
-    "Plastic": plastic(9.8),
+        "Plastic": plastic(9.8),
 
-    # 2460 green circuits/minute. 2.8 belts. 1300 go to blue circuit, 850 go to
-    #      red circuit
-    # Each assembler = 90/minute
+        # 2460 green circuits/minute. 2.8 belts. 1300 go to blue circuit, 850 go to
+        #      red circuit
+        # Each assembler = 90/minute
 
-    # For blue circuits
-    "Green Circuit Assembly - Blue": green_circuit(4*3),
+        # For blue circuits
+        "Green Circuit Assembly - Blue": green_circuit(4*3),
 
-    # Red circuits
-    "Green Circuit Assembly - Red": green_circuit(4*2),
+        # Red circuits
+        "Green Circuit Assembly - Red": green_circuit(4*2),
 
-    # All others
-    "Green Circuit Assembly - Other": green_circuit(everything_total_green_circuits - 4*3-4*2),
+        # All others
+        "Green Circuit Assembly - Other": green_circuit(everything_total_green_circuits - 4*3-4*2),
 
-    # 4.66 blocks
-    "Red Circuit - RCU": red_circuit(12),
-    "Red Circuit - Other": red_circuit(everything_total_red_circuits - 12),
-    "Blue Circuit Assembly": blue_circuit(14.5),
+        # 4.66 blocks
+        "Red Circuit - RCU": red_circuit(12),
+        "Red Circuit - Other": red_circuit(everything_total_red_circuits - 12),
+        "Blue Circuit Assembly": blue_circuit(14.5),
 
-    # https://www.factorio.school/view/-M3UFESzD4DDkv8E__6l
-    "Inserter Mall": (7, 28),
+        # https://www.factorio.school/view/-M3UFESzD4DDkv8E__6l
+        "Inserter Mall": (7, 28),
 
-    "Assembler Mall": (18, 7),
-    "Medium Power Pole Mall": (7, 8),
+        "Assembler Mall": (18, 7),
+        "Medium Power Pole Mall": (7, 8),
 
-    # https://www.factorio.school/view/-L8geV1--kQGYWiMW4v6
-    # Add some height for iron gear assembler
-    "Belt Mall": (16, 18),
+        # https://www.factorio.school/view/-L8geV1--kQGYWiMW4v6
+        # Add some height for iron gear assembler
+        "Belt Mall": (16, 18),
 
-    # This is covered as part of Yellow Science
-    # "Low Density Structure": low_density_structure(20),
+        # This is covered as part of Yellow Science
+        # "Low Density Structure": low_density_structure(20),
 
-    # tileable science: https://www.factorio.school/view/-KnQ865j-qQ21WoUPbd3
+        # tileable science: https://www.factorio.school/view/-KnQ865j-qQ21WoUPbd3
 
-    # 1 gear assembler
-    # only really need one side of the belt
-    "Red Science": (15, 12),
+        # 1 gear assembler
+        # only really need one side of the belt
+        "Red Science": (15, 12),
 
-    # 2 gear assemblers
-    # 1 inserter assembler
-    # 1 belt assembler
-    "Green Science": (18, 16),
+        # 2 gear assemblers
+        # 1 inserter assembler
+        # 1 belt assembler
+        "Green Science": (18, 16),
 
-    # 12 blue science factories
-    # 10 engine assemblers
-    # 1 pipe assembler
-    # 1 gear assembler
-    # it's 25x18, but add some buffer for belt input/output
-    "Blue Science": (27, 18+6),
-    # "Blue Science": blue_science(12),
+        # 12 blue science factories
+        # 10 engine assemblers
+        # 1 pipe assembler
+        # 1 gear assembler
+        # it's 25x18, but add some buffer for belt input/output
+        "Blue Science": (27, 18+6),
+        # "Blue Science": blue_science(12),
 
-    # 7 purple science uses:
-    # 3 rail assemblers
-    # 2 furnace assemblers
-    # 5 productivity module assemblers
-    # 2 iron assemblers
-    #
-    # add a third furnace in here
-    # 15 = 3 assemblers, plus add a lot for belts input/output
-    "Purple Science": (33, 15+6),
+        # 7 purple science uses:
+        # 3 rail assemblers
+        # 2 furnace assemblers
+        # 5 productivity module assemblers
+        # 2 iron assemblers
+        #
+        # add a third furnace in here
+        # 15 = 3 assemblers, plus add a lot for belts input/output
+        "Purple Science": (33, 15+6),
 
-    # 4 engine assemblers
-    # 4 electric engine assemblers
-    # 7 flying robot frames
-    #
-    # height is 10 assemblers, plus we typically need lots of belts
-    "Yellow Science": (41, 30+6),
+        # 4 engine assemblers
+        # 4 electric engine assemblers
+        # 7 flying robot frames
+        #
+        # height is 10 assemblers, plus we typically need lots of belts
+        "Yellow Science": (41, 30+6),
 
-    # 0.2
-    "Sulfuric Acid": plastic(1),
+        # 0.2
+        "Sulfuric Acid": plastic(1),
 
-    # 0.3 - covered in advanced oil
-    "Lubricant": plastic(1),
+        # 0.3 - covered in advanced oil
+        "Lubricant": plastic(1),
 
-    "Battery": plastic(1.4),
+        "Battery": plastic(1.4),
 
-    # yellow science covers 4 of 5.6
-    "Electric Engine Unit": plastic(3),
+        # yellow science covers 4 of 5.6
+        "Electric Engine Unit": plastic(3),
 
-    "Sulfur": plastic(1),
+        "Sulfur": plastic(1),
 
-    "Concrete": plastic(1.7),
+        "Concrete": plastic(1.7),
 
-    # 6.7 solid fuel for rocket fuel
-    #
-    # 12 solid fuel for 40 boilers (72 MW)
-    "Solid Fuel": solid_fuel(6.7 + 24),
-    "Rocket Fuel": rocket_fuel(13.4),
-    "Rocket Control Unit": rocket_control_unit(20),
-    "Rocket": (15, 11),
+        # 6.7 solid fuel for rocket fuel
+        #
+        # 12 solid fuel for 40 boilers (72 MW)
+        "Solid Fuel": solid_fuel(6.7 + 24),
+        "Rocket Fuel": rocket_fuel(13.4),
+        "Rocket Control Unit": rocket_control_unit(20),
+        "Rocket": (15, 11),
 
-    "Lab": (17, 30),
-}
+        "Lab": (17, 30),
+    }
 
 # just 30 of everything - if you turn it off when it's rocket time, you have
 # enough to cover the rocket
@@ -432,145 +415,145 @@ total_steel_smelting = 48
 # 2.64 copper plates/minute
 total_copper_smelting = 78.77
 
-blocks = {
-    # top left is (0, 0)
-    "Copper Mine": Block(28, 28, fixed_x=7*32+2, fixed_y=38),
-    # the ore mine a little narrower than reality so it doesn't conflict with
-    # the stone mine
-    "Iron Mine": Block(24, 32, fixed_x=1, fixed_y=2*32+10),
-    "Coal Mine": Block(1, 1, fixed_x=1, fixed_y=max_y-3*32+16),
-    # the stone mine is a bit narrower so it doesn't conflict with Cliffs 6.
-    "Stone Mine": Block(10, 20, fixed_x=32, fixed_y=2*32-2),
-    "Water": Block(60, 52, fixed_x=3*32+2, fixed_y=max_y-53),
-    "Oil": Block(1, 1, fixed_x=7*32+10, fixed_y=3*32-5),
-
-    # stone mine and cliffs 6, also cliffs 3 and 5.
-
-    "Cliffs": Block(20, 25, fixed_x=6*32+20, fixed_y=3*32),
-    "Cliffs 2": Block(24, 20, fixed_x=7*32+12, fixed_y=2*32+10),
-    "Cliffs 3": Block(36, 15, fixed_x=5*32-5, fixed_y=2*32-10),
-    "Cliffs 4": Block(18, 36, fixed_x=6*32, fixed_y=16),
-    "Cliffs 5": Block(34, 32-10, fixed_x=4*32-6, fixed_y=32-3),
-    "Cliffs 6": Block(24, 26, fixed_x=1*32+14, fixed_y=2*32+1),
-
-    "Power Plant": power_plant(power_mw=required_power_mw),
-
-    # "Copper Smelting - LDS": electric_smelter(24),
-    # 98.4 for green circuits
-    # "Copper Smelting - GC": electric_smelter(24),
-    "Copper Smelting - Other": electric_smelter(total_copper_smelting),
-
-    # "Iron Smelting - Steel": electric_smelter(24*2),
-    # "Iron Smelting - GC": electric_smelter(24),
-    "Iron Smelting - Other": electric_smelter(total_iron_smelting),
-
-    # actual number is like 33
-    # "Steel Smelting - Purple": electric_smelter(24),
-    "Steel Smelting - Other": electric_smelter(total_steel_smelting),
-
-    "Stone Smelting": electric_smelter(2.7),
-
-    # https://www.reddit.com/r/factorio/comments/pkekhs/three_simple_tips_to_solve_all_your_oil/
-    "Advanced Oil Processing": advanced_oil(7),
-    # 1.2 crackers
-    # "Heavy Oil Cracking": (10, 10),
-    # need 4.9 light oil crackers - these are covered in advanced oil
-    # "Light Oil Cracking": (10, 10),
-
-    "Plastic": plastic(6),
-
-    # For blue circuits
-    # "Green Circuit Assembly - Blue": green_circuit(4),
-
-    # Red circuits
-    # "Green Circuit Assembly - Red": green_circuit(4),
-
-    # All others
-    "Green Circuit Assembly - Other": green_circuit(total_green_circuits),
-
-    # 4.66 blocks
-    # "Red Circuit - RCU": red_circuit(12),
-    "Red Circuit - Other": red_circuit(total_red_circuits),
-    "Blue Circuit Assembly": blue_circuit(8),
-
-    # https://www.factorio.school/view/-M3UFESzD4DDkv8E__6l
-    "Inserter Mall": (7, 28),
-
-    "Assembler Mall": (18, 7),
-    "Medium Power Pole Mall": (7, 8),
-
-    # https://www.factorio.school/view/-L8geV1--kQGYWiMW4v6
-    # Add some height for iron gear assembler
-    "Belt Mall": (18, 18),
-
-    # This is covered as part of Yellow Science
-    # "Low Density Structure": low_density_structure(20),
-
-    # tileable science: https://www.factorio.school/view/-KnQ865j-qQ21WoUPbd3
-
-    # 1 gear assembler
-    # only really need one side of the belt
-    "Red Science": (15, 12),
-
-    # 2 gear assemblers
-    # 1 inserter assembler
-    # 1 belt assembler
-    "Green Science": (18, 16),
-
-    # 12 blue science factories
-    # 10 engine assemblers
-    # 1 pipe assembler
-    # 1 gear assembler
-    # it's 25x18, but add some buffer for belt input/output
-    "Blue Science": (27+2, 18+6),
-    # "Blue Science": blue_science(12),
-
-    # 7 purple science uses:
-    # 3 rail assemblers
-    # 2 furnace assemblers
-    # 5 productivity module assemblers
-    # 2 iron assemblers
-    #
-    # add a third furnace in here
-    # 15 = 3 assemblers, plus add a lot for belts input/output
-    "Purple Science": (33+2, 15+6),
-
-    # 4 engine assemblers
-    # 4 electric engine assemblers
-    # 7 flying robot frames
-    #
-    # height is 10 assemblers, plus we typically need lots of belts
-    "Yellow Science": (41+4, 30+6),
+def _blocks():
+    """The base main.py lays out by default."""
+    return {
+        # top left is (0, 0)
+        "Copper Mine": Block(28, 28, fixed_x=7*32+2, fixed_y=38),
+        # the ore mine a little narrower than reality so it doesn't conflict with
+        # the stone mine
+        "Iron Mine": Block(24, 32, fixed_x=1, fixed_y=2*32+10),
+        "Coal Mine": Block(1, 1, fixed_x=1, fixed_y=max_y-3*32+16),
+        # the stone mine is a bit narrower so it doesn't conflict with Cliffs 6.
+        "Stone Mine": Block(10, 20, fixed_x=32, fixed_y=2*32-2),
+        "Water": Block(60, 52, fixed_x=3*32+2, fixed_y=max_y-53),
+        "Oil": Block(1, 1, fixed_x=7*32+10, fixed_y=3*32-5),
+
+        # stone mine and cliffs 6, also cliffs 3 and 5.
+
+        "Cliffs": Block(20, 25, fixed_x=6*32+20, fixed_y=3*32),
+        "Cliffs 2": Block(24, 20, fixed_x=7*32+12, fixed_y=2*32+10),
+        "Cliffs 3": Block(36, 15, fixed_x=5*32-5, fixed_y=2*32-10),
+        "Cliffs 4": Block(18, 36, fixed_x=6*32, fixed_y=16),
+        "Cliffs 5": Block(34, 32-10, fixed_x=4*32-6, fixed_y=32-3),
+        "Cliffs 6": Block(24, 26, fixed_x=1*32+14, fixed_y=2*32+1),
+
+        "Power Plant": power_plant(power_mw=required_power_mw),
+
+        # "Copper Smelting - LDS": electric_smelter(24),
+        # 98.4 for green circuits
+        # "Copper Smelting - GC": electric_smelter(24),
+        "Copper Smelting - Other": electric_smelter(total_copper_smelting),
+
+        # "Iron Smelting - Steel": electric_smelter(24*2),
+        # "Iron Smelting - GC": electric_smelter(24),
+        "Iron Smelting - Other": electric_smelter(total_iron_smelting),
+
+        # actual number is like 33
+        # "Steel Smelting - Purple": electric_smelter(24),
+        "Steel Smelting - Other": electric_smelter(total_steel_smelting),
+
+        "Stone Smelting": electric_smelter(2.7),
+
+        # https://www.reddit.com/r/factorio/comments/pkekhs/three_simple_tips_to_solve_all_your_oil/
+        "Advanced Oil Processing": advanced_oil(7),
+        # 1.2 crackers
+        # "Heavy Oil Cracking": (10, 10),
+        # need 4.9 light oil crackers - these are covered in advanced oil
+        # "Light Oil Cracking": (10, 10),
+
+        "Plastic": plastic(6),
+
+        # For blue circuits
+        # "Green Circuit Assembly - Blue": green_circuit(4),
+
+        # Red circuits
+        # "Green Circuit Assembly - Red": green_circuit(4),
+
+        # All others
+        "Green Circuit Assembly - Other": green_circuit(total_green_circuits),
+
+        # 4.66 blocks
+        # "Red Circuit - RCU": red_circuit(12),
+        "Red Circuit - Other": red_circuit(total_red_circuits),
+        "Blue Circuit Assembly": blue_circuit(8),
+
+        # https://www.factorio.school/view/-M3UFESzD4DDkv8E__6l
+        "Inserter Mall": (7, 28),
+
+        "Assembler Mall": (18, 7),
+        "Medium Power Pole Mall": (7, 8),
+
+        # https://www.factorio.school/view/-L8geV1--kQGYWiMW4v6
+        # Add some height for iron gear assembler
+        "Belt Mall": (18, 18),
+
+        # This is covered as part of Yellow Science
+        # "Low Density Structure": low_density_structure(20),
+
+        # tileable science: https://www.factorio.school/view/-KnQ865j-qQ21WoUPbd3
+
+        # 1 gear assembler
+        # only really need one side of the belt
+        "Red Science": (15, 12),
+
+        # 2 gear assemblers
+        # 1 inserter assembler
+        # 1 belt assembler
+        "Green Science": (18, 16),
+
+        # 12 blue science factories
+        # 10 engine assemblers
+        # 1 pipe assembler
+        # 1 gear assembler
+        # it's 25x18, but add some buffer for belt input/output
+        "Blue Science": (27+2, 18+6),
+        # "Blue Science": blue_science(12),
+
+        # 7 purple science uses:
+        # 3 rail assemblers
+        # 2 furnace assemblers
+        # 5 productivity module assemblers
+        # 2 iron assemblers
+        #
+        # add a third furnace in here
+        # 15 = 3 assemblers, plus add a lot for belts input/output
+        "Purple Science": (33+2, 15+6),
+
+        # 4 engine assemblers
+        # 4 electric engine assemblers
+        # 7 flying robot frames
+        #
+        # height is 10 assemblers, plus we typically need lots of belts
+        "Yellow Science": (41+4, 30+6),
 
-    # 0.2
-    "Sulfuric Acid": plastic(1),
-
-    # 0.3 - covered in advanced oil
-    # "Lubricant": plastic(1),
-
-    "Battery": plastic(1.4),
+        # 0.2
+        "Sulfuric Acid": plastic(1),
 
-    # yellow science covers 4 of 5.6
-    # "Electric Engine Unit": plastic(3),
+        # 0.3 - covered in advanced oil
+        # "Lubricant": plastic(1),
 
-    "Sulfur": plastic(1),
+        "Battery": plastic(1.4),
 
-    "Concrete": plastic(3),
-
-    # 6.7 solid fuel for rocket fuel
-    #
-    # 12 solid fuel for 40 boilers (72 MW)
-    "Solid Fuel": solid_fuel(12+24),
-    "Rocket Fuel": rocket_fuel(24),
-    "Rocket Control Unit": rocket_control_unit(18.01),
-    # may not end up using this, but helpful for colocating pieces
-    "Rocket Silo Assembler": (6, 6),
-    "Rocket": (15, 11),
+        # yellow science covers 4 of 5.6
+        # "Electric Engine Unit": plastic(3),
 
-    "Lab": (17+4, 30+4),
-}
+        "Sulfur": plastic(1),
+
+        "Concrete": plastic(3),
 
-print("blocks: {}".format(blocks))
+        # 6.7 solid fuel for rocket fuel
+        #
+        # 12 solid fuel for 40 boilers (72 MW)
+        "Solid Fuel": solid_fuel(12+24),
+        "Rocket Fuel": rocket_fuel(24),
+        "Rocket Control Unit": rocket_control_unit(18.01),
+        # may not end up using this, but helpful for colocating pieces
+        "Rocket Silo Assembler": (6, 6),
+        "Rocket": (15, 11),
+
+        "Lab": (17+4, 30+4),
+    }
 
 # rotatable_blocks = {name for name, (w, h) in blocks.items() if w != h and w > 5 and h > 5}
 rotatable_blocks = {
@@ -593,6 +576,25 @@ rotatable_blocks = {
     'Yellow Science',
 }
 
+# built on first use, so importing this module (or picking one spec) doesn't
+# size the others
+_BUILDERS = {
+    "rocket_blocks": _rocket_blocks,
+    "everything_blocks": _everything_blocks,
+    "blocks": _blocks,
+}
+# importlib.reload re-runs this module in the same namespace: drop what the
+# last run built
+for _name in _BUILDERS:
+    globals().pop(_name, None)
+
+
+def __getattr__(name):
+    if name not in _BUILDERS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = _BUILDERS[name]()
+    return value
+
 circuit_plastic_oo = OneOf("LM", "RM")
 
 connections = [
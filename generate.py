@@ -0,0 +1,172 @@
+"""Synthetic specs, for measuring how the solver scales past the three
+hand-written ones in factorio.py.
+
+A spec is layered like a real base: mines feed smelting, smelting feeds
+intermediate products, those feed later ones. Footprints come from
+factorio.py's electric_smelter, green_circuit and plastic for a random
+number of machines; some mines are fixed in place, like ore patches. The
+same arguments and seed always give the same spec.
+
+    python generate.py --blocks 200 --seed 3 --out synthetic.py
+"""
+
+import argparse
+import math
+import random
+
+from factorio import electric_smelter, green_circuit, plastic
+from spec import Block, Connection, OneOf, block_size
+
+# name, footprint for a random machine count, relative frequency
+KINDS = [
+    ("Smelting", lambda rng: electric_smelter(rng.randint(8, 96)), 3),
+    ("Circuit", lambda rng: green_circuit(rng.randint(2, 16)), 2),
+    ("Plastic", lambda rng: plastic(rng.randint(2, 12)), 1),
+]
+MINE_SIZES = [(1, 1), (1, 1), (12, 12), (20, 20), (28, 28)]
+SIDES = ["LM", "RM", "TM", "BM"]
+# belts per connection, as in factorio.py, biased towards one
+WEIGHTS = [0.5, 1, 1, 1, 1.5, 2, 3]
+
+
+def _port(rng, one_of_fraction):
+    if rng.random() < one_of_fraction:
+        return rng.choice([OneOf("LM", "RM"), OneOf("TM", "BM")])
+    return rng.choice(SIDES)
+
+
+def _place_fixed(rng, sizes, grid_size):
+    """Non-overlapping top left corners for fixed blocks of sizes, or None
+    where one didn't fit after a few tries."""
+    placed, corners = [], []
+    for width, height in sizes:
+        corner = None
+        for _ in range(100):
+            x, y = rng.randrange(grid_size[0] - width + 1), rng.randrange(grid_size[1] - height + 1)
+            if all(x + width <= px or px + pw <= x or y + height <= py or py + ph <= y
+                   for px, py, pw, ph in placed):
+                corner = (x, y)
+                placed.append((x, y, width, height))
+                break
+        corners.append(corner)
+    return corners
+
+
+def generate_spec(num_blocks, seed=0, fixed_fraction=0.05, mine_fraction=0.15, layers=None, max_fan_in=3,
+                  one_of_fraction=0.3, density=0.25):
+    """(blocks, connections, grid size) for a spec of num_blocks blocks.
+
+    mine_fraction of the blocks are mines, with no inputs; fixed_fraction of
+    all blocks are mines fixed in place. The rest are spread over layers
+    (by default about log2 of the block count), each taking 1 to max_fan_in
+    inputs from earlier layers, mostly the one just before. Blocks that
+    already feed several others are likelier to be picked again, so some
+    become hubs. one_of_fraction of connection ends may use either of two
+    opposite sides. The grid is twice as wide as it is high, with the blocks
+    covering density of it.
+    """
+    rng = random.Random(seed)
+    num_mines = max(1, round(num_blocks * mine_fraction), round(num_blocks * fixed_fraction))
+    num_fixed = min(num_mines, round(num_blocks * fixed_fraction))
+    layers = layers or max(2, round(math.log2(max(num_blocks, 2))))
+
+    sizes = {}
+    for i in range(num_mines):
+        sizes[f"Mine {i}"] = rng.choice(MINE_SIZES[2:]) if i < num_fixed else rng.choice(MINE_SIZES)
+    kinds, _, frequencies = zip(*KINDS)
+    footprints = {name: footprint for name, footprint, _ in KINDS}
+    counts = {}
+    for _ in range(num_blocks - num_mines):
+        kind = rng.choices(kinds, frequencies)[0]
+        counts[kind] = counts.get(kind, 0) + 1
+        sizes[f"{kind} {counts[kind]}"] = tuple(footprints[kind](rng))
+
+    area = sum(width * height for width, height in sizes.values())
+    height = max(math.ceil(math.sqrt(area / density / 2)), max(max(size) for size in sizes.values()))
+    grid_size = (2 * height, height)
+
+    blocks = {}
+    fixed = [name for name in sizes if name.startswith("Mine ")][:num_fixed]
+    for name, corner in zip(fixed, _place_fixed(rng, [sizes[name] for name in fixed], grid_size)):
+        if corner is not None:
+            blocks[name] = Block(*sizes[name], fixed_x=corner[0], fixed_y=corner[1])
+    for name, size in sizes.items():
+        blocks.setdefault(name, size)
+
+    # layer 0 is the mines
+    producers = [name for name in sizes if not name.startswith("Mine ")]
+    rng.shuffle(producers)
+    by_layer = [[name for name in sizes if name.startswith("Mine ")]]
+    for layer in range(layers):
+        by_layer.append(producers[layer::layers])
+    fan_out = {name: 0 for name in sizes}
+    connections = []
+
+    def connect(source, target):
+        weight = rng.choice(WEIGHTS)
+        source_port = "MM" if source.startswith("Mine ") else _port(rng, one_of_fraction)
+        connections.append(Connection(source, target, source_port, _port(rng, one_of_fraction), weight))
+        fan_out[source] += 1
+
+    for layer in range(1, len(by_layer)):
+        earlier = [name for names in by_layer[:layer] for name in names]
+        for target in by_layer[layer]:
+            sources = set()
+            for _ in range(rng.randint(1, max_fan_in)):
+                pool = by_layer[layer - 1] if by_layer[layer - 1] and rng.random() < 0.7 else earlier
+                sources.add(rng.choices(pool, [1 + fan_out[name] for name in pool])[0])
+            for source in sorted(sources):
+                connect(source, target)
+    # nothing is left unconnected: a mine or product nobody uses feeds a
+    # random block further along
+    for layer, names in enumerate(by_layer[:-1]):
+        later = [name for names in by_layer[layer + 1:] for name in names]
+        for name in names:
+            if fan_out[name] == 0 and later:
+                connect(name, rng.choice(later))
+    return blocks, connections, grid_size
+
+
+def _source(value):
+    if isinstance(value, OneOf):
+        return f"OneOf({', '.join(repr(conn) for conn in value.conns)})"
+    return repr(value)
+
+
+def spec_source(blocks, connections, grid_size):
+    """Python source for a spec module like factorio.py."""
+    lines = ["from spec import Block, Connection, OneOf", "", f"grid_size = {tuple(grid_size)!r}", "", "blocks = {"]
+    for name, block_info in blocks.items():
+        if isinstance(block_info, Block):
+            value = (f"Block({block_info.width}, {block_info.height}, fixed_x={block_info.fixed_x}, "
+                     f"fixed_y={block_info.fixed_y})")
+        else:
+            value = repr(tuple(block_size(block_info)))
+        lines.append(f"    {name!r}: {value},")
+    lines += ["}", "", "connections = ["]
+    for conn in connections:
+        lines.append(f"    Connection({conn.source!r}, {conn.target!r}, {_source(conn.source_pos)}, "
+                     f"{_source(conn.target_pos)}, {conn.weight / 10:g}),")
+    lines.append("]")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic spec module like factorio.py")
+    parser.add_argument("--blocks", type=int, required=True, help="Number of blocks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixed", type=float, default=0.05, help="Fraction of blocks that are fixed mines")
+    parser.add_argument("--layers", type=int, help="Production layers after the mines (default: about log2 of --blocks)")
+    parser.add_argument("--fan-in", type=int, default=3, help="Most inputs a block takes")
+    parser.add_argument("--one-of", type=float, default=0.3, help="Fraction of connection ends that may use either of two sides")
+    parser.add_argument("--out", required=True, help="Python file to write")
+    args = parser.parse_args()
+    spec = generate_spec(args.blocks, args.seed, args.fixed, layers=args.layers, max_fan_in=args.fan_in,
+                         one_of_fraction=args.one_of)
+    with open(args.out, "w") as f:
+        f.write(spec_source(*spec))
+    print(f"{len(spec[0])} blocks, {len(spec[1])} connections on a {spec[2][0]}x{spec[2][1]} grid")
+
+
+if __name__ == "__main__":
+    main()
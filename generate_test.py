@@ -0,0 +1,58 @@
+from generate import generate_spec, spec_source
+from main import ConnectionIndex, optimize_factory_layout
+from main_test import assert_valid_layout
+from spec import is_fixed
+
+
+def test_generate_spec_is_reproducible():
+    assert spec_source(*generate_spec(60, seed=4)) == spec_source(*generate_spec(60, seed=4))
+    assert spec_source(*generate_spec(60, seed=4)) != spec_source(*generate_spec(60, seed=5))
+
+
+def test_generate_spec_shape():
+    for num_blocks in (20, 100, 500):
+        blocks, connections, grid_size = generate_spec(num_blocks, seed=1, fixed_fraction=0.1)
+        assert len(blocks) == num_blocks
+        fixed = [name for name, block_info in blocks.items() if is_fixed(block_info)]
+        assert 0 < len(fixed) <= num_blocks * 0.1
+        rects = [(b.fixed_x, b.fixed_y, b.width, b.height) for b in (blocks[name] for name in fixed)]
+        for i, (x1, y1, w1, h1) in enumerate(rects):
+            assert x1 + w1 <= grid_size[0] and y1 + h1 <= grid_size[1]
+            for x2, y2, w2, h2 in rects[i + 1:]:
+                assert x1 + w1 <= x2 or x2 + w2 <= x1 or y1 + h1 <= y2 or y2 + h2 <= y1
+
+        index = ConnectionIndex(blocks, connections)
+        assert all(index.neighbours(name) for name in blocks), "a block isn't connected"
+        # mines only ever feed, and nothing feeds back into an earlier block
+        assert not any(conn.target.startswith("Mine ") for conn in connections)
+        feeds = {}
+        for conn in connections:
+            feeds.setdefault(conn.source, set()).add(conn.target)
+        visiting, done = set(), set()
+
+        def acyclic(name):
+            if name in done:
+                return True
+            if name in visiting:
+                return False
+            visiting.add(name)
+            ok = all(acyclic(target) for target in feeds.get(name, ()))
+            done.add(name)
+            return ok
+        assert all(acyclic(name) for name in blocks)
+
+
+def test_spec_source_round_trip():
+    blocks, connections, grid_size = generate_spec(30, seed=2)
+    namespace = {}
+    exec(spec_source(blocks, connections, grid_size), namespace)
+    assert namespace["grid_size"] == grid_size
+    assert spec_source(namespace["blocks"], namespace["connections"], namespace["grid_size"]) == \
+        spec_source(blocks, connections, grid_size)
+
+
+def test_generated_spec_solves():
+    blocks, connections, grid_size = generate_spec(20, seed=0)
+    _, positions, distance, _ = optimize_factory_layout(blocks, connections, grid_size, 5, log_search=False)
+    assert positions is not None
+    assert_valid_layout(blocks, positions, grid_size)
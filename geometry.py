@@ -0,0 +1,35 @@
+"""Where a block's ports end up, computed the same way the model does.
+
+The model's midpoint of a side of length n starting at s is s + n // 2, and
+a rotated block is turned 90 degrees clockwise, so its top edge becomes its
+right edge. Each entry of PORT_OFFSETS is the (x, y) offset of a port as a
+multiple of half the block's footprint, (not rotated, rotated): 0 is the
+left/top edge, 1 the middle and 2 the right/bottom edge.
+"""
+
+PORT_OFFSETS = {
+    "TL": ((0, 0), (2, 0)),
+    "TM": ((1, 0), (2, 1)),
+    "TR": ((2, 0), (2, 2)),
+    "ML": ((0, 1), (1, 0)),
+    "LM": ((0, 1), (1, 0)),
+    "MM": ((1, 1), (1, 1)),
+    "MR": ((2, 1), (1, 2)),
+    "RM": ((2, 1), (1, 2)),
+    "BL": ((0, 2), (0, 0)),
+    "BM": ((1, 2), (0, 1)),
+    "BR": ((2, 2), (0, 2)),
+}
+
+
+def _offset(half, length):
+    return (0, length // 2, length)[half]
+
+
+def port_point(x, y, width, height, pos, is_rotated):
+    """(x, y) of port pos on a block whose footprint, rotation included, is
+    width x height with its top left corner at (x, y)."""
+    if pos not in PORT_OFFSETS:
+        raise ValueError(f"unknown position {pos}")
+    half_x, half_y = PORT_OFFSETS[pos][1 if is_rotated else 0]
+    return x + _offset(half_x, width), y + _offset(half_y, height)
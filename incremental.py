@@ -0,0 +1,155 @@
+import importlib
+import json
+import os
+import time
+import traceback
+
+from main import ConnectionIndex, get_chosen_ports, optimize_factory_layout
+from report import BuildReport
+from spec import Block, block_size, is_fixed
+from store import canonical_spec
+
+
+def changed_blocks(old_spec, new_spec):
+    """Blocks of new_spec that are new or resized, or that gained or lost a
+    connection, compared to old_spec. Both are canonical specs."""
+    changed = {name for name, entry in new_spec["blocks"].items() if old_spec["blocks"].get(name) != entry}
+    old_connections = {json.dumps(c, sort_keys=True) for c in old_spec["connections"]}
+    new_connections = {json.dumps(c, sort_keys=True) for c in new_spec["connections"]}
+    for conn in old_connections ^ new_connections:
+        for name in json.loads(conn)[:2]:
+            if name in new_spec["blocks"]:
+                changed.add(name)
+    return changed
+
+
+def free_blocks(changed, blocks, index, hops=1):
+    """changed plus every block within hops connections of it. Fixed
+    blocks stay put no matter what."""
+    free = {name for name in changed if not is_fixed(blocks[name])}
+    frontier = set(changed)
+    for _ in range(hops):
+        frontier = {n for name in frontier for n in index.neighbours(name)} - free
+        frontier = {name for name in frontier if not is_fixed(blocks[name])}
+        free |= frontier
+    return free
+
+
+def freeze_layout(blocks, layout, free, slack=0):
+    """Pin every block that isn't free to where layout put it.
+
+    With slack=0 the pinned blocks become fixed Blocks (keeping their
+    rotation); otherwise they stay movable but their top left corner has to
+    stay within slack tiles of where it was. Returns (blocks,
+    position_bounds) for optimize_factory_layout.
+    """
+    frozen = dict(blocks)
+    bounds = {}
+    for name, block_info in blocks.items():
+        if name in free or is_fixed(block_info) or name not in layout:
+            continue
+        x, y, is_rotated = layout[name]
+        if slack == 0:
+            width, height = block_size(block_info)
+            weight = block_info.weight if isinstance(block_info, Block) else 1
+            frozen[name] = Block(width, height, weight, fixed_x=x, fixed_y=y, rotated=is_rotated)
+        else:
+            bounds[name] = (x - slack, x + slack, y - slack, y + slack)
+    return frozen, bounds
+
+
+def incremental_solve(old_spec, old_layout, blocks, connections, grid_size, max_time, hops=1, slack=0,
+                      hint_ports=None, report=None, **kwargs):
+    """Re-solve a spec that was edited since old_layout was found for
+    old_spec, moving only the edited blocks and their neighbours.
+
+    Falls back to solving the whole spec (hinted with old_layout) if the
+    pinned blocks leave no room; report then only describes that solve, and
+    report.extra["incremental"] says which one it was ("pinned" or
+    "full"). Returns optimize_factory_layout's result and the set of blocks
+    that were free to move.
+    """
+    if report is None:
+        report = BuildReport()
+    changed = changed_blocks(old_spec, canonical_spec(blocks, connections, grid_size))
+    index = ConnectionIndex(blocks, connections)
+    free = free_blocks(changed, blocks, index, hops)
+    frozen, bounds = freeze_layout(blocks, old_layout, free, slack)
+    result = optimize_factory_layout(frozen, connections, grid_size, max_time, position_bounds=bounds,
+                                     hint_positions=old_layout, hint_ports=hint_ports, report=report, **kwargs)
+    report.extra["incremental"] = "pinned"
+    if result[1] is None:
+        print(f"No layout with {len(blocks) - len(free)} blocks pinned, re-solving everything")
+        free = {name for name, block_info in blocks.items() if not is_fixed(block_info)}
+        report.reset()
+        result = optimize_factory_layout(blocks, connections, grid_size, max_time, hint_positions=old_layout,
+                                         hint_ports=hint_ports, report=report, **kwargs)
+        report.extra["incremental"] = "full"
+    return result, free
+
+
+def watch(module_name, max_time, full_time, store=None, hops=1, slack=0, interval=1.0, **kwargs):
+    """Re-solve module_name's spec every time the file changes, moving only
+    what the edit touched.
+
+    The first solve starts from the closest run in store, if there is one,
+    and otherwise solves from scratch for full_time seconds.
+    """
+    module = importlib.import_module(module_name)
+    obstacles = kwargs.get("obstacles")
+    previous = None
+    if store is not None:
+        closest = store.closest_run(module.blocks, module.connections, module.grid_size, obstacles=obstacles)
+        if closest is not None:
+            previous = {"spec": closest[0], "layout": closest[2], "ports": None, "distance": closest[1]}
+
+    last_mtime = None
+    while True:
+        mtime = os.stat(module.__file__).st_mtime
+        if mtime == last_mtime:
+            time.sleep(interval)
+            continue
+        if last_mtime is not None:
+            try:
+                module = importlib.reload(module)
+            except Exception:
+                traceback.print_exc()
+                print(f"Couldn't load {module_name}, waiting for the next edit")
+                last_mtime = mtime
+                continue
+        last_mtime = mtime
+
+        blocks, connections, grid_size = module.blocks, module.connections, module.grid_size
+        spec = canonical_spec(blocks, connections, grid_size, obstacles)
+        if previous is not None and previous["spec"] == spec:
+            print(f"{module_name} unchanged, best distance {previous['distance']}")
+            continue
+
+        started = time.monotonic()
+        report = BuildReport()
+        if previous is None:
+            free = {name for name, block_info in blocks.items() if not is_fixed(block_info)}
+            result = optimize_factory_layout(blocks, connections, grid_size, full_time, report=report, **kwargs)
+        else:
+            result, free = incremental_solve(previous["spec"], previous["layout"], blocks, connections, grid_size,
+                                             max_time, hops=hops, slack=slack, hint_ports=previous["ports"],
+                                             report=report, **kwargs)
+        solver, positions, distance, connection_details = result
+        if store is not None:
+            params = {"max_time": max_time, "watch": True, "free_blocks": sorted(free)}
+            store.record_run(blocks, connections, grid_size, params, report.to_dict(), positions, obstacles)
+        if positions is None:
+            print(f"No layout found for the edited spec after {time.monotonic() - started:.1f}s")
+            continue
+
+        print(f"Re-solved in {time.monotonic() - started:.1f}s with {len(free)} free blocks: distance {distance}")
+        for name, position in positions.items():
+            if previous is None or previous["layout"].get(name) != position:
+                x, y, is_rotated = position
+                print(f"  {name}: position ({x}, {y}), {'rotated' if is_rotated else 'not rotated'}")
+        previous = {
+            "spec": spec,
+            "layout": positions,
+            "ports": get_chosen_ports(solver, connection_details),
+            "distance": distance,
+        }
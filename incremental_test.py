@@ -0,0 +1,68 @@
+from factorio import Block
+from incremental import changed_blocks, free_blocks, freeze_layout, incremental_solve
+from main import ConnectionIndex, optimize_factory_layout
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+from report import BuildReport
+from store import canonical_spec
+
+
+def test_changed_and_free_blocks():
+    old_spec = canonical_spec(test_blocks, test_connections, test_grid_size)
+    resized = dict(test_blocks, **{"Red Science": (3, 3)})
+    new_spec = canonical_spec(resized, test_connections, test_grid_size)
+    assert changed_blocks(old_spec, new_spec) == {"Red Science"}
+
+    rewired = test_connections + [("Coal Mine", "Red Science", "MM", "MM")]
+    # both ends of the new connection are changed
+    changed = changed_blocks(old_spec, canonical_spec(test_blocks, rewired, test_grid_size))
+    assert changed == {"Coal Mine", "Red Science"}
+
+    # but the mine is fixed, so free_blocks leaves it out
+    index = ConnectionIndex(test_blocks, rewired)
+    assert free_blocks(changed, test_blocks, index, hops=0) == {"Red Science"}
+    assert free_blocks(changed, test_blocks, index, hops=1) == {"Red Science", "Iron Smelting", "Green Circuit Assembly"}
+
+
+def test_freeze_layout_keeps_rotation():
+    layout = {"Iron Smelting": (2, 3, True), "Red Science": (8, 8, False)}
+    frozen, bounds = freeze_layout(test_blocks, layout, {"Red Science"})
+    pinned = frozen["Iron Smelting"]
+    assert isinstance(pinned, Block)
+    assert (pinned.fixed_x, pinned.fixed_y, pinned.rotated) == (2, 3, True)
+    assert frozen["Red Science"] == test_blocks["Red Science"]
+    assert bounds == {}
+
+    frozen, bounds = freeze_layout(test_blocks, layout, {"Red Science"}, slack=2)
+    assert frozen["Iron Smelting"] == test_blocks["Iron Smelting"]
+    assert bounds == {"Iron Smelting": (0, 4, 1, 5)}
+
+
+def test_incremental_solve_only_moves_edited_blocks():
+    _, positions, _, _ = optimize_factory_layout(test_blocks, test_connections, test_grid_size, 10, seed=1)
+    old_spec = canonical_spec(test_blocks, test_connections, test_grid_size)
+
+    resized = dict(test_blocks, **{"Red Science": (4, 3)})
+    (_, new_positions, distance, _), free = incremental_solve(
+        old_spec, positions, resized, test_connections, test_grid_size, 10, hops=0)
+    assert free == {"Red Science"}
+    assert distance is not None
+    for name in ("Iron Smelting", "Green Circuit Assembly"):
+        assert new_positions[name] == positions[name]
+    assert_valid_layout(resized, new_positions, test_grid_size)
+
+
+def test_incremental_solve_falls_back_to_a_full_solve():
+    # with the others pinned, a 4x4 Red Science fits nowhere on the 8x8 grid
+    positions = {"Coal Mine": (0, 0, False), "Iron Smelting": (1, 0, False),
+                 "Green Circuit Assembly": (2, 4, False), "Red Science": (6, 4, True)}
+    old_spec = canonical_spec(test_blocks, test_connections, (8, 8))
+    resized = dict(test_blocks, **{"Red Science": (4, 4)})
+    report = BuildReport()
+    (_, new_positions, _, _), free = incremental_solve(
+        old_spec, positions, resized, test_connections, (8, 8), 10, hops=0, report=report)
+    assert free == {"Iron Smelting", "Green Circuit Assembly", "Red Science"}
+    assert_valid_layout(resized, new_positions, (8, 8))
+    # the report describes the full solve only
+    assert report.extra["incremental"] == "full"
+    assert [phase["phase"] for phase in report.phases].count("solve") == 1
+    assert report.extra["solve"]["status"] in ("OPTIMAL", "FEASIBLE")
@@ -0,0 +1,135 @@
+import random
+import time
+
+from incremental import freeze_layout
+from main import ConnectionIndex, get_chosen_connections, get_chosen_ports, optimize_factory_layout
+from report import BuildReport
+from spec import is_fixed
+
+NEIGHBOURHOODS = ("worst", "hub", "random")
+
+
+def block_costs(solver, connection_details):
+    """Weighted distance of every chosen connection, charged to both of the
+    blocks at its ends."""
+    costs = {}
+    for connection in connection_details:
+        if not solver.BooleanValue(connection[0]):
+            continue
+        _, name1, name2, start_x, start_y, end_x, end_y = connection[:7]
+        weight = connection[9]
+        distance = abs(solver.Value(end_x) - solver.Value(start_x)) + abs(solver.Value(end_y) - solver.Value(start_y))
+        for name in (name1, name2):
+            costs[name] = costs.get(name, 0) + distance * weight
+    return costs
+
+
+def worst_blocks(movable, costs, size, rng):
+    """The blocks with the most weighted distance on their connections,
+    drawn at random from the worst 2*size so we don't keep freeing the same
+    set."""
+    ranked = sorted(movable, key=lambda name: costs.get(name, 0), reverse=True)
+    return set(rng.sample(ranked[:2 * size], min(size, len(ranked))))
+
+
+def hub_blocks(movable, index, size, rng, hub=None):
+    """A random connected group of size blocks grown out from hub (by
+    default a random block, picked in proportion to how connected it is)."""
+    if hub is None:
+        hub = rng.choices(movable, weights=[len(index.neighbours(name)) + 1 for name in movable])[0]
+    free = {hub}
+    frontier = [hub]
+    while frontier and len(free) < size:
+        name = frontier.pop(rng.randrange(len(frontier)))
+        neighbours = [n for n in index.neighbours(name) if n in movable and n not in free]
+        rng.shuffle(neighbours)
+        for neighbour in neighbours[:size - len(free)]:
+            free.add(neighbour)
+            frontier.append(neighbour)
+    return free
+
+
+def run_lns(blocks, connections, grid_size, max_time, neighbourhood_size=8, iteration_time=5, initial_time=None,
+            neighbourhoods=NEIGHBOURHOODS, hubs=None, seed=None, max_iterations=None, hint_positions=None,
+            hint_ports=None, objective_upper_bound=None, **kwargs):
+    """Large-neighbourhood search over the connection graph.
+
+    Starts from a full solve of initial_time seconds (a fifth of the budget
+    by default), then repeatedly pins every block except a neighbourhood of
+    about neighbourhood_size blocks at its incumbent position and solves the
+    small model that's left for up to iteration_time seconds, accepting
+    only improvements. Neighbourhoods take turns:
+
+    - "worst": the blocks contributing the most weighted distance
+    - "hub": a connected group grown out of one of hubs (any block if None)
+    - "random": any blocks
+
+    The neighbourhood grows when a sub-model is solved to optimality without
+    an improvement and shrinks when it times out. Returns a dict with the
+    best positions, distance, ports and chosen connections, plus the
+    incumbent history.
+    """
+    rng = random.Random(seed)
+    index = ConnectionIndex(blocks, connections)
+    movable = [name for name, block_info in blocks.items() if not is_fixed(block_info)]
+    hubs = [name for name in hubs or () if name in movable]
+    started = time.monotonic()
+    if initial_time is None:
+        initial_time = max_time / 5
+
+    solver, positions, distance, details = optimize_factory_layout(
+        blocks, connections, grid_size, initial_time, seed=rng.randint(0, 10000), hint_positions=hint_positions,
+        hint_ports=hint_ports, objective_upper_bound=objective_upper_bound, **kwargs)
+    if positions is None:
+        return None
+    best = {
+        "positions": positions,
+        "distance": distance,
+        "ports": get_chosen_ports(solver, details),
+        "chosen_connections": get_chosen_connections(solver, details),
+        "history": [(time.monotonic() - started, distance, "initial")],
+    }
+    costs = block_costs(solver, details)
+
+    size = min(neighbourhood_size, len(movable))
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        remaining = max_time - (time.monotonic() - started)
+        if remaining < 0.5 or size == 0:
+            break
+        kind = neighbourhoods[iteration % len(neighbourhoods)]
+        iteration += 1
+        if kind == "worst":
+            free = worst_blocks(movable, costs, size, rng)
+        elif kind == "hub":
+            hub = rng.choice(hubs) if hubs else None
+            free = hub_blocks(movable, index, size, rng, hub)
+        elif kind == "random":
+            free = set(rng.sample(movable, size))
+        else:
+            raise ValueError(f"unknown neighbourhood {kind!r}, expected one of {NEIGHBOURHOODS}")
+
+        frozen, _ = freeze_layout(blocks, best["positions"], free)
+        report = BuildReport()
+        solver, positions, distance, details = optimize_factory_layout(
+            frozen, connections, grid_size, min(iteration_time, remaining), report=report,
+            seed=rng.randint(0, 10000), hint_positions=best["positions"], hint_ports=best["ports"],
+            objective_upper_bound=best["distance"], log_search=False, **kwargs)
+        status = report.to_dict()["solve"]["status"]
+
+        if positions is not None and distance < best["distance"]:
+            best.update({
+                "positions": positions,
+                "distance": distance,
+                "ports": get_chosen_ports(solver, details),
+                "chosen_connections": get_chosen_connections(solver, details),
+            })
+            best["history"].append((time.monotonic() - started, distance, kind))
+            costs = block_costs(solver, details)
+        elif status == "OPTIMAL":
+            size = min(size + 1, len(movable))
+        else:
+            size = min(len(movable), max(2, size - 1))
+        print(f"LNS {iteration}: freed {len(free)} blocks ({kind}), {status}, best distance {best['distance']}")
+
+    return best
@@ -0,0 +1,45 @@
+import random
+
+import lns
+from lns import hub_blocks, run_lns, worst_blocks
+from main import ConnectionIndex, optimize_factory_layout
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+
+
+def test_neighbourhoods():
+    rng = random.Random(1)
+    index = ConnectionIndex(test_blocks, test_connections)
+    movable = ["Iron Smelting", "Green Circuit Assembly", "Red Science"]
+
+    free = hub_blocks(movable, index, 2, rng, hub="Red Science")
+    assert free == {"Red Science", "Green Circuit Assembly"}
+
+    costs = {"Iron Smelting": 10, "Green Circuit Assembly": 50, "Red Science": 1}
+    assert worst_blocks(movable, costs, 1, rng) <= {"Green Circuit Assembly", "Iron Smelting"}
+
+
+def test_run_lns():
+    best = run_lns(test_blocks, test_connections, test_grid_size, 20, neighbourhood_size=2,
+                   iteration_time=2, initial_time=0.5, seed=1, max_iterations=4, num_workers=1)
+    assert best is not None
+    distances = [distance for _, distance, _ in best["history"]]
+    assert distances == sorted(distances, reverse=True)
+    assert best["distance"] == distances[-1]
+    assert_valid_layout(test_blocks, best["positions"], test_grid_size)
+
+
+
+def test_run_lns_one_movable_block(monkeypatch):
+    # a sub-solve that runs out of time shrinks the neighbourhood, but never
+    # to more blocks than can move
+    def timed_out(*args, report=None, **kwargs):
+        result = optimize_factory_layout(*args, report=report, **kwargs)
+        if report is not None:
+            report.extra["solve"]["status"] = "FEASIBLE"
+        return result
+    monkeypatch.setattr(lns, "optimize_factory_layout", timed_out)
+    blocks = {"Mine": test_blocks["Coal Mine"], "Chest": (1, 1)}
+    best = lns.run_lns(blocks, [("Mine", "Chest", "MM", "MM")], (8, 8), 10, neighbourhood_size=1,
+                       iteration_time=1, initial_time=1, neighbourhoods=("random",), seed=1, max_iterations=3,
+                       num_workers=1)
+    assert best is not None
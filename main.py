@@ -1,41 +1,342 @@
 import argparse
+import json
+from collections import defaultdict
 from itertools import product
 import math
+import os
 import random
+import sys
+import time
 
 from ortools.sat.python import cp_model
-from matplotlib.offsetbox import AnchoredText
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from matplotlib.font_manager import FontProperties
-from matplotlib.textpath import TextPath
-from matplotlib.font_manager import FontProperties
 
-from factorio import Block, Connection, OneOf, blocks, connections, grid_size
+from bounds import connection_lower_bound, hub_ends, hub_lower_bound
+from construct import construct_layout
+from evaluate import verify_layout
+from obstacles import load_mask, obstacle_rects
+from progress import ProgressLog
+from report import BuildReport
+from symmetry import canonical_hints, position_key, rotation_symmetric, symmetry_classes
+from stopping import StopRules, Watchdog
+from store import ResultsStore, canonical_spec
+from spec import SPECS, Block, Connection, OneOf, is_fixed, load_spec, unpack_connection
 
 rcu_constraints = []
 combo_vars = []
 
+# How blocks are kept apart. "pairwise" adds four reified "left of/above"
+# literals per pair of blocks, "no_overlap_2d" hands the interval variables to
+# CP-SAT's native constraint, and "both" keeps the pairwise literals as
+# redundant cuts next to the native constraint.
+OVERLAP_MODES = ("pairwise", "no_overlap_2d", "both")
+
+# Named sets of CP-SAT parameters, applied on top of the defaults below. The
+# portfolio runner hands a different one to each worker. See NOTES.txt for
+# where some of these came from.
+SOLVER_PROFILES = {
+    "default": {},
+    # run 19
+    "no_lp_workers": {
+        "ignore_subsolvers": ["reduced_costs", "pseudo_costs", "objective_shaving_search_max_lp",
+                              "objective_shaving_search_no_lp", "default_lp"],
+    },
+    "energetic": {
+        "use_strong_propagation_in_disjunctive": True,
+        "use_area_energetic_reasoning_in_no_overlap_2d": True,
+        "use_energetic_reasoning_in_no_overlap_2d": True,
+    },
+    "core": {"optimize_with_core": True},
+    "no_linearization": {"linearization_level": 0},
+}
+
 class VarArraySolutionPrinter(cp_model.CpSolverSolutionCallback):
-    """Print intermediate solutions."""
+    """Log intermediate solutions to progress (a progress.ProgressLog), and
+    stop the search once stop_rules (a stopping.StopRules) say so."""
 
-    def __init__(self, variables):
+    def __init__(self, variables, on_solution=None, stop_rules=None, progress=None):
         cp_model.CpSolverSolutionCallback.__init__(self)
         self.__variables = variables
         self.__solution_count = 0
+        self.__history = []
+        self.__on_solution = on_solution
+        self.__stop_rules = stop_rules
+        self.__progress = progress
+        self.stop_reason = None
 
     def on_solution_callback(self):
         self.__solution_count += 1
-        # print(f"Solution {self.__solution_count}")
-        # for v in self.__variables:
-            # print(f'{v}={self.Value(v)}', end=' ')
-        # print("\n")
+        entry = (self.WallTime(), self.ObjectiveValue(), self.BestObjectiveBound())
+        self.__history.append(entry)
+        if self.__on_solution is not None:
+            self.__on_solution(*entry)
+        if self.__stop_rules is not None and self.stop_reason is None:
+            self.stop_reason = self.__stop_rules.check(entry[1], entry[2])
+            if self.stop_reason is not None:
+                print(f"Stopping at objective {entry[1]:.0f}: {self.stop_reason} reached")
+                self.StopSearch()
+        if self.__progress is not None:
+            self.__progress.record(self, *entry, self.__solution_count)
 
     def solution_count(self):
         return self.__solution_count
 
-def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rotation=True):
+    def history(self):
+        """(wall time, objective, best bound) for every improving solution."""
+        return self.__history
+
+class ConnectionIndex:
+    """The connections of a spec, indexed by block.
+
+    Connections that mention a block missing from the spec are dropped here,
+    once, so the model builder never has to look them up again.
+    """
+
+    def __init__(self, blocks, connections):
+        self.connections = []
+        self.__sources = defaultdict(list)
+        self.__targets = defaultdict(list)
+        self.__fixed_sources = {}
+        self.__fixed_neighbours = defaultdict(list)
+
+        for conn in connections:
+            name1, name2, pos1, pos2, weight = unpack_connection(conn)
+            if name1 not in blocks or name2 not in blocks:
+                continue
+            self.connections.append((name1, name2, pos1, pos2, weight))
+            self.__sources[name2].append(name1)
+            self.__targets[name1].append(name2)
+            if is_fixed(blocks[name1]):
+                self.__fixed_sources.setdefault(name2, name1)
+                if name1 not in self.__fixed_neighbours[name2]:
+                    self.__fixed_neighbours[name2].append(name1)
+            if is_fixed(blocks[name2]) and name2 not in self.__fixed_neighbours[name1]:
+                self.__fixed_neighbours[name1].append(name2)
+
+    def sources(self, name):
+        """Blocks with a connection into name, in spec order."""
+        return self.__sources.get(name, [])
+
+    def targets(self, name):
+        """Blocks that name has a connection into, in spec order."""
+        return self.__targets.get(name, [])
+
+    def neighbours(self, name):
+        return list(dict.fromkeys(self.sources(name) + self.targets(name)))
+
+    def fixed_source(self, name):
+        """The first fixed-position block feeding name, or None."""
+        return self.__fixed_sources.get(name)
+
+    def fixed_neighbours(self, name):
+        """Fixed-position blocks connected to name in either direction."""
+        return self.__fixed_neighbours.get(name, [])
+
+class PortRegistry:
+    """Port coordinates shared by every connection that touches a block.
+
+    A port like "LM" on a block sits at the same spot no matter which
+    connection is using it, so its conn_x/conn_y (and the block's midpoint)
+    are built once per (block, port). Both orientations are covered by the
+    same pair of variables, reified on the block's rotation literals. Which of
+    a OneOf's ports a connection uses is still chosen per connection.
+    """
+
+    # variables the old per-connection encoding built for every port reference:
+    # conn_x, conn_y, mid_x and mid_y
+    VARS_PER_REFERENCE = 4
+
+    def __init__(self, model, grid_size, positions, sizes, rotations):
+        self.__model = model
+        self.__grid_size = grid_size
+        self.__positions = positions
+        self.__sizes = sizes
+        self.__rotations = rotations
+        self.__midpoints = {}
+        self.__ports = {}
+        self.__references = 0
+
+    def midpoint(self, name):
+        if name not in self.__midpoints:
+            x, y = self.__positions[name]
+            width, height = self.__sizes[name]
+            self.__midpoints[name] = (
+                self.__create_midpoint(name, x, width, 'x'),
+                self.__create_midpoint(name, y, height, 'y'),
+            )
+        return self.__midpoints[name]
+
+    def __create_midpoint(self, name, start, length, key):
+        # midpoint without division
+        model = self.__model
+        mid = model.NewIntVar(0, max(self.__grid_size[0], self.__grid_size[1]), f'mid_{key}_{name}')
+        model.Add(2 * mid >= 2 * start + length - 1).WithName(f"midpoint of {name} should be > {start + length - 1}")
+        model.Add(2 * mid <= 2 * start + length).WithName(f"midpoint of {name} should be <= {start + length}")
+        return mid
+
+    def has_port(self, name, pos):
+        return (name, pos) in self.__ports
+
+    def port(self, name, pos):
+        """Return (conn_x, conn_y) for the given port on the named block."""
+        self.__references += 1
+        key = (name, pos)
+        if key not in self.__ports:
+            self.__ports[key] = self.__create_port(name, pos)
+        return self.__ports[key]
+
+    def __create_port(self, name, pos):
+        model = self.__model
+        x, y = self.__positions[name]
+        width, height = self.__sizes[name]
+        no_rotation, rotated = self.__rotations[name]
+        mid_x, mid_y = self.midpoint(name)
+
+        conn_x = model.NewIntVar(0, self.__grid_size[0], f'conn_x_{name}_{pos}')
+        conn_y = model.NewIntVar(0, self.__grid_size[1], f'conn_y_{name}_{pos}')
+        if pos == "MM":
+            model.Add(conn_x == mid_x)
+            model.Add(conn_y == mid_y)
+            return conn_x, conn_y
+
+        # Define connection points for non-rotated and rotated states
+        # Rotated is 90 degrees clockwise (top moves to the right.)
+        port_positions = {
+            "TL": [(x, y), (x + width, y)],
+            "TM": [(mid_x, y), (x + width, mid_y)],
+            "TR": [(x + width, y), (x + width, y + height)],
+
+            "ML": [(x, mid_y), (mid_x, y)],
+            "LM": [(x, mid_y), (mid_x, y)],
+
+            "MR": [(x + width, mid_y), (mid_x, y + height)],
+            "RM": [(x + width, mid_y), (mid_x, y + height)],
+
+            "BL": [(x, y + height), (x, y)],
+            "BM": [(mid_x, y + height), (x, mid_y)],
+            "BR": [(x + width, y + height), (x, y + height)]
+        }
+        if pos not in port_positions:
+            raise ValueError(f"unknown position {pos}")
+        px_non_rotated, py_non_rotated = port_positions[pos][0]
+        px_rotated, py_rotated = port_positions[pos][1]
+        model.Add(conn_x == px_non_rotated).OnlyEnforceIf(no_rotation)
+        model.Add(conn_y == py_non_rotated).OnlyEnforceIf(no_rotation)
+        model.Add(conn_x == px_rotated).OnlyEnforceIf(rotated)
+        model.Add(conn_y == py_rotated).OnlyEnforceIf(rotated)
+        return conn_x, conn_y
+
+    def port_count(self):
+        return len(self.__ports)
+
+    def reference_count(self):
+        return self.__references
+
+    def vars_created(self):
+        return 2 * len(self.__ports) + 2 * len(self.__midpoints)
+
+    def vars_saved(self):
+        """How many variables the per-connection encoding would have built
+        on top of the ones the registry did."""
+        return self.VARS_PER_REFERENCE * self.__references - self.vars_created()
+
+def complete_hint(model, layout_hints, max_time):
+    """Replace model's hints with a value for every variable.
+
+    Solves a copy of the model with the variables in layout_hints fixed to
+    their hinted values, so only derived variables (sizes, ports, distances)
+    and anything the layout doesn't pin down are left to the solver. Returns
+    False, leaving the hints alone, if that doesn't find a solution in time.
+    """
+    trial = model.clone()
+    for var, value in layout_hints:
+        trial.Add(trial.get_int_var_from_proto_index(var.Index()) == int(value))
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time
+    solver.parameters.num_search_workers = 1
+    status = solver.Solve(trial)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return False
+    model.clear_hints()
+    for i, value in enumerate(solver.ResponseProto().solution):
+        model.add_hint(model.get_int_var_from_proto_index(i), value)
+    return True
+
+def port_names(pos):
+    """The ports a connection end may use: every alternative of a OneOf, or
+    just the one."""
+    if isinstance(pos, OneOf):
+        return list(pos.conns)
+    return [pos]
+
+def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rotation=True, overlap="pairwise", report=None,
+                            seed=None, hint_positions=None, hint_ports=None, objective_upper_bound=None,
+                            num_workers=None, solver_params=None, log_search=True, on_solution=None,
+                            position_bounds=None, obstacles=None, break_symmetry=True, construct_time=0.5,
+                            stop_rules=None, progress=None, save_model=None, build_only=False):
+    """Place blocks on the grid, minimizing the total weighted belt distance.
+
+    Pass a report.BuildReport as report to collect per-phase timings and
+    model sizes. hint_positions is a layout in the same {name: (x, y,
+    is_rotated)} form this function returns; its entries are used as solver
+    hints for the blocks it mentions. hint_ports does the same for port
+    choices, in the form get_chosen_ports returns. objective_upper_bound, if set, must be
+    the distance of a known layout, and the solver won't look at anything
+    worse.
+
+    num_workers defaults to every core on the machine. solver_params is a
+    dict of extra CP-SAT parameters (one of SOLVER_PROFILES, say); list values
+    are appended to repeated fields. on_solution is called with (wall time,
+    objective, best bound) for every improving solution. position_bounds
+    maps block names to (x_min, x_max, y_min, y_max) limits on where their
+    top left corner may go. obstacles is a list of (x, y, width, height)
+    areas no block may cover, on top of the fixed blocks (see
+    obstacles.load_mask). break_symmetry orders blocks that could swap places
+    without changing anything (see symmetry.symmetry_classes); the hints are
+    relabeled to match.
+
+    Without hint_positions (or position_bounds), construct.construct_layout
+    builds a layout, which then serves as the hint and upper bound: its
+    greedy placement gets up to a quarter of max_time and improving it up
+    to construct_time seconds; 0 skips it.
+
+    stop_rules, a stopping.StopRules, ends the solve before max_time once
+    it stops improving, gets close enough to the bound or reaches a target;
+    report.extra["solve"]["stop_reason"] says which, if any, did. progress,
+    a progress.ProgressLog, gets a record of every improving solution and
+    of the end of the solve. save_model is a path to write the built model
+    to, hints included, for savedmodel.load_model to solve again later;
+    with build_only, that's all this does, returning (None, None, None,
+    None).
+    """
+    if overlap not in OVERLAP_MODES:
+        raise ValueError(f"unknown overlap mode {overlap!r}, expected one of {OVERLAP_MODES}")
+    if report is None:
+        report = BuildReport()
+    index = ConnectionIndex(blocks, connections)
+    if construct_time and not hint_positions and not position_bounds:
+        started = time.perf_counter()
+        # a starting layout that takes more than a quarter of the budget to
+        # build isn't worth waiting for
+        constructed = construct_layout(blocks, index, grid_size, allow_rotation, obstacles, construct_time,
+                                       greedy_time=max_time / 4 or None)
+        report.extra["construct"] = {
+            "seconds": time.perf_counter() - started,
+            "distance": constructed[2] if constructed else None,
+        }
+        if constructed is not None:
+            hint_positions, hint_ports, distance = constructed
+            print(f"Constructed a starting layout with distance {distance} in {report.extra['construct']['seconds']:.2f}s")
+            if objective_upper_bound is None or distance < objective_upper_bound:
+                objective_upper_bound = distance
     model = cp_model.CpModel()
+    report.begin(model)
+    classes = symmetry_classes(blocks, index, position_bounds) if break_symmetry else []
+    unrotated = rotation_symmetric(blocks, index) if break_symmetry and allow_rotation else []
+    hint_positions, hint_ports = canonical_hints(classes, unrotated, grid_size, hint_positions, hint_ports)
+
+    # (variable, value) for the hints that describe a layout: positions,
+    # rotations and port choices
+    layout_hints = []
 
     # Variables for block positions and rotations
     # tuple of (x, y)
@@ -54,6 +355,7 @@ def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rota
     y_ends = []
     x_intervals = []
     y_intervals = []
+    movable = []
 
     i = 0
     for name, block_info in blocks.items():
@@ -64,27 +366,39 @@ def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rota
             weight = 1  # Default weight
 
         if isinstance(block_info, Block) and block_info.fixed_position():
+            if block_info.rotated:
+                width, height = height, width
+            # fixed blocks only need a position and size for their ports;
+            # keeping other blocks off them is the obstacles' job
             x1 = model.NewIntVar(block_info.fixed_x, block_info.fixed_x, f"x_start_fixed_{name}_({block_info.fixed_x})")
             y1 = model.NewIntVar(block_info.fixed_y, block_info.fixed_y, f"y_start_fixed_{name}_({block_info.fixed_y})")
-
-            x_starts.append(x1)
-            x_ends.append(model.NewConstant(block_info.fixed_x + width))
             x_size = model.NewConstant(width)
-            x_sizes.append(x_size)
-
-            y_starts.append(y1)
-            y_ends.append(model.NewConstant(block_info.fixed_y + height))
             y_size = model.NewConstant(height)
-            y_sizes.append(y_size)
+            positions[name] = (x1, y1)
+            sizes[name] = (x_size, y_size)
+            continue
 
         else:
-            x1 = model.NewIntVar(0, grid_size[0] - min(width, height), f'x_start_{name}')
-            model.add_hint(x1, math.ceil(grid_size[0]//2))
+            hint_x, hint_y = math.ceil(grid_size[0]//2), math.ceil(grid_size[1]//2)
+            if hint_positions and name in hint_positions:
+                hint_x, hint_y = hint_positions[name][0], hint_positions[name][1]
+            x_min, x_max = 0, grid_size[0] - min(width, height)
+            y_min, y_max = 0, grid_size[1] - min(width, height)
+            if position_bounds and name in position_bounds:
+                bound_x_min, bound_x_max, bound_y_min, bound_y_max = position_bounds[name]
+                x_min, x_max = max(x_min, bound_x_min), min(x_max, bound_x_max)
+                y_min, y_max = max(y_min, bound_y_min), min(y_max, bound_y_max)
+            x1 = model.NewIntVar(x_min, x_max, f'x_start_{name}')
+            model.add_hint(x1, hint_x)
+            if hint_positions and name in hint_positions:
+                layout_hints.append((x1, hint_x))
             x_starts.append(x1)
             x_ends.append(model.NewIntVar(0+min(width, height), grid_size[0], f'x_end_{name}'))
 
-            y1 = model.NewIntVar(0, grid_size[1] - min(width, height), f'y_start_{name}')
-            model.add_hint(y1, math.ceil(grid_size[1]//2))
+            y1 = model.NewIntVar(y_min, y_max, f'y_start_{name}')
+            model.add_hint(y1, hint_y)
+            if hint_positions and name in hint_positions:
+                layout_hints.append((y1, hint_y))
             y_starts.append(y1)
             y_ends.append(model.NewIntVar(0+min(width, height), grid_size[1], f'y_end_{name}'))
 
@@ -106,10 +420,12 @@ def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rota
         yvar = model.new_interval_var(y_starts[i], y_sizes[i], y_ends[i], f"y_interval_{name}")
         x_intervals.append(xvar)
         y_intervals.append(yvar)
+        movable.append(name)
         i += 1
 
         # all_vars.append(rotations[name])
         # weights[name] = weight
+    report.mark("block vars", model)
 
     # is_used = []
     for name, block_info in blocks.items():
@@ -125,210 +441,146 @@ def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rota
             rotated = model.new_bool_var(f"rotated_{name}")
             model.add_exactly_one(no_rotation, rotated)
             rotations[name] = (no_rotation, rotated)
+            if hint_positions and name in hint_positions:
+                is_rotated = bool(hint_positions[name][2])
+                model.add_hint(rotated, is_rotated)
+                model.add_hint(no_rotation, not is_rotated)
+                layout_hints.append((rotated, is_rotated))
 
             model.Add(sizes[name][0] == width).OnlyEnforceIf(no_rotation).WithName(f"width of {name} should be {width} if no rotation")
             model.Add(sizes[name][1] == height).OnlyEnforceIf(no_rotation).WithName(f"height of {name} should be {height} if no rotation")
             model.Add(sizes[name][0] == height).OnlyEnforceIf(rotated).WithName(f"width of {name} should be {height} if no rotation")
             model.Add(sizes[name][1] == width).OnlyEnforceIf(rotated).WithName(f"height of {name} should be {width} if rotated")
+        elif fixed_position and block_info.rotated:
+            rotations[name] = (model.NewConstant(False), model.NewConstant(True))
         else:
             rotations[name] = (model.NewConstant(True), model.NewConstant(False))  # Not rotated
             # model.Add(sizes[name][0] == width)
             # model.Add(sizes[name][1] == height)
+    report.mark("rotation", model)
+
+    # Fixed blocks and the mask are constant boxes that never overlap each
+    # other, so only movable blocks need constraining against them.
+    rects = obstacle_rects(blocks, obstacles)
+    obstacle_x = [model.new_fixed_size_interval_var(x, w, f"obstacle_x_{x}_{y}") for x, y, w, h in rects]
+    obstacle_y = [model.new_fixed_size_interval_var(y, h, f"obstacle_y_{x}_{y}") for x, y, w, h in rects]
+    report.extra["obstacles"] = {
+        "fixed_blocks": len(blocks) - len(movable),
+        "mask_rects": len(obstacles or []),
+        "rects": len(rects),
+    }
 
-
-    # model.add_no_overlap_2d(x_intervals, y_intervals)
+    # The intervals are built in every mode because x_end/y_end are what keep
+    # each block inside the grid.
+    if overlap in ("no_overlap_2d", "both"):
+        model.add_no_overlap_2d(x_intervals + obstacle_x, y_intervals + obstacle_y)
+    elif rects:
+        for xvar, yvar in zip(x_intervals, y_intervals):
+            model.add_no_overlap_2d([xvar] + obstacle_x, [yvar] + obstacle_y)
 
     # Ensure blocks don't overlap
-    for name1, _ in blocks.items():
-        for name2, _ in blocks.items():
-            if name1 < name2:
-                b1_left_of_b2 = model.new_bool_var(f'{name1}_left_of_{name2}')
-                b2_left_of_b1 = model.new_bool_var(f'{name2}_left_of_{name1}')
-                b1_above_b2 = model.new_bool_var(f'{name1}_above_{name2}')
-                b2_above_b1 = model.new_bool_var(f'{name2}_above_{name1}')
-
-                model.Add(positions[name1][0] + sizes[name1][0] <= positions[name2][0]).OnlyEnforceIf(b1_left_of_b2)
-                model.Add(positions[name2][0] + sizes[name2][0] <= positions[name1][0]).OnlyEnforceIf(b2_left_of_b1)
-                model.Add(positions[name1][1] + sizes[name1][1] <= positions[name2][1]).OnlyEnforceIf(b1_above_b2)
-                model.Add(positions[name2][1] + sizes[name2][1] <= positions[name1][1]).OnlyEnforceIf(b2_above_b1)
-
-                model.AddBoolOr([b1_left_of_b2, b2_left_of_b1, b1_above_b2, b2_above_b1])
-
-    def get_connection_point(model, name, typ, pos, x, y, width, height, no_rotation, rotated):
-        # Assert that all inputs are IntVars
-        assert all(isinstance(var, cp_model.IntVar) for var in [x, y, width, height]), \
-            "All inputs (x, y, width, height) must be IntVars"
-        # return x, y
-
-        # Helper function to create midpoint without division
-        def create_midpoint(start, length, key):
-            mid = model.NewIntVar(0, max(grid_size[0], grid_size[1]), f'mid_{key}_{name}_{typ}_{pos}')
-            model.Add(2 * mid >= 2 * start + length - 1).WithName(f"midpoint of {name} should be > {start + length - 1}")
-            model.Add(2 * mid <= 2 * start + length).WithName(f"midpoint of {name} should be <= {start + length}")
-            return mid
+    if overlap in ("pairwise", "both"):
+        for name1 in movable:
+            for name2 in movable:
+                if name1 < name2:
+                    b1_left_of_b2 = model.new_bool_var(f'{name1}_left_of_{name2}')
+                    b2_left_of_b1 = model.new_bool_var(f'{name2}_left_of_{name1}')
+                    b1_above_b2 = model.new_bool_var(f'{name1}_above_{name2}')
+                    b2_above_b1 = model.new_bool_var(f'{name2}_above_{name1}')
+
+                    model.Add(positions[name1][0] + sizes[name1][0] <= positions[name2][0]).OnlyEnforceIf(b1_left_of_b2)
+                    model.Add(positions[name2][0] + sizes[name2][0] <= positions[name1][0]).OnlyEnforceIf(b2_left_of_b1)
+                    model.Add(positions[name1][1] + sizes[name1][1] <= positions[name2][1]).OnlyEnforceIf(b1_above_b2)
+                    model.Add(positions[name2][1] + sizes[name2][1] <= positions[name1][1]).OnlyEnforceIf(b2_above_b1)
+
+                    model.AddBoolOr([b1_left_of_b2, b2_left_of_b1, b1_above_b2, b2_above_b1])
+    report.mark("overlap", model)
+
+    # Interchangeable blocks go left to right (then top to bottom) in spec
+    # order, so layouts that just swap them aren't searched again.
+    # Square blocks only connected at their middle don't need to rotate.
+    for names in classes:
+        for name1, name2 in zip(names, names[1:]):
+            model.Add(position_key(*positions[name1], grid_size) < position_key(*positions[name2], grid_size))
+    for name in unrotated:
+        model.Add(rotations[name][1] == 0)
+    report.extra["symmetry"] = {
+        "classes": len(classes),
+        "blocks": sum(len(names) for names in classes),
+        "unrotated": len(unrotated),
+    }
+    if classes or unrotated:
+        print(f"Symmetry: {len(classes)} classes of interchangeable blocks "
+              f"({sum(len(names) for names in classes)} blocks), {len(unrotated)} blocks that needn't rotate")
+    report.mark("symmetry", model)
 
+    ports = PortRegistry(model, grid_size, positions, sizes, rotations)
+
+    def get_connection_point(model, name, typ, pos, hint_pos=None):
         conns_x = []
         conns_y = []
-        all_pos = []
         pos_bools = []
-        if isinstance(pos, OneOf):
-            all_pos = pos.conns
-        else:
-            all_pos = [pos]
 
         i = 0
-        for pos in all_pos:
+        for pos in port_names(pos):
             i += 1
-            conn_x = model.NewIntVar(0, grid_size[0], f'conn_x_{name}_{typ}_{pos}_{i}')
-            conn_y = model.NewIntVar(0, grid_size[1], f'conn_y_{name}_{typ}_{pos}_{i}')
+            new_port = not ports.has_port(name, pos)
+            conn_x, conn_y = ports.port(name, pos)
             pos_bool = model.new_bool_var(f"conn_{name}_{typ}_{pos}_inuse_{i}")
+            if hint_pos is not None:
+                model.add_hint(pos_bool, pos == hint_pos)
+                layout_hints.append((pos_bool, pos == hint_pos))
             pos_bools.append(pos_bool)
             conns_x.append(conn_x)
             conns_y.append(conn_y)
-            for conn in connections:
-                source_block = None
-                try:
-                    if isinstance(conn, Connection):
-                        if conn.target == name:
-                            source_block = blocks[conn.source]
-                    else:
-                        if conn[1] == name:
-                            source_block = blocks[conn[0]]
-                except KeyError:
-                    continue
-
-                if isinstance(source_block, Block) and source_block.fixed_position():
-                    model.add_hint(conn_x, source_block.fixed_x)
-                    model.add_hint(conn_y, source_block.fixed_y)
-                    break
-
-            mid_x = create_midpoint(x, width, 'x')
-            mid_y = create_midpoint(y, height, 'y')
-            if pos == "MM":
-                model.Add(conn_x == mid_x).OnlyEnforceIf(pos_bool)
-                model.Add(conn_y == mid_y).OnlyEnforceIf(pos_bool)
-                continue
-            else:
-                # Define connection points for non-rotated and rotated states
-                # Rotated is 90 degrees clockwise (top moves to the right.)
-                positions = {
-                    "TL": [(x, y), (x + width, y)],
-                    "TM": [(mid_x, y), (x + width, mid_y)],
-                    "TR": [(x + width, y), (x + width, y + height)],
-
-                    "ML": [(x, mid_y), (mid_x, y)],
-                    "LM": [(x, mid_y), (mid_x, y)],
-
-                    "MR": [(x + width, mid_y), (mid_x, y + height)],
-                    "RM": [(x + width, mid_y), (mid_x, y + height)],
-
-                    "BL": [(x, y + height), (x, y)],
-                    "BM": [(mid_x, y + height), (x, mid_y)],
-                    "BR": [(x + width, y + height), (x, y + height)]
-                }
-                if pos in positions:
-                    px_non_rotated, py_non_rotated = positions[pos][0]
-                    px_rotated, py_rotated = positions[pos][1]
-                    # if name1 == "Plastic" and name2 == "Red Circuit - RCU":
-                        # print("appending constraints")
-                        # rcu_constraints.append(conn_x)
-                        # rcu_constraints.append(conn_y)
-                        # rcu_constraints.append(x)
-                        # rcu_constraints.append(mid_y)
-                        # rcu_constraints.append(mid_x)
-                        # rcu_constraints.append(y)
-                        # rcu_constraints.append(px_non_rotated)
-                        # rcu_constraints.append(py_non_rotated)
-                        # rcu_constraints.append(px_rotated)
-                        # rcu_constraints.append(py_rotated)
-                        # rcu_constraints.append(pos_bool)
-                        # rcu_constraints.append(no_rotation)
-                        # rcu_constraints.append(rotated)
-
-                    model.Add(conn_x == px_non_rotated).OnlyEnforceIf(no_rotation, pos_bool)
-                    model.Add(conn_y == py_non_rotated).OnlyEnforceIf(no_rotation, pos_bool)
-                    model.Add(conn_x == px_rotated).OnlyEnforceIf(rotated, pos_bool)
-                    model.Add(conn_y == py_rotated).OnlyEnforceIf(rotated, pos_bool)
-
-                    # Ensure conn_x and conn_y are not constrained when pos_bool is False
-                    model.Add(conn_x != px_non_rotated).OnlyEnforceIf(pos_bool.Not())
-                    model.Add(conn_y != py_non_rotated).OnlyEnforceIf(pos_bool.Not())
-                    model.Add(conn_x != px_rotated).OnlyEnforceIf(pos_bool.Not())
-                    model.Add(conn_y != py_rotated).OnlyEnforceIf(pos_bool.Not())
-                else:
-                    raise ValueError(f"unknown position {pos}")
+            # hint each shared port once, next to whatever fixed block feeds it
+            fixed_source = index.fixed_source(name)
+            if new_port and fixed_source is not None and not (hint_positions and name in hint_positions):
+                model.add_hint(conn_x, blocks[fixed_source].fixed_x)
+                model.add_hint(conn_y, blocks[fixed_source].fixed_y)
         model.add_exactly_one(pos_bools)
         return conns_x, conns_y, pos_bools
 
-        # rotated_position = get_rotated_position(pos, is_rotated)
-
-        # if rotated_position == "LM" or rotated_position == "ML":
-            # return x, model.NewIntVar(0, grid_size[1], f'{name}_{rotated_position}_y')
-        # elif rotated_position == "TR" or rotated_position == "RT":
-            # x_tr = model.NewIntVar(0, grid_size[0], f'{name}_{rotated_position}_x')
-            # model.Add(x_tr == x + width)
-            # return x_tr, y
-        # elif rotated_position == "BL":
-            # y_bl = model.NewIntVar(0, grid_size[1], f'{name}_{rotated_position}_y')
-            # model.Add(y_bl == y + height)
-            # return x, y_bl
-        # elif rotated_position == "TL" or rotated_position == "LT":
-            # return x, y
-        # elif rotated_position == "BR":
-            # x_br = model.NewIntVar(0, grid_size[0], f'{name}_{rotated_position}_x')
-            # y_br = model.NewIntVar(0, grid_size[1], f'{name}_{rotated_position}_y')
-            # model.Add(x_br == x + width)
-            # model.Add(y_br == y + height)
-            # return x_br, y_br
-        # elif rotated_position == "RM" or rotated_position == "MR":
-            # x_rm = model.NewIntVar(0, grid_size[0], f'{name}_{rotated_position}_x')
-            # model.Add(x_rm == x + width)
-            # return x_rm, model.NewIntVar(0, grid_size[1], f'{name}_{rotated_position}_y')
-        # elif rotated_position == "TM":
-            # return model.NewIntVar(0, grid_size[0], f'{name}_{rotated_position}_x'), y
-        # elif rotated_position == "BM":
-            # y_bm = model.NewIntVar(0, grid_size[1], f'{name}_{rotated_position}_y')
-            # model.Add(y_bm == y + height)
-            # return model.NewIntVar(0, grid_size[0], f'{name}_{rotated_position}_x'), y_bm
-        # elif rotated_position == "MM":  # Default to center
-            # return model.NewIntVar(0, grid_size[0], f'{name}_{rotated_position}_x'), model.NewIntVar(0, grid_size[1], f'{name}_{rotated_position}_y')
-        # else:
-            # raise KeyError(f"Unknown rotated_positionition {rotated_position}, double check variable entry")
-
-    total_weighted_distance = model.NewIntVar(0, grid_size[0] * grid_size[1] * len(connections) * 100, 'total_weighted_distance')
-    model.add_hint(total_weighted_distance, 55000)
+    endpoints = []
+    pos_bools = []
+    for name1, name2, pos1, pos2, weight in index.connections:
+        hinted = hint_ports.get((name1, name2)) if hint_ports else None
+        start = get_connection_point(model, name1, 'start', pos1, hinted[0] if hinted else None)
+        end = get_connection_point(model, name2, 'end', pos2, hinted[1] if hinted else None)
+        pos_bools.extend(start[2])
+        pos_bools.extend(end[2])
+        endpoints.append((start, end))
+    report.extra["ports"] = {
+        "ports": ports.port_count(),
+        "references": ports.reference_count(),
+        "vars_saved": ports.vars_saved(),
+    }
+    print(f"Port registry: {ports.port_count()} ports shared by {ports.reference_count()} references, saved {ports.vars_saved()} variables")
+    report.mark("connection points", model)
+
+    max_total = sum(weight for _, _, _, _, weight in index.connections) * (grid_size[0] + grid_size[1])
+    total_weighted_distance = model.NewIntVar(0, max_total, 'total_weighted_distance')
+    if objective_upper_bound is not None:
+        model.Add(total_weighted_distance <= objective_upper_bound)
+        model.add_hint(total_weighted_distance, objective_upper_bound)
 
     weighted_distances = []
-    unweighted_distances = []
-    connection_infos = []  # Store connection information
-    debug_vars = []  # Store variables for debugging
     connection_details = []
-    pos_bools = []
 
-    for conn in connections:
+    # the weighted distance terms of each connection, one per combination
+    connection_terms = []
+    for (name1, name2, pos1, pos2, weight), (start, end) in zip(index.connections, endpoints):
         combination_vars = []
-        if isinstance(conn, Connection):
-            name1, name2, pos1, pos2, weight = conn.source, conn.target, conn.source_pos, conn.target_pos, conn.weight
-        else:
-            name1, name2, pos1, pos2 = conn
-            weight = 1  # Default weight for tuple connections
-
-        if name1 not in positions or name2 not in positions:
-            continue
-        connection_infos.append((f"{name1}-{name2}", weight))  # Store connection name and weight
+        connection_terms.append([])
 
         x1, y1 = positions[name1]
         x2, y2 = positions[name2]
-        w1, h1 = sizes[name1]
-        w2, h2 = sizes[name2]
 
-        (no_rotation1, rotated1) = rotations[name1]
-        (no_rotation2, rotated2) = rotations[name2]
-
-        starts_x, starts_y, pos_bools_start = get_connection_point(model, name1, 'start', pos1, x1, y1, w1, h1, no_rotation1, rotated1)
-        ends_x, ends_y, ends_pos_bools = get_connection_point(model, name2, 'end', pos2, x2, y2, w2, h2, no_rotation2, rotated2)
-        pos_bools.extend(pos_bools_start)
-        pos_bools.extend(ends_pos_bools)
+        starts_x, starts_y, pos_bools_start = start
+        ends_x, ends_y, ends_pos_bools = end
+        start_names = port_names(pos1)
+        end_names = port_names(pos2)
+        hinted = hint_ports.get((name1, name2)) if hint_ports else None
 
         start_indices = range(len(starts_x))
         end_indices = range(len(ends_x))
@@ -346,6 +598,8 @@ def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rota
             model.Add(combination_var <= start_combo_activated)
             model.Add(combination_var <= end_combo_activated)
             model.Add(combination_var >= start_combo_activated + end_combo_activated - 1)
+            if hinted:
+                model.add_hint(combination_var, (start_names[start_index], end_names[end_index]) == tuple(hinted))
 
             # Create variables and constraints for this combination
             dx = model.NewIntVar(-grid_size[0], grid_size[0], f'dx_{name1}_{name2}_{start_x}_{start_y}_{end_x}_{end_y}')
@@ -387,36 +641,90 @@ def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rota
                 # combo_vars.append(abs_dy)
                 # combo_vars.append(manhattan_distance)
                 # combo_vars.append(weighted_distance)
-            connection_details.append((combination_var, name1, name2, start_x, start_y, end_x, end_y))
+            connection_details.append((combination_var, name1, name2, start_x, start_y, end_x, end_y,
+                                       start_names[start_index], end_names[end_index], weight))
             weighted_distances.append(weighted_distance)
+            connection_terms[-1].append(weighted_distance)
 
         # Ensure exactly one combination is chosen
         model.AddExactlyOne(combination_vars)
 
-        debug_vars.append({
-            'name': f"{name1}-{name2}",
-            'dx': dx,
-            'dy': dy,
-            'abs_dx': abs_dx,
-            'abs_dy': abs_dy,
-            'distance': manhattan_distance,
-            'weighted_distance': weighted_distance,
-            'center_x1': x1,
-            'center_y1': y1,
-            'center_x2': x2,
-            'center_y2': y2
-        })
 
     model.Add(total_weighted_distance == sum(weighted_distances))
-    model.Minimize(total_weighted_distance)
 
-    # Solve
+    # Redundant lower bounds (see bounds.py) so the relaxation doesn't start
+    # from 0: per connection, per hub, and on the total.
+    lower_bounds = []
+    for (name1, name2, pos1, pos2, weight), terms in zip(index.connections, connection_terms):
+        bound = weight * connection_lower_bound(blocks, name1, name2, pos1, pos2, grid_size, position_bounds)
+        if bound > 0:
+            model.Add(sum(terms) >= bound)
+        lower_bounds.append(bound)
+    bounded_hubs = 0
+    for hub in blocks:
+        ends, hub_connections = hub_ends(blocks, index, hub)
+        bound = hub_lower_bound(blocks, hub, ends)
+        if bound > sum(lower_bounds[i] for i in hub_connections):
+            model.Add(sum(term for i in hub_connections for term in connection_terms[i]) >= bound)
+            bounded_hubs += 1
+    model.Add(total_weighted_distance >= sum(lower_bounds))
+    report.extra["lower_bounds"] = {
+        "total": sum(lower_bounds),
+        "connections": sum(1 for bound in lower_bounds if bound > 0),
+        "hubs": bounded_hubs,
+    }
+    print(f"Lower bounds: {report.extra['lower_bounds']['connections']} connections and {bounded_hubs} hubs, "
+          f"total distance at least {sum(lower_bounds)}")
+    model.Minimize(total_weighted_distance)
+    report.mark("distance objective", model)
+    report.end_build()
+
+    if layout_hints:
+        # A hint that only covers positions, rotations and ports leaves
+        # thousands of derived variables for CP-SAT to repair, which can take
+        # longer than finding a fresh solution. Fill the rest in first.
+        started = time.perf_counter()
+        complete = complete_hint(model, layout_hints, 2.0 if build_only else min(2.0, max_time / 10))
+        hint_seconds = time.perf_counter() - started
+        max_time = max(max_time - hint_seconds, 0.1)
+        report.extra["hint"] = {"layout_hints": len(layout_hints), "completed": complete, "seconds": hint_seconds}
+
+    if save_model is not None:
+        # imported here because savedmodel imports this module
+        from savedmodel import save_model as save
+        save(save_model, model, blocks, connections, grid_size, positions, rotations, total_weighted_distance,
+             connection_details, obstacles, classes, unrotated)
+        report.extra["saved_model"] = save_model
+    if build_only:
+        return None, None, None, None
+
+    return solve_model(model, positions, rotations, total_weighted_distance, connection_details, max_time,
+                       report=report, seed=seed, num_workers=num_workers, solver_params=solver_params,
+                       log_search=log_search, on_solution=on_solution, stop_rules=stop_rules, progress=progress,
+                       verify=(blocks, connections, grid_size, obstacles))
+
+
+def solve_model(model, positions, rotations, total_weighted_distance, connection_details, max_time, report=None,
+                seed=None, num_workers=None, solver_params=None, log_search=True, on_solution=None,
+                stop_rules=None, progress=None, verify=None):
+    """Solve a model optimize_factory_layout built (or savedmodel loaded)
+    and read the layout out of it.
+
+    positions and rotations map block names to their (x, y) variables and
+    (not rotated, rotated) literals. verify, a (blocks, connections, grid
+    size, obstacles) tuple, checks the layout with evaluate.verify_layout.
+    The other arguments are as for optimize_factory_layout, whose return
+    value this is.
+    """
+    if report is None:
+        report = BuildReport()
+        report.begin(model)
     # print(model.Proto())
     solver = cp_model.CpSolver()
     solver.parameters.max_time_in_seconds = max_time
-    solver.parameters.num_search_workers = 16
-    solver.parameters.log_search_progress = True
-    solver.parameters.log_subsolver_statistics = True
+    solver.parameters.num_search_workers = num_workers or os.cpu_count()
+    solver.parameters.log_search_progress = log_search
+    solver.parameters.log_subsolver_statistics = log_search
     # solver.parameters.extra_subsolvers.append("lb_tree_search")
     # solver.parameters.ignore_subsolvers.append("reduced_costs")
     # solver.parameters.ignore_subsolvers.append("pseudo_costs")
@@ -429,16 +737,53 @@ def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rota
     # solver.parameters.use_energetic_reasoning_in_no_overlap_2d = True
     # solver.parameters.max_pairs_pairwise_reasoning_in_no_overlap_2d = True
     solver.parameters.randomize_search = True
-    solver.parameters.random_seed = random.randint(0, 10000)  # Add randomness
+    if seed is None:
+        seed = random.randint(0, 10000)  # Add randomness
+    solver.parameters.random_seed = seed
     # solver.parameters.optimize_with_core = True
     # solver.parameters.optimize_with_lb_tree_search = True
-
-    solution_printer = VarArraySolutionPrinter(all_vars)
+    for key, value in (solver_params or {}).items():
+        if isinstance(value, (list, tuple)):
+            getattr(solver.parameters, key).extend(value)
+        else:
+            setattr(solver.parameters, key, value)
+
+    watchdog = None
+    if stop_rules is not None and stop_rules.no_improvement is not None:
+        watchdog = Watchdog(stop_rules.no_improvement, solver.StopSearch)
+
+    def on_improvement(wall_time, objective, bound):
+        if watchdog is not None:
+            watchdog.improved()
+        if on_solution is not None:
+            on_solution(wall_time, objective, bound)
+
+    if progress is not None:
+        progress.set_layout(list(positions), [pos[0] for pos in positions.values()],
+                            [pos[1] for pos in positions.values()], [rotations[name][1] for name in positions])
+    solution_printer = VarArraySolutionPrinter([var for pos in positions.values() for var in pos], on_improvement,
+                                               stop_rules, progress)
     best_seen = None
     best_positions = None
     best_connection_details = None
     best_solver = None
     status = solver.Solve(model, solution_printer)
+    stop_reason = solution_printer.stop_reason
+    if watchdog is not None:
+        watchdog.cancel()
+        if watchdog.fired and stop_reason is None:
+            stop_reason = "no_improvement"
+    report.mark("solve", model)
+    report.extra["solve"] = {
+        "status": solver.StatusName(status),
+        "objective": solver.ObjectiveValue() if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None,
+        "best_bound": solver.BestObjectiveBound(),
+        "wall_time": solver.WallTime(),
+        "solutions": solution_printer.solution_count(),
+        "seed": seed,
+        "history": solution_printer.history(),
+        "stop_reason": stop_reason,
+    }
 
     print(f"Solver status: {solver.StatusName(status)}")
     if status == cp_model.INFEASIBLE:
@@ -457,79 +802,18 @@ def optimize_factory_layout(blocks, connections, grid_size, max_time, allow_rota
             ) for name, pos in positions.items() }
             best_connection_details = connection_details
 
-        for bol in pos_bools:
-            # if solver.BooleanValue(bol):
-                # print(bol)
-            # else:
-                # print(f"not chosen: {bol}")
-            pass
-
-        for connection in connection_details:
-            pass
-            # print(f"connection: {connection}")
-            # if solver.BooleanValue(connection[0]):
-                # chosen_connections.append({
-                    # 'start_x': solver.Value(connection[1]),
-                    # 'start_y': solver.Value(connection[2]),
-                    # 'end_x': solver.Value(connection[3]),
-                    # 'end_y': solver.Value(connection[4])
-                # })
-
-        total_unweighted_distance = sum(solver.Value(d) for d in unweighted_distances)
-
-        """
-        print(f"Total weighted distance: {total_weighted_distance_value}")
-        print(f"Total unweighted distance: {total_unweighted_distance}")
-
-        print("Connection details:")
-        for i, ((name, original_weight), weighted_dist, unweighted_dist) in enumerate(zip(connection_infos, weighted_distances, unweighted_distances)):
-            name1, name2 = name.split('-')
-            x1, y1 = solver.Value(positions[name1][0]), solver.Value(positions[name1][1])
-            x2, y2 = solver.Value(positions[name2][0]), solver.Value(positions[name2][1])
-            w1, h1 = solver.Value(sizes[name1][0]), solver.Value(sizes[name1][1])
-            w2, h2 = solver.Value(sizes[name2][0]), solver.Value(sizes[name2][1])
-
-            center_x1 = x1 + w1 // 2
-            center_y1 = y1 + h1 // 2
-            center_x2 = x2 + w2 // 2
-            center_y2 = y2 + h2 // 2
-
-            calc_dx = abs(center_x2 - center_x1)
-            calc_dy = abs(center_y2 - center_y1)
-            calc_distance = calc_dx + calc_dy
-
-            unweighted_value = solver.Value(unweighted_dist)
-            weighted_value = solver.Value(weighted_dist)
-
-            print(f"  {name}:")
-            print(f"    Block 1 ({name1}): position ({x1}, {y1}), size ({w1}, {h1}), center ({center_x1}, {center_y1})")
-            print(f"    Block 2 ({name2}): position ({x2}, {y2}), size ({w2}, {h2}), center ({center_x2}, {center_y2})")
-            print(f"    Calculated |dx|: {calc_dx}, |dy|: {calc_dy}")
-            print(f"    Calculated distance: {calc_distance}")
-            print(f"    Solver distance: {unweighted_value}")
-            print(f"    Weight: {original_weight}")
-            print(f"    Weighted distance: {weighted_value}")
-
-            if calc_distance != unweighted_value:
-                print(f"    WARNING: Calculated distance does not match solver distance!")
-            if weighted_value != unweighted_value * original_weight:
-                print(f"    WARNING: Weighted distance does not match unweighted distance * weight!")
-
-        print("\nDetailed Debug Information:")
-        for vars in debug_vars:
-            print(f"Connection: {vars['name']}")
-            print(f"  center_x1: {solver.Value(vars['center_x1'])}")
-            print(f"  center_y1: {solver.Value(vars['center_y1'])}")
-            print(f"  center_x2: {solver.Value(vars['center_x2'])}")
-            print(f"  center_y2: {solver.Value(vars['center_y2'])}")
-            print(f"  dx: {solver.Value(vars['dx'])}")
-            print(f"  dy: {solver.Value(vars['dy'])}")
-            print(f"  abs_dx: {solver.Value(vars['abs_dx'])}")
-            print(f"  abs_dy: {solver.Value(vars['abs_dy'])}")
-            print(f"  distance: {solver.Value(vars['distance'])}")
-            print(f"  weighted_distance: {solver.Value(vars['weighted_distance'])}")
-            print()
-        """
+        if verify is not None:
+            # check the solver against an independent scoring of its layout
+            blocks, connections, grid_size, obstacles = verify
+            chosen = [(d[7], d[8]) for d in connection_details if solver.BooleanValue(d[0])]
+            problems = verify_layout(blocks, connections, grid_size, best_positions, best_seen, chosen, obstacles)
+            report.extra["verify"] = {"problems": problems}
+            for problem in problems:
+                print(f"Verification failed: {problem}")
+    if progress is not None:
+        progress.finish(solver.WallTime(), best_seen, solver.BestObjectiveBound(),
+                        solution_printer.solution_count(), solver.StatusName(status), best_positions)
+    report.mark("extraction", model)
 
     return best_solver, best_positions, best_seen, best_connection_details
 
@@ -574,23 +858,6 @@ def get_connection_point(x, y, width, height, position, is_rotated):
         raise KeyError(f"Unknown position {position}, double check variable entry")
 
 
-def get_font_property(size):
-    # Try to use Titillium Web first, then DejaVu Sans, then fall back to default sans-serif
-    for font_name in ['DejaVu Sans', 'sans-serif']:
-        try:
-            return FontProperties(family=font_name, size=size)
-        except:
-            continue
-    return FontProperties(family='sans-serif', size=size)
-
-def estimate_text_height(text, font_prop, width):
-    # Estimate text height based on font properties and width
-    font_size = font_prop.get_size_in_points()
-    char_width = font_size * 0.6  # Rough estimate of character width
-    chars_per_line = max(1, int(width / char_width))
-    lines = [text[i:i+chars_per_line] for i in range(0, len(text), chars_per_line)]
-    return len(lines) * font_size * 1.2  # 1.2 for line spacing
-
 def get_chosen_connections(solver, connection_details):
     chosen_connections = []
     for connection in connection_details:
@@ -604,145 +871,84 @@ def get_chosen_connections(solver, connection_details):
             })
     return chosen_connections
 
-def visualize_layout(solver, blocks, connection_details, optimal_positions, grid_size, total_distance):
-    # for val in rcu_constraints:
-        # print(val)
-        # print(solver.Value(val))
-    # print("combo_vars ===============================")
-    # for var in combo_vars:
-        # print(var)
-        # print(solver.Value(var))
-    fig, ax = plt.subplots(figsize=(12, 12))
-    ax.set_xlim(0, grid_size[0])
-    ax.set_ylim(0, grid_size[1])
-    ax.invert_yaxis()
-
-    ax.set_xticks(range(0, grid_size[0] + 1, 16))
-    ax.set_yticks(range(0, grid_size[1] + 1, 16))
-    ax.grid(which='both', color='lightgray', linestyle='-', linewidth=0.5, alpha=0.5)
-    ax.set_axisbelow(True)
-
-    # Draw blocks
-    for name, block_info in blocks.items():
-        if isinstance(block_info, Block):
-            width, height = block_info.width, block_info.height
-        else:
-            width, height = block_info
-
-        x, y, is_rotated = optimal_positions[name]
-        if is_rotated:
-            width, height = height, width
-        rect = patches.Rectangle((x, y), width, height, fill=False, edgecolor='blue')
-        ax.add_patch(rect)
-
-        # Create text with auto-wrapping and size adjustment
-        max_fontsize = 12
-        min_fontsize = 6
-
-        best_text = None
-        best_fontsize = min_fontsize
-
-        for fontsize in range(max_fontsize, min_fontsize-1, -1):
-            font_prop = get_font_property(fontsize)
-            estimated_height = estimate_text_height(name, font_prop, width * 0.9)
-
-            if estimated_height <= height * 0.9:
-                best_fontsize = fontsize
-                break
-
-        # Create the text with the best font size
-        font_prop = get_font_property(best_fontsize)
-        wrapped_text = wrap_text(name, width * 0.9, font_prop)
-        best_text = ax.text(x + width/2, y + height/2, '\n'.join(wrapped_text),
-                            ha='center', va='center', fontproperties=font_prop,
-                            wrap=True)
-
-        # Truncate text if it's still too tall
-        # while len(wrapped_text) > 1:
-            # estimated_height = estimate_text_height('\n'.join(wrapped_text), font_prop, width * 0.9)
-            # if estimated_height <= height * 0.9:
-                # break
-            # wrapped_text = wrapped_text[:-1]
-            # wrapped_text[-1] += '...'
-            # best_text.set_text('\n'.join(wrapped_text))
-
-    # Draw connections
-    chosen_conns = get_chosen_connections(solver, connection_details)
-    for conn in chosen_conns:
-        start_x, start_y, end_x, end_y = conn['start_x'], conn['start_y'], conn['end_x'], conn['end_y']
-        """
-        try:
-            x1, y1, is_rotated1 = optimal_positions[name1]
-            x2, y2, is_rotated2 = optimal_positions[name2]
-        except KeyError:
-            continue
-        block_info = blocks[name1]
-        if isinstance(block_info, Block):
-            w1, h1 = block_info.width, block_info.height
-        else:
-            w1, h1 = block_info
-        block_info = blocks[name2]
-        if isinstance(block_info, Block):
-            w2, h2 = block_info.width, block_info.height
-        else:
-            w2, h2 = block_info
-
-        if is_rotated1:
-            w1, h1 = h1, w1
-        if is_rotated2:
-            w2, h2 = h2, w2
-
-        # Get start and end points based on specified positions
-        start_x, start_y = get_connection_point(x1, y1, w1, h1, pos1, is_rotated1)
-        end_x, end_y = get_connection_point(x2, y2, w2, h2, pos2, is_rotated2)
-        """
-
-        # Calculate vector and shorten the end point
-        dx, dy = end_x - start_x, end_y - start_y
-        # length = math.sqrt(dx**2 + dy**2)
-        # shorten_factor = 5  # Pixels to shorten by
-        # if length > shorten_factor:
-            # end_x -= (dx / length) * shorten_factor
-            # end_y -= (dy / length) * shorten_factor
-
-        # Draw the arrow
-        ax.annotate('', xy=(end_x, end_y), xytext=(start_x, start_y),
-                    arrowprops=dict(arrowstyle='->', color='#FF9999', lw=1),
-                    annotation_clip=False)
-
-    watermark_text = f"github.com/kevinburke/factorio-layout-optimizer\ndistance: {total_distance}"
-    ax.text(0.99, 0.01, watermark_text,
-            horizontalalignment='right',
-            verticalalignment='bottom',
-            transform=ax.transAxes,
-            fontsize=8, alpha=0.7)
-
-    plt.tight_layout()
-    plt.show()
-
-def wrap_text(text, max_width, font_prop):
-    """Wrap text to fit within a given width."""
-    words = text.split()
-    lines = []
-    current_line = words[0]
-
-    for word in words[1:]:
-        test_line = current_line + " " + word
-        if estimate_text_height(test_line, font_prop, max_width) <= font_prop.get_size_in_points() * 1.2:
-            current_line = test_line
-        else:
-            lines.append(current_line)
-            current_line = word
-
-    lines.append(current_line)
-    return lines
+def get_chosen_ports(solver, connection_details):
+    """{(source, target): (source port, target port)} for the ports each
+    connection ended up using."""
+    chosen_ports = {}
+    for connection in connection_details:
+        if solver.BooleanValue(connection[0]):
+            chosen_ports.setdefault((connection[1], connection[2]), (connection[7], connection[8]))
+    return chosen_ports
 
 def main():
-    parser = argparse.ArgumentParser(description="Optimize Factorio factory layout")
+    if sys.argv[1:2] == ["solve-model"]:
+        # imported here because savedmodel imports this module
+        from savedmodel import solve_model_command
+        sys.exit(solve_model_command(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Optimize Factorio factory layout",
+                                     epilog="'main.py solve-model PATH' solves a model saved with --save-model instead")
+    parser.add_argument("--spec", default="base",
+                        help=f"What to lay out: {', '.join(SPECS)} (from factorio.py), or a module or .py file with blocks, connections and grid_size")
     parser.add_argument("--fast", action="store_true", help="Use fast mode (15 seconds solver time)")
     parser.add_argument("--time", type=int, default=240.0, help="Amount of time to run the solver for")
     parser.add_argument("--runs", type=int, default=5, help="Number of runs")
+    parser.add_argument("--overlap", choices=OVERLAP_MODES, default="pairwise",
+                        help="How to keep blocks from overlapping: pairwise disjunctions, CP-SAT's native no_overlap_2d, or both")
+    parser.add_argument("--report", help="Write per-phase build/solve timings and model sizes to this JSON file")
+    parser.add_argument("--profile", action="store_true", help="Include a cProfile of the model build in --report")
+    parser.add_argument("--trace-memory", action="store_true", help="Include a tracemalloc snapshot of the model build in --report")
+    parser.add_argument("--store", default="results.sqlite", help="SQLite file to record runs in and warm-start from")
+    parser.add_argument("--no-store", action="store_true", help="Don't record this run or warm-start from earlier ones")
+    parser.add_argument("--restart", choices=("warm", "fresh"), default="warm",
+                        help="warm: hint each run with the best layout and ports so far and only accept improvements; fresh: independent random restarts")
+    parser.add_argument("--portfolio", type=int, default=0, metavar="N",
+                        help="Instead of sequential runs, solve N differently-configured models at once in separate processes, sharing the cores and the time budget")
+    parser.add_argument("--workers", type=int, help="CP-SAT search workers per solve (default: all cores)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Re-solve every time factorio.py is saved, only moving the blocks the edit touched")
+    parser.add_argument("--watch-time", type=float, default=10, help="Seconds to spend on each --watch re-solve")
+    parser.add_argument("--watch-hops", type=int, default=1,
+                        help="With --watch, also free blocks up to this many connections away from an edited block")
+    parser.add_argument("--watch-slack", type=int, default=0,
+                        help="With --watch, let untouched blocks move this many tiles instead of pinning them")
+    parser.add_argument("--engine", choices=("cp-sat", "anneal"), default="cp-sat",
+                        help="cp-sat: the exact model; anneal: simulated annealing, one annealer per --workers (default: all cores)")
+    parser.add_argument("--out", metavar="PATH",
+                        help="Write the layout picture to this .png or .svg file instead of opening a window")
+    parser.add_argument("--raster", type=int, metavar="SCALE",
+                        help="With a .png --out, paint the layout straight into an image at SCALE pixels per tile instead of drawing it with matplotlib")
+    parser.add_argument("--mask", help="ASCII map ('#' is blocked) or image (dark is blocked) of tiles no block may cover, one character or pixel per tile")
+    parser.add_argument("--lns", action="store_true",
+                        help="Instead of sequential runs, improve one layout by repeatedly re-solving small neighbourhoods of blocks with the rest pinned")
+    parser.add_argument("--lns-size", type=int, default=8, help="Blocks to free in each --lns neighbourhood (adapted as it runs)")
+    parser.add_argument("--lns-hub", action="append", metavar="BLOCK",
+                        help="Grow --lns hub neighbourhoods out of this block (repeatable; default: any block, the more connected the likelier)")
+    parser.add_argument("--lns-time", type=float, default=5, help="Seconds to spend on each --lns neighbourhood")
+    parser.add_argument("--cluster", type=int, default=0, metavar="N",
+                        help="Instead of sequential runs, lay out clusters of up to N connected blocks on their own, place the clusters, then refine with --lns")
+    parser.add_argument("--staged", type=int, default=0, metavar="SCALE",
+                        help="Instead of sequential runs, solve on a grid SCALE times coarser first, then at full resolution with rotation, then with the real ports")
+    parser.add_argument("--no-refine", action="store_true", help="With --cluster, skip the refinement pass across cluster boundaries")
+    parser.add_argument("--stall", type=float, metavar="SECONDS",
+                        help="End a solve once it goes this long without a better layout; --runs hands the time on to the next run")
+    parser.add_argument("--gap", type=float, help="End the search once (objective - bound) / objective is at most this")
+    parser.add_argument("--target", type=int, help="End the search once the distance is at most this")
+    parser.add_argument("--progress", metavar="PATH",
+                        help="Append a JSON line per improving solution (time, objective, bound) to this file, or '-' for stdout")
+    parser.add_argument("--progress-positions", action="store_true", help="Include block positions in --progress records")
+    parser.add_argument("--progress-interval", type=float, default=1.0,
+                        help="Seconds between --progress writes, and between records with positions")
+    parser.add_argument("--save-model", metavar="PATH",
+                        help="Save the first run's model (see 'main.py solve-model'); with --time 0, just save it")
+    parser.add_argument("--load-model", metavar="PATH",
+                        help="Solve a model saved with --save-model instead of building one, in sequential runs or --portfolio")
+    parser.add_argument("--adaptive", type=int, default=0, metavar="N",
+                        help="Instead of sequential runs, try N solver configurations one after another and keep giving the better half more time")
     args = parser.parse_args()
+    if args.raster and not (args.out or "").lower().endswith(".png"):
+        parser.error("--raster needs a .png --out")
+    blocks, connections, grid_size = load_spec(args.spec)
 
     if args.fast:
         max_time = 15
@@ -752,23 +958,179 @@ def main():
         runs = args.runs
 
     # print("Attempting to solve with rotation...")
-    print(f"blocks: {blocks}")
     best_positions = None
     best_total_distance = None
     best_solver = None
     best_connection_details = None
-    for i in range(runs):
-        solver, optimal_positions, total_distance, connection_details = optimize_factory_layout(blocks, connections, grid_size, max_time / runs, allow_rotation=True)
-        if best_total_distance is None or total_distance < best_total_distance:
-            best_total_distance = total_distance
-            best_positions = optimal_positions
-            best_solver = solver
-            best_connection_details = connection_details
+    reports = []
+
+    obstacles = load_mask(args.mask) if args.mask else None
+    store = None
+    hint_positions, hint_ports, upper_bound = None, None, None
+    if not args.no_store:
+        store = ResultsStore(args.store)
+        hint_positions, upper_bound = store.warm_start(blocks, connections, grid_size, obstacles=obstacles)
+        if hint_positions:
+            print(f"Warm-starting from {len(hint_positions)} stored block positions, objective bound {upper_bound}")
+
+    stop_rules = StopRules(args.stall, args.gap, args.target)
+    progress = None
+    if args.progress:
+        progress = ProgressLog(args.progress, args.progress_positions, args.progress_interval)
+
+    saved = None
+    if args.load_model:
+        # imported here because savedmodel imports this module
+        from savedmodel import load_model, solve_saved_model
+        saved = load_model(args.load_model)
+        if saved.mapping["spec"] != canonical_spec(blocks, connections, grid_size):
+            parser.error(f"{args.load_model} was built from a different spec; solve it with 'main.py solve-model'")
+        if sorted(saved.obstacles) != sorted(tuple(rect) for rect in obstacles or []):
+            parser.error(f"{args.load_model} was built with a different --mask; solve it with 'main.py solve-model'")
+        if args.adaptive:
+            parser.error("--adaptive builds a model per configuration and can't use --load-model")
+    elif args.save_model and max_time == 0:
+        optimize_factory_layout(blocks, connections, grid_size, 0, allow_rotation=True, overlap=args.overlap,
+                                hint_positions=hint_positions, hint_ports=hint_ports,
+                                objective_upper_bound=upper_bound, obstacles=obstacles, save_model=args.save_model,
+                                build_only=True)
+        print(f"Saved the model to {args.save_model}")
+        return
+
+    if args.watch:
+        # imported here because incremental imports this module
+        from incremental import watch
+        module_name, attribute = SPECS.get(args.spec, (args.spec, "blocks"))
+        if attribute != "blocks" or module_name.endswith(".py"):
+            parser.error("--watch takes the base spec or a spec module's name")
+        watch(module_name, args.watch_time, max_time, store=store, hops=args.watch_hops, slack=args.watch_slack,
+              overlap=args.overlap, num_workers=args.workers, obstacles=obstacles)
+        return
+
+    best_chosen_connections = None
+    if args.engine == "anneal" or args.lns or args.cluster or args.staged:
+        if args.engine == "anneal":
+            # imported here because anneal imports this module
+            from anneal import run_anneal
+            best = run_anneal(blocks, connections, grid_size, max_time, workers=args.workers,
+                              hint_positions=hint_positions, obstacles=obstacles)
+            params = {"max_time": max_time, "engine": "anneal"}
+        elif args.staged:
+            # imported here because staged imports this module
+            from staged import staged_solve
+            best = staged_solve(blocks, connections, grid_size, max_time, scale=args.staged, overlap=args.overlap,
+                                num_workers=args.workers, obstacles=obstacles)
+            params = {"max_time": max_time, "overlap": args.overlap, "staged": args.staged}
+        elif args.cluster:
+            # imported here because cluster imports this module
+            from cluster import hierarchical_solve
+            best = hierarchical_solve(blocks, connections, grid_size, max_time, max_cluster_size=args.cluster,
+                                      refine=not args.no_refine, overlap=args.overlap, num_workers=args.workers,
+                                      obstacles=obstacles)
+            params = {"max_time": max_time, "overlap": args.overlap, "cluster": args.cluster}
+        else:
+            # imported here because lns imports this module
+            from lns import run_lns
+            best = run_lns(blocks, connections, grid_size, max_time, neighbourhood_size=args.lns_size,
+                           iteration_time=args.lns_time, hubs=args.lns_hub,
+                           hint_positions=hint_positions, hint_ports=hint_ports, objective_upper_bound=upper_bound,
+                           overlap=args.overlap, num_workers=args.workers, obstacles=obstacles)
+            params = {"max_time": max_time, "overlap": args.overlap, "lns": args.lns_size}
+        if best is not None:
+            if store is not None:
+                solve = {"status": "FEASIBLE", "objective": best["distance"], "history": []}
+                store.record_run(blocks, connections, grid_size, params, {"solve": solve}, best["positions"],
+                                 obstacles)
+            best_positions = best["positions"]
+            best_total_distance = best["distance"]
+            best_chosen_connections = best["chosen_connections"]
+    elif args.portfolio or args.adaptive:
+        # imported here because portfolio and schedule import this module
+        from portfolio import portfolio_configs, run_portfolio
+        from schedule import run_adaptive
+        if args.adaptive:
+            configs = portfolio_configs(args.adaptive, random.randint(0, 10000), cores=args.workers)
+            for config in configs:
+                # one solve at a time, so each gets every core
+                config["num_workers"] = args.workers or os.cpu_count()
+            best, results = run_adaptive(blocks, connections, grid_size, max_time, configs, stop_rules,
+                                         hint_positions=hint_positions, hint_ports=hint_ports,
+                                         objective_upper_bound=upper_bound, obstacles=obstacles, progress=progress)
+        else:
+            best, results = run_portfolio(blocks, connections, grid_size, max_time, args.portfolio, cores=args.workers,
+                                          base_seed=random.randint(0, 10000), hint_positions=hint_positions,
+                                          hint_ports=hint_ports, objective_upper_bound=upper_bound, obstacles=obstacles,
+                                          stop_rules=stop_rules, progress=progress, saved_model=args.load_model)
+        for result in results:
+            reports.append(result["report"])
+            if store is not None:
+                params = {"max_time": max_time, "allow_rotation": True, "portfolio": result["config"]}
+                store.record_run(blocks, connections, grid_size, params, result["report"], result["positions"],
+                                 obstacles)
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump({"runs": reports}, f, indent=2)
+        if best is not None:
+            best_positions = best["positions"]
+            best_total_distance = best["distance"]
+            best_chosen_connections = best["chosen_connections"]
+    else:
+        solve_time = 0
+        for i in range(runs):
+            # a run that stopped early (--stall) leaves its time to the rest
+            run_time = (max_time - solve_time) / (runs - i)
+            report = BuildReport(profile=args.profile, trace_memory=args.trace_memory)
+            run_progress = progress.tagged(run=i) if progress else None
+            if saved is not None:
+                solver, optimal_positions, total_distance, connection_details = solve_saved_model(
+                    saved, run_time, report=report, hint_positions=hint_positions, hint_ports=hint_ports,
+                    objective_upper_bound=upper_bound, num_workers=args.workers, stop_rules=stop_rules,
+                    progress=run_progress)
+            else:
+                solver, optimal_positions, total_distance, connection_details = optimize_factory_layout(
+                    blocks, connections, grid_size, run_time, allow_rotation=True, overlap=args.overlap,
+                    report=report, hint_positions=hint_positions, hint_ports=hint_ports,
+                    objective_upper_bound=upper_bound, num_workers=args.workers, obstacles=obstacles,
+                    stop_rules=stop_rules, progress=run_progress, save_model=args.save_model if i == 0 else None)
+            solve_time += report.extra["solve"]["wall_time"]
+            reports.append(report.to_dict())
+            if args.report:
+                with open(args.report, "w") as f:
+                    json.dump({"runs": reports}, f, indent=2)
+            if store is not None:
+                params = {"max_time": run_time, "overlap": args.overlap, "allow_rotation": True}
+                store.record_run(blocks, connections, grid_size, params, reports[-1], optimal_positions, obstacles)
+            if total_distance is None:
+                continue
+            if best_total_distance is None or total_distance < best_total_distance:
+                best_total_distance = total_distance
+                best_positions = optimal_positions
+                best_solver = solver
+                best_connection_details = connection_details
+                best_chosen_connections = get_chosen_connections(solver, connection_details)
+            if args.restart == "warm":
+                hint_positions = best_positions
+                hint_ports = get_chosen_ports(best_solver, best_connection_details)
+                upper_bound = best_total_distance
+            if report.extra["solve"]["stop_reason"] in ("gap", "target"):
+                break
 
+    if progress is not None:
+        progress.close()
     if best_positions:
         for name, (x, y, is_rotated) in best_positions.items():
             print(f"{name}: position ({x}, {y}), {'rotated' if is_rotated else 'not rotated'}")
-        visualize_layout(best_solver, blocks, best_connection_details, best_positions, grid_size, best_total_distance)
+        if args.raster:
+            from raster import render_layout
+            render_layout(blocks, connections, grid_size, best_positions, args.out, best_chosen_connections,
+                          obstacles, args.raster)
+        else:
+            # imported here because matplotlib is slow to import
+            from render import visualize_layout
+            visualize_layout(blocks, best_chosen_connections, best_positions, grid_size, best_total_distance,
+                             out=args.out)
+        if args.out:
+            print(f"Layout written to {args.out}")
     else:
         print("No solution found in either attempt.")
 
@@ -1,13 +1,198 @@
-def test_connection_point_logic():
-            starts_x, starts_y, pos_bools_start = get_connection_point(model, name1, 'start', pos1, x1, y1, w1, h1, no_rotation1, rotated1)
-        ends_x, ends_y, ends_pos_bools = get_connection_point(model, name2, 'end', pos2, x2, y2, w2, h2, no_rotation2, rotated2)
-        pos_bools.extend(pos_bools_start)
-        pos_bools.extend(ends_pos_bools)
-
-        start_indices = range(len(starts_x))
-        end_indices = range(len(ends_x))
-
-        for (start_index, start_x, start_y), (end_index, end_x, end_y) in product(
-                zip(start_indices, starts_x, starts_y),
-                zip(end_indices, ends_x, ends_y)
-            ):
+import subprocess
+import sys
+
+import pytest
+from ortools.sat.python import cp_model
+
+from factorio import Block, Connection, OneOf
+from main import OVERLAP_MODES, ConnectionIndex, PortRegistry, get_chosen_ports, optimize_factory_layout
+from report import BuildReport
+
+test_blocks = {
+    "Coal Mine": Block(1, 1, fixed_x=0, fixed_y=0),
+    "Iron Smelting": (6, 3),
+    "Green Circuit Assembly": (4, 4),
+    "Red Science": (3, 2),
+}
+
+test_connections = [
+    ("Coal Mine", "Iron Smelting", "MM", "LM"),
+    Connection("Iron Smelting", "Green Circuit Assembly", OneOf("LM", "RM"), "BM", 2),
+    ("Green Circuit Assembly", "Red Science", "BM", "TL"),
+    # blocks that aren't in the spec are skipped
+    ("Light Oil Cracking", "Red Science", "MM", "MM"),
+]
+
+test_grid_size = (16, 16)
+
+
+def block_rects(blocks, positions):
+    rects = {}
+    for name, block_info in blocks.items():
+        if isinstance(block_info, Block):
+            width, height = block_info.width, block_info.height
+        else:
+            width, height = block_info
+        x, y, is_rotated = positions[name]
+        if is_rotated:
+            width, height = height, width
+        rects[name] = (x, y, width, height)
+    return rects
+
+
+def assert_valid_layout(blocks, positions, grid_size):
+    rects = block_rects(blocks, positions)
+    for name, (x, y, w, h) in rects.items():
+        assert 0 <= x and x + w <= grid_size[0], name
+        assert 0 <= y and y + h <= grid_size[1], name
+    names = sorted(rects)
+    for i, name1 in enumerate(names):
+        x1, y1, w1, h1 = rects[name1]
+        for name2 in names[i+1:]:
+            x2, y2, w2, h2 = rects[name2]
+            separated = x1 + w1 <= x2 or x2 + w2 <= x1 or y1 + h1 <= y2 or y2 + h2 <= y1
+            assert separated, f"{name1} overlaps {name2}"
+
+
+@pytest.mark.parametrize("overlap", OVERLAP_MODES)
+def test_connection_point_logic(overlap):
+    solver, positions, total_distance, connection_details = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, overlap=overlap)
+    assert positions is not None
+    assert positions["Coal Mine"] == (0, 0, False)
+    assert_valid_layout(test_blocks, positions, test_grid_size)
+    assert total_distance > 0
+
+
+def test_unknown_overlap_mode():
+    with pytest.raises(ValueError):
+        optimize_factory_layout(test_blocks, test_connections, test_grid_size, 1, overlap="sweep")
+
+
+def test_overlap_modes_agree():
+    distances = set()
+    for overlap in OVERLAP_MODES:
+        solver, _, total_distance, _ = optimize_factory_layout(
+            test_blocks, test_connections, test_grid_size, 10, overlap=overlap)
+        assert solver.StatusName() == "OPTIMAL"
+        distances.add(total_distance)
+    assert len(distances) == 1
+
+
+def test_port_registry_shares_ports():
+    model = cp_model.CpModel()
+    positions = {"Hub": (model.NewIntVar(0, 10, "x"), model.NewIntVar(0, 10, "y"))}
+    sizes = {"Hub": (model.NewConstant(4), model.NewConstant(2))}
+    rotations = {"Hub": (model.NewConstant(True), model.NewConstant(False))}
+    ports = PortRegistry(model, (16, 16), positions, sizes, rotations)
+
+    first = ports.port("Hub", "LM")
+    assert ports.port("Hub", "LM") == first
+    ports.port("Hub", "RM")
+    assert ports.port_count() == 2
+    assert ports.reference_count() == 3
+    # two ports plus one midpoint, instead of four variables per reference
+    assert ports.vars_saved() == 4 * 3 - 6
+
+    with pytest.raises(ValueError):
+        ports.port("Hub", "XX")
+
+
+def test_connection_index():
+    blocks = dict(test_blocks)
+    blocks["Copper Mine"] = Block(1, 1, fixed_x=15, fixed_y=15)
+    connections = test_connections + [("Copper Mine", "Iron Smelting", "MM", "LM")]
+    index = ConnectionIndex(blocks, connections)
+
+    # the connection to the missing cracking block is dropped
+    assert len(index.connections) == 4
+    assert index.connections[1] == ("Iron Smelting", "Green Circuit Assembly", connections[1].source_pos, "BM", 20)
+    assert index.sources("Iron Smelting") == ["Coal Mine", "Copper Mine"]
+    assert index.targets("Iron Smelting") == ["Green Circuit Assembly"]
+    assert index.neighbours("Iron Smelting") == ["Coal Mine", "Copper Mine", "Green Circuit Assembly"]
+    assert index.fixed_source("Iron Smelting") == "Coal Mine"
+    assert index.fixed_source("Red Science") is None
+    assert index.fixed_neighbours("Iron Smelting") == ["Coal Mine", "Copper Mine"]
+    assert index.fixed_neighbours("Coal Mine") == []
+
+
+def test_build_report():
+    report = BuildReport(profile=True, trace_memory=True)
+    optimize_factory_layout(test_blocks, test_connections, test_grid_size, 10, report=report)
+    result = report.to_dict()
+
+    phases = [p["phase"] for p in result["phases"]]
+    assert phases == ["block vars", "rotation", "overlap", "symmetry", "connection points",
+                      "distance objective", "solve", "extraction"]
+    overlap = result["phases"][2]
+    # three pairs of movable blocks, four literals and five constraints each;
+    # the fixed mine is a box each movable block has to stay clear of
+    assert overlap["bool_vars"] == 3 * 4
+    assert overlap["constraint_types"] == {"bool_or": 3, "interval": 2, "linear": 3 * 4, "no_overlap_2d": 3}
+    assert result["obstacles"] == {"fixed_blocks": 1, "mask_rects": 0, "rects": 1}
+    assert result["totals"]["constraints"] == sum(p["constraints"] for p in result["phases"])
+    assert result["solve"]["status"] == "OPTIMAL"
+    assert "cumulative" in result["cprofile"]
+    assert result["tracemalloc"]["peak_bytes"] > 0
+
+
+def test_obstacles():
+    mask = [(4, 0, 12, 3)]
+    solver, positions, distance, connection_details = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, obstacles=mask)
+    assert positions is not None
+    assert_valid_layout(dict(test_blocks, Mask=Block(12, 3, fixed_x=4, fixed_y=0)),
+                        dict(positions, Mask=(4, 0, False)), test_grid_size)
+
+
+def test_warm_restart_from_previous_layout():
+    solver, positions, distance, connection_details = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, seed=1)
+    ports = get_chosen_ports(solver, connection_details)
+    assert ports[("Coal Mine", "Iron Smelting")] == ("MM", "LM")
+    assert ports[("Iron Smelting", "Green Circuit Assembly")][0] in ("LM", "RM")
+
+    report = BuildReport()
+    _, warm_positions, warm_distance, _ = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, seed=2, report=report,
+        hint_positions=positions, hint_ports=ports, objective_upper_bound=distance)
+    assert report.to_dict()["hint"]["completed"]
+    assert warm_distance <= distance
+    assert_valid_layout(test_blocks, warm_positions, test_grid_size)
+
+
+def test_fixed_rotated_block():
+    # rotated 90 degrees clockwise, the top left port ends up at the top right
+    blocks = {"Smelter": Block(6, 3, fixed_x=0, fixed_y=0, rotated=True), "Chest": (1, 1)}
+    connections = [("Smelter", "Chest", "TL", "TL")]
+    _, positions, total_distance, _ = optimize_factory_layout(blocks, connections, (8, 8), 10)
+    assert positions["Smelter"] == (0, 0, True)
+    assert positions["Chest"][:2] == (3, 0)
+    assert total_distance == 0
+
+
+# seconds `import main` may take; about 0.45 on the machine this was set on,
+# with ortools most of it
+STARTUP_BUDGET = 2.0
+
+
+def test_startup():
+    # a fresh interpreter, so nothing another test imported counts
+    script = ("import sys, time; started = time.perf_counter(); import main, factorio; "
+              "print(time.perf_counter() - started); "
+              "print('matplotlib' in sys.modules, 'blocks' in vars(factorio))")
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    seconds, loaded = output.splitlines()
+    assert loaded == "False False"
+    assert float(seconds) < STARTUP_BUDGET
+
+
+def test_load_spec(tmp_path):
+    from generate import generate_spec, spec_source
+    from spec import load_spec
+    blocks, _, _ = load_spec("rocket")
+    assert "Rocket Silo Assembler" in blocks
+    path = tmp_path / "synthetic.py"
+    path.write_text(spec_source(*generate_spec(12, seed=1)))
+    blocks, connections, grid_size = load_spec(str(path))
+    assert len(blocks) == 12 and connections and len(grid_size) == 2
@@ -0,0 +1,88 @@
+"""Fixed blocks and other no-go areas, as a set of disjoint rectangles.
+
+Movable blocks only have to stay clear of these, so the model gets a
+handful of constant boxes instead of a disjunction per pair of blocks, and
+nothing at all between two fixed blocks.
+"""
+
+from spec import block_size, is_fixed
+
+# characters that mark a blocked tile in an ASCII mask
+BLOCKED = "#Xx"
+
+
+def fixed_rects(blocks):
+    """{name: (x, y, width, height)} of every fixed block, rotation applied."""
+    rects = {}
+    for name, block_info in blocks.items():
+        if not is_fixed(block_info):
+            continue
+        width, height = block_size(block_info)
+        if block_info.rotated:
+            width, height = height, width
+        rects[name] = (block_info.fixed_x, block_info.fixed_y, width, height)
+    return rects
+
+
+def disjoint_rects(rects):
+    """The union of rects, as disjoint (x, y, width, height) rectangles.
+
+    Each row is merged into runs, and a run carries on into the next row as
+    long as it stays exactly the same.
+    """
+    rows = {}
+    for x, y, width, height in rects:
+        if width <= 0 or height <= 0:
+            continue
+        for row in range(y, y + height):
+            rows.setdefault(row, []).append((x, x + width))
+
+    result = []
+    open_runs = {}  # (x start, x end) -> first row
+    for row in range(min(rows, default=0), max(rows, default=-1) + 2):
+        runs = []
+        for start, end in sorted(rows.get(row, [])):
+            if runs and start <= runs[-1][1]:
+                runs[-1] = (runs[-1][0], max(runs[-1][1], end))
+            else:
+                runs.append((start, end))
+        for run in list(open_runs):
+            if run not in runs:
+                first = open_runs.pop(run)
+                result.append((run[0], first, run[1] - run[0], row - first))
+        for run in runs:
+            open_runs.setdefault(run, row)
+    return sorted(result, key=lambda rect: (rect[1], rect[0]))
+
+
+def mask_rects(lines):
+    """Blocked rectangles of an ASCII mask, one line per row and one
+    character per tile; see BLOCKED."""
+    rects = []
+    for y, line in enumerate(lines):
+        for x, char in enumerate(line.rstrip("\n")):
+            if char in BLOCKED:
+                rects.append((x, y, 1, 1))
+    return disjoint_rects(rects)
+
+
+def load_mask(path):
+    """Blocked rectangles from a mask file: an image, where every dark pixel
+    is a blocked tile, or otherwise an ASCII map (see mask_rects)."""
+    if path.lower().endswith((".png", ".gif", ".bmp", ".jpg", ".jpeg")):
+        # imported here so ASCII masks don't need pillow
+        from PIL import Image
+        with Image.open(path) as image:
+            image = image.convert("L")
+            width, height = image.size
+            pixels = image.load()
+            rects = [(x, y, 1, 1) for y in range(height) for x in range(width) if pixels[x, y] < 128]
+        return disjoint_rects(rects)
+    with open(path) as f:
+        return mask_rects(f)
+
+
+def obstacle_rects(blocks, mask=None):
+    """Disjoint rectangles covering every fixed block in blocks plus the
+    (x, y, width, height) rectangles in mask."""
+    return disjoint_rects(list(fixed_rects(blocks).values()) + list(mask or []))
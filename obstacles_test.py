@@ -0,0 +1,36 @@
+from obstacles import disjoint_rects, load_mask, mask_rects, obstacle_rects
+from spec import Block
+
+
+def test_disjoint_rects():
+    # an L shape overlapping a square
+    rects = disjoint_rects([(0, 0, 2, 3), (0, 2, 4, 1), (1, 1, 2, 2)])
+    cells = {(x + dx, y + dy) for x, y, w, h in rects for dx in range(w) for dy in range(h)}
+    assert cells == {(0, 0), (1, 0), (0, 1), (1, 1), (2, 1), (0, 2), (1, 2), (2, 2), (3, 2)}
+    assert sum(w * h for _, _, w, h in rects) == len(cells)
+    assert rects == [(0, 0, 2, 1), (0, 1, 3, 1), (0, 2, 4, 1)]
+
+
+def test_obstacle_rects():
+    blocks = {
+        "Mine": Block(3, 1, fixed_x=0, fixed_y=0, rotated=True),
+        "Cliffs": Block(2, 2, fixed_x=5, fixed_y=5),
+        "Smelting": (6, 3),
+    }
+    assert obstacle_rects(blocks) == [(0, 0, 1, 3), (5, 5, 2, 2)]
+    assert obstacle_rects(blocks, [(1, 0, 1, 3)]) == [(0, 0, 2, 3), (5, 5, 2, 2)]
+
+
+def test_masks(tmp_path):
+    lines = ["..##", "..##", "#..."]
+    assert mask_rects(lines) == [(2, 0, 2, 2), (0, 2, 1, 1)]
+    path = tmp_path / "mask.txt"
+    path.write_text("\n".join(lines) + "\n")
+    assert load_mask(str(path)) == [(2, 0, 2, 2), (0, 2, 1, 1)]
+
+    from PIL import Image
+    image = Image.new("L", (4, 3), 255)
+    for x, y in [(2, 0), (3, 0), (2, 1), (3, 1), (0, 2)]:
+        image.putpixel((x, y), 0)
+    image.save(tmp_path / "mask.png")
+    assert load_mask(str(tmp_path / "mask.png")) == [(2, 0, 2, 2), (0, 2, 1, 1)]
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import queue
+import time
+
+from main import (OVERLAP_MODES, SOLVER_PROFILES, get_chosen_connections, get_chosen_ports,
+                  optimize_factory_layout)
+from report import BuildReport
+from savedmodel import load_model, solve_saved_model
+
+
+def portfolio_configs(num_solvers, base_seed=0, cores=None):
+    """One config per solver: a seed, an overlap encoding and a parameter
+    profile, cycled so that neighbouring workers differ in both, and an even
+    share of the cores."""
+    cores = cores or os.cpu_count()
+    profiles = list(SOLVER_PROFILES)
+    configs = []
+    for i in range(num_solvers):
+        configs.append({
+            "worker": i,
+            "seed": base_seed + i,
+            "overlap": OVERLAP_MODES[i % len(OVERLAP_MODES)],
+            "profile": profiles[(i // len(OVERLAP_MODES) + i) % len(profiles)],
+            "num_workers": max(1, cores // num_solvers),
+        })
+    return configs
+
+
+def _solve_worker(config, blocks, connections, grid_size, max_time, hints, obstacles, stop_rules, progress, saved_model,
+                  messages):
+    def on_solution(wall_time, objective, bound):
+        messages.put(("incumbent", config["worker"], wall_time, objective, bound))
+
+    report = BuildReport()
+    hint_positions, hint_ports, upper_bound = hints
+    options = dict(report=report, seed=config["seed"], hint_positions=hint_positions, hint_ports=hint_ports,
+                   objective_upper_bound=upper_bound, num_workers=config["num_workers"],
+                   solver_params=SOLVER_PROFILES[config["profile"]], log_search=False, on_solution=on_solution,
+                   stop_rules=stop_rules, progress=progress.tagged(worker=config["worker"]) if progress else None)
+    try:
+        if saved_model is not None:
+            solver, positions, distance, connection_details = solve_saved_model(
+                load_model(saved_model), max_time, **options)
+        else:
+            solver, positions, distance, connection_details = optimize_factory_layout(
+                blocks, connections, grid_size, max_time, allow_rotation=True, overlap=config["overlap"],
+                obstacles=obstacles, **options)
+    except Exception as e:
+        messages.put(("error", config["worker"], repr(e)))
+        return
+    result = {
+        "config": config,
+        "positions": positions,
+        "distance": distance,
+        "ports": None,
+        "chosen_connections": None,
+        "report": report.to_dict(),
+    }
+    if positions is not None:
+        result["ports"] = get_chosen_ports(solver, connection_details)
+        result["chosen_connections"] = get_chosen_connections(solver, connection_details)
+    messages.put(("result", config["worker"], result))
+
+
+def run_portfolio(blocks, connections, grid_size, max_time, num_solvers, cores=None, base_seed=0,
+                  hint_positions=None, hint_ports=None, objective_upper_bound=None, obstacles=None, stop_rules=None,
+                  progress=None, saved_model=None):
+    """Run num_solvers differently-configured solves at once, in separate
+    processes, sharing max_time of wall clock.
+
+    Incumbents are printed as workers find them. Once one worker proves its
+    layout optimal the rest are stopped. Returns (best result, all results),
+    where a result is the dict _solve_worker builds; best is None if no
+    worker found a layout. stop_rules (a stopping.StopRules) apply to each
+    worker on its own; progress (a progress.ProgressLog) gets every worker's
+    records, tagged with its number. With saved_model, the path of a model
+    saved with optimize_factory_layout's save_model, every worker loads that
+    instead of building its own, whatever its overlap encoding.
+    """
+    context = multiprocessing.get_context("spawn")
+    messages = context.Queue()
+    hints = (hint_positions, hint_ports, objective_upper_bound)
+    processes = {}
+    for config in portfolio_configs(num_solvers, base_seed, cores):
+        process = context.Process(
+            target=_solve_worker,
+            args=(config, blocks, connections, grid_size, max_time, hints, obstacles, stop_rules, progress, saved_model,
+                  messages),
+            daemon=True)
+        process.start()
+        processes[config["worker"]] = process
+        print(f"portfolio worker {config['worker']}: seed {config['seed']}, overlap {config['overlap']}, "
+              f"profile {config['profile']}, {config['num_workers']} search workers")
+
+    results = []
+    best = None
+    best_incumbent = None
+    started = time.monotonic()
+    # building the model isn't covered by max_time, so give workers some slack
+    deadline = started + max_time * 1.5 + 60
+    pending = set(processes)
+    while pending and time.monotonic() < deadline:
+        try:
+            message = messages.get(timeout=1)
+        except queue.Empty:
+            for worker in list(pending):
+                if not processes[worker].is_alive():
+                    print(f"portfolio worker {worker} exited without a result")
+                    pending.discard(worker)
+            continue
+
+        kind, worker = message[0], message[1]
+        if kind == "incumbent":
+            objective = message[3]
+            if best_incumbent is None or objective < best_incumbent:
+                best_incumbent = objective
+                print(f"{time.monotonic() - started:7.2f}s portfolio best {objective:.0f} (worker {worker})")
+        elif kind == "error":
+            print(f"portfolio worker {worker} failed: {message[2]}")
+            pending.discard(worker)
+        elif kind == "result":
+            result = message[2]
+            results.append(result)
+            pending.discard(worker)
+            if result["distance"] is not None and (best is None or result["distance"] < best["distance"]):
+                best = result
+            if result["report"]["solve"]["status"] == "OPTIMAL":
+                print(f"portfolio worker {worker} proved optimality, stopping the rest")
+                break
+
+    for process in processes.values():
+        if process.is_alive():
+            process.terminate()
+        process.join()
+    return best, results
@@ -0,0 +1,20 @@
+from main import SOLVER_PROFILES
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+from portfolio import portfolio_configs, run_portfolio
+
+
+def test_portfolio_configs_differ():
+    configs = portfolio_configs(6, base_seed=10, cores=12)
+    assert [c["seed"] for c in configs] == list(range(10, 16))
+    assert len({(c["overlap"], c["profile"]) for c in configs}) == 6
+    assert all(c["num_workers"] == 2 for c in configs)
+    assert all(c["profile"] in SOLVER_PROFILES for c in configs)
+
+
+def test_run_portfolio():
+    best, results = run_portfolio(test_blocks, test_connections, test_grid_size, 10, 2, cores=2)
+    assert best is not None
+    assert 1 <= len(results) <= 2
+    assert best["distance"] == min(r["distance"] for r in results)
+    assert_valid_layout(test_blocks, best["positions"], test_grid_size)
+    assert best["ports"][("Coal Mine", "Iron Smelting")] == ("MM", "LM")
@@ -0,0 +1,129 @@
+"""A JSON line per improving solution, for time-to-quality curves and
+partial results that survive a crash.
+
+The solution callback runs on the solver's thread, so a record costs a dict
+and a json.dumps into a buffer; the buffer only reaches the file every
+interval seconds. Positions, if asked for, are read from the solution
+vector in one go with NumPy, and at most once per interval; every solve
+also ends with a final record of its best layout.
+"""
+
+import json
+import sys
+import time
+
+import numpy as np
+
+
+class _Sink:
+    """Buffered lines on their way to a file, shared by a ProgressLog and
+    its tagged copies. A pickled copy opens the file again on its first
+    write."""
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self.file = None
+        self.lines = []
+        self.last_flush = time.monotonic()
+
+    def __getstate__(self):
+        self.flush()
+        return {"path": self.path, "interval": self.interval}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["interval"])
+
+    def write(self, line, flush=False):
+        self.lines.append(line)
+        if flush or time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.lines:
+            return
+        if self.file is None:
+            self.file = sys.stdout if self.path == "-" else open(self.path, "a", buffering=1 << 16)
+        self.file.write("\n".join(self.lines) + "\n")
+        self.file.flush()
+        self.lines = []
+
+    def close(self):
+        self.flush()
+        if self.file is not None and self.file is not sys.stdout:
+            self.file.close()
+        self.file = None
+
+
+class ProgressLog:
+    """Appends records to path, or stdout if path is "-".
+
+    Every record has the solve's wall time t, objective, best bound and
+    solution count, plus fields (a run number, say, or the overlap mode),
+    and positions {name: [x, y, is_rotated]} if positions is set. A
+    ProgressLog can be pickled, so a copy can go to another process.
+    """
+
+    def __init__(self, path, positions=False, interval=1.0, fields=None, _sink=None):
+        self.positions = positions
+        self.interval = interval
+        self.fields = dict(fields or {})
+        self.__sink = _sink or _Sink(path, interval)
+        self.__last_positions = None
+        self.__layout = None
+
+    def tagged(self, **fields):
+        """A log writing to the same place with more fields on every
+        record."""
+        return ProgressLog(None, self.positions, self.interval, {**self.fields, **fields}, self.__sink)
+
+    def set_layout(self, names, x_vars, y_vars, rotated_vars):
+        """The variables to read positions from for the next solve, one of
+        each per block in names."""
+        self.__last_positions = None
+        indices = np.array([[var.Index() for var in row] for row in zip(x_vars, y_vars, rotated_vars)],
+                           dtype=np.int64).reshape(-1, 3)
+        # a negated literal has index -i - 1 and the opposite value
+        self.__layout = (list(names), np.where(indices < 0, -indices - 1, indices), indices < 0)
+
+    def __read_positions(self, solution):
+        names, indices, negated = self.__layout
+        values = np.asarray(solution, dtype=np.int64)[indices]
+        values = np.where(negated, 1 - values, values)
+        return {name: [int(x), int(y), bool(r)] for name, (x, y, r) in zip(names, values)}
+
+    def record(self, callback, wall_time, objective, bound, solutions):
+        """Log the solution callback (a CpSolverSolutionCallback) is at."""
+        entry = {**self.fields, "t": round(wall_time, 3), "objective": objective, "bound": bound,
+                 "solutions": solutions}
+        if self.positions and self.__layout is not None and (
+                self.__last_positions is None or wall_time - self.__last_positions >= self.interval):
+            self.__last_positions = wall_time
+            entry["positions"] = self.__read_positions(callback.response_proto.solution)
+        self.__sink.write(json.dumps(entry))
+
+    def finish(self, wall_time, objective, bound, solutions, status, positions=None):
+        """Log the end of a solve, with its best layout (a {name: (x, y,
+        is_rotated)} dict) if there is one, and flush."""
+        entry = {**self.fields, "t": round(wall_time, 3), "objective": objective, "bound": bound,
+                 "solutions": solutions, "status": status, "final": True}
+        if positions is not None:
+            entry["positions"] = {name: [int(x), int(y), bool(r)] for name, (x, y, r) in positions.items()}
+        self.__sink.write(json.dumps(entry), flush=True)
+
+    def close(self):
+        self.__sink.close()
+
+
+def read_progress(path):
+    """The records of a progress file, skipping a last line cut short by a
+    crash."""
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
@@ -0,0 +1,49 @@
+import pickle
+
+from main import optimize_factory_layout
+from main_test import test_blocks, test_connections, test_grid_size
+from progress import ProgressLog, read_progress
+
+
+def test_progress_log(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    progress = ProgressLog(str(path), positions=True, interval=0)
+    _, positions, distance, _ = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, construct_time=0, progress=progress.tagged(run=0))
+    progress.close()
+
+    records = read_progress(path)
+    *solutions, final = records
+    assert solutions
+    assert all(record["run"] == 0 for record in records)
+    assert [record["solutions"] for record in solutions] == list(range(1, len(solutions) + 1))
+    assert final["final"] and final["status"] == "OPTIMAL"
+    assert final["objective"] == distance == solutions[-1]["objective"]
+    expected = {name: [x, y, r] for name, (x, y, r) in positions.items()}
+    assert final["positions"] == solutions[-1]["positions"] == expected
+
+
+def test_progress_throttled(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    progress = ProgressLog(str(path), positions=True, interval=60)
+    optimize_factory_layout(test_blocks, test_connections, test_grid_size, 10, construct_time=0, progress=progress)
+    records = read_progress(path)
+    # only the first solution and the final record carry positions
+    assert "positions" in records[0] and "positions" in records[-1]
+    assert not any("positions" in record for record in records[1:-1])
+
+
+def test_progress_pickles(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    progress = ProgressLog(str(path), interval=60).tagged(worker=3)
+    copy = pickle.loads(pickle.dumps(progress))
+    copy.finish(1.0, 10, 5, 2, "FEASIBLE")
+    copy.close()
+    assert read_progress(path) == [{"worker": 3, "t": 1.0, "objective": 10, "bound": 5, "solutions": 2,
+                                    "status": "FEASIBLE", "final": True}]
+
+
+def test_read_progress_skips_cut_line(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    path.write_text('{"t": 1.0, "objective": 10}\n{"t": 2.0, "obj')
+    assert read_progress(path) == [{"t": 1.0, "objective": 10}]
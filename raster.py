@@ -0,0 +1,176 @@
+"""Layouts painted straight into NumPy images, and animations of a solve.
+
+matplotlib takes seconds a frame on a big grid; painting rectangles and
+lines into an array at scale pixels per tile takes milliseconds, which makes
+a frame per improving layout of a --progress file affordable:
+
+    python main.py --progress run.jsonl --progress-positions
+    python raster.py replay run.jsonl --out run.gif
+
+Frames are drawn without text. A replayed layout's connections use the
+ports evaluate.evaluate picks for it, since progress records don't keep
+the solver's.
+"""
+
+import argparse
+
+import numpy as np
+
+from evaluate import LayoutArrays, connection_lines, footprints
+from obstacles import load_mask
+from progress import read_progress
+from spec import load_spec
+
+BACKGROUND = (255, 255, 255)
+GRID = (235, 235, 235)
+OBSTACLE = (90, 90, 90)
+FIXED = (200, 180, 140)
+CONNECTION = (220, 60, 60)
+# fills for movable blocks, in turn, so neighbours are told apart even at a
+# pixel per tile
+PALETTE = np.array([
+    (160, 190, 230), (170, 220, 170), (240, 200, 150), (210, 170, 220),
+    (150, 210, 210), (230, 170, 170), (200, 210, 150), (190, 190, 240),
+], dtype=np.uint8)
+# every this many tiles, as on the matplotlib picture
+GRID_STEP = 16
+
+
+def _draw_lines(image, lines, scale, color):
+    """Draw (m, 2, 2) lines, in tiles, all at once: each is sampled at
+    about a point per pixel along its longer axis."""
+    if not len(lines):
+        return
+    points = np.asarray(lines, dtype=np.float64) * scale
+    starts, deltas = points[:, 0], points[:, 1] - points[:, 0]
+    steps = np.abs(deltas).max(1).astype(np.int64) + 1
+    which = np.repeat(np.arange(len(points)), steps)
+    offsets = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+    fraction = offsets / np.maximum(steps - 1, 1)[which]
+    xy = np.rint(starts[which] + deltas[which] * fraction[:, None]).astype(np.int64)
+    height, width = image.shape[:2]
+    image[np.clip(xy[:, 1], 0, height - 1), np.clip(xy[:, 0], 0, width - 1)] = color
+
+
+def _fill(image, x, y, width, height, scale, color, border=None):
+    area = image[y * scale:(y + height) * scale, x * scale:(x + width) * scale]
+    if border is not None and scale >= 3:
+        area[...] = border
+        area = area[1:-1, 1:-1]
+    area[...] = color
+
+
+def rasterize(arrays, positions, grid_size, lines=None, obstacles=None, scale=1):
+    """An (height, width, 3) uint8 image of a layout: positions is an (n,
+    3) array in the order of arrays.names (an evaluate.LayoutArrays), lines
+    (m, 2, 2) connection start and end points in tiles, and obstacles
+    (x, y, width, height) rectangles. Each tile is scale x scale pixels."""
+    image = np.empty((grid_size[1] * scale, grid_size[0] * scale, 3), dtype=np.uint8)
+    image[...] = BACKGROUND
+    if scale >= 2:
+        image[::GRID_STEP * scale] = GRID
+        image[:, ::GRID_STEP * scale] = GRID
+    for x, y, width, height in obstacles or []:
+        _fill(image, x, y, width, height, scale, OBSTACLE)
+
+    positions = np.asarray(positions, dtype=np.int64)
+    sizes = footprints(arrays, positions)
+    for i, ((x, y, _), (width, height)) in enumerate(zip(positions, sizes)):
+        color = FIXED if arrays.fixed[i] else PALETTE[i % len(PALETTE)]
+        _fill(image, x, y, width, height, scale, color, border=np.asarray(color, dtype=np.int64) * 3 // 5)
+    if lines is not None:
+        _draw_lines(image, lines, scale, CONNECTION)
+    return image
+
+
+def chosen_lines(chosen_connections):
+    """get_chosen_connections' dicts as (m, 2, 2) lines for rasterize."""
+    return np.array([((conn['start_x'], conn['start_y']), (conn['end_x'], conn['end_y']))
+                     for conn in chosen_connections], dtype=np.int64).reshape(-1, 2, 2)
+
+
+def save_png(image, path):
+    # imported here so rasterizing doesn't need pillow
+    from PIL import Image
+    Image.fromarray(image).save(path)
+
+
+def render_layout(blocks, connections, grid_size, layout, path, chosen_connections=None, obstacles=None, scale=4):
+    """Write a PNG of layout, a {name: (x, y, is_rotated)} dict, with the
+    chosen_connections get_chosen_connections returns, or the ports evaluate
+    would pick if there are none."""
+    arrays = LayoutArrays(blocks, connections)
+    positions = arrays.positions(layout)
+    lines = chosen_lines(chosen_connections) if chosen_connections else connection_lines(arrays, positions)
+    save_png(rasterize(arrays, positions, grid_size, lines, obstacles, scale), path)
+
+
+def replay_frames(blocks, connections, grid_size, records, obstacles=None, scale=2, fields=None, improving=True):
+    """An image per distinct layout in records (progress.read_progress's,
+    skipping those without positions), in order.
+
+    A --portfolio or --adaptive progress file interleaves several searches.
+    fields ({"worker": 2}, say) keeps only the records tagged with them, and
+    improving only the layouts better than every one before them, so the
+    frames show one best-so-far layout getting better rather than jumping
+    between searches.
+    """
+    arrays = LayoutArrays(blocks, connections)
+    previous = None
+    best = None
+    for record in records:
+        if "positions" not in record:
+            continue
+        if any(record.get(key) != value for key, value in (fields or {}).items()):
+            continue
+        if improving:
+            if best is not None and record["objective"] >= best:
+                continue
+            best = record["objective"]
+        positions = arrays.positions(record["positions"])
+        if previous is not None and np.array_equal(positions, previous):
+            continue
+        previous = positions
+        yield rasterize(arrays, positions, grid_size, connection_lines(arrays, positions), obstacles, scale)
+
+
+def save_animation(frames, path, frame_ms=100, hold_ms=2000):
+    """Write frames as a GIF, or an animated PNG if path ends in .png, each
+    shown for frame_ms and the last for hold_ms. Returns the frame count."""
+    # imported here so rasterizing doesn't need pillow
+    from PIL import Image
+    images = [Image.fromarray(frame) for frame in frames]
+    if not images:
+        raise ValueError("no frames: was the progress file written with --progress-positions?")
+    durations = [frame_ms] * (len(images) - 1) + [hold_ms]
+    images[0].save(path, save_all=True, append_images=images[1:], duration=durations, loop=0)
+    return len(images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Animate the improving layouts of a --progress file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="Write a GIF or animated PNG of a progress file's layouts")
+    replay.add_argument("progress", help="Progress file written with --progress-positions")
+    replay.add_argument("--spec", default="base", help="Spec the progress file is for (see main.py --spec)")
+    replay.add_argument("--mask", help="Obstacle mask the run used (see main.py --mask)")
+    replay.add_argument("--out", required=True, help=".gif, or .png for an animated PNG")
+    replay.add_argument("--scale", type=int, default=2, help="Pixels per tile")
+    replay.add_argument("--frame-ms", type=int, default=100, help="Milliseconds per frame")
+    replay.add_argument("--worker", type=int, help="Only this --portfolio or --adaptive worker's records")
+    replay.add_argument("--run", type=int, help="Only this sequential run's records")
+    replay.add_argument("--all", action="store_true",
+                        help="Every distinct layout, not just the ones better than all before them")
+    args = parser.parse_args()
+
+    blocks, connections, grid_size = load_spec(args.spec)
+    obstacles = load_mask(args.mask) if args.mask else None
+    fields = {key: value for key, value in (("worker", args.worker), ("run", args.run)) if value is not None}
+    frames = replay_frames(blocks, connections, grid_size, read_progress(args.progress), obstacles, args.scale,
+                           fields, improving=not args.all)
+    count = save_animation(frames, args.out, args.frame_ms)
+    print(f"{count} frames written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
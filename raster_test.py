@@ -0,0 +1,55 @@
+import numpy as np
+from PIL import Image
+
+from evaluate import LayoutArrays, connection_lines
+from factorio import Block
+from raster import CONNECTION, FIXED, OBSTACLE, rasterize, render_layout, replay_frames, save_animation
+
+blocks = {"Mine": Block(2, 2, fixed_x=0, fixed_y=0), "Smelter": (3, 2), "Chest": (1, 1)}
+connections = [("Mine", "Smelter", "RM", "LM"), ("Smelter", "Chest", "RM", "LM")]
+grid_size = (12, 6)
+
+
+def test_rasterize():
+    arrays = LayoutArrays(blocks, connections)
+    positions = arrays.positions({"Mine": (0, 0, False), "Smelter": (4, 0, True), "Chest": (10, 4, False)})
+    lines = connection_lines(arrays, positions)
+    image = rasterize(arrays, positions, grid_size, lines, obstacles=[(8, 0, 2, 2)], scale=1)
+    assert image.shape == (6, 12, 3) and image.dtype == np.uint8
+    assert tuple(image[1, 0]) == FIXED
+    assert tuple(image[0, 9]) == OBSTACLE
+    # rotated, the smelter is 2 wide and 3 high
+    plain = rasterize(arrays, positions, grid_size)
+    assert (plain[0:3, 4:6] != 255).all() and (plain[3:, 4:6] == 255).all()
+    # the mine's right port, (2, 1), to the smelter's left, now on top
+    assert tuple(image[1, 3]) == CONNECTION
+    assert rasterize(arrays, positions, grid_size, scale=3).shape == (18, 36, 3)
+
+
+def test_render_and_replay(tmp_path):
+    layouts = [{"Mine": [0, 0, False], "Smelter": [6, 3, False], "Chest": [11, 0, False]},
+               {"Mine": [0, 0, False], "Smelter": [3, 0, False], "Chest": [7, 1, False]}]
+    render_layout(blocks, connections, grid_size, layouts[1], tmp_path / "layout.png")
+    assert Image.open(tmp_path / "layout.png").size == (48, 24)
+
+    # the repeated layout and the record without positions are skipped
+    records = [{"t": 0.1, "objective": 20, "positions": layouts[0]}, {"t": 0.2, "objective": 20},
+               {"t": 0.3, "objective": 12, "positions": layouts[1]},
+               {"t": 0.4, "objective": 12, "positions": layouts[1], "final": True}]
+    frames = list(replay_frames(blocks, connections, grid_size, records, scale=2))
+    assert len(frames) == 2
+
+    # two searches in one file: by default only the layouts that beat
+    # everything before them, or one worker's
+    interleaved = [{"worker": 0, "objective": 20, "positions": layouts[0]},
+                   {"worker": 1, "objective": 12, "positions": layouts[1]},
+                   {"worker": 0, "objective": 18, "positions": layouts[1]},
+                   {"worker": 1, "objective": 25, "positions": layouts[0]}]
+    assert len(list(replay_frames(blocks, connections, grid_size, interleaved))) == 2
+    assert len(list(replay_frames(blocks, connections, grid_size, interleaved, improving=False))) == 3
+    assert len(list(replay_frames(blocks, connections, grid_size, interleaved, fields={"worker": 0},
+                                  improving=False))) == 2
+    for name in ("replay.gif", "replay.png"):
+        assert save_animation(frames, tmp_path / name) == 2
+        with Image.open(tmp_path / name) as image:
+            assert image.n_frames == 2
@@ -0,0 +1,141 @@
+"""Drawing a layout with matplotlib.
+
+Apart from main.py because importing matplotlib takes longer than the rest
+of the optimizer put together, and a run that doesn't draw shouldn't pay
+for it.
+
+Blocks are drawn as one PatchCollection and connections as one
+LineCollection, so a big spec costs a few artists rather than a few per
+block; only the labels are an artist each. Writing to a file goes through
+a plain Figure, which never touches pyplot or a GUI backend, so it works on
+a machine without a display.
+"""
+
+from functools import lru_cache
+
+from matplotlib.collections import LineCollection, PatchCollection
+from matplotlib.figure import Figure
+import matplotlib.patches as patches
+from matplotlib.font_manager import FontProperties
+
+from spec import block_size
+
+MAX_FONTSIZE = 12
+MIN_FONTSIZE = 6
+
+@lru_cache(maxsize=None)
+def get_font_property(size):
+    # Try to use Titillium Web first, then DejaVu Sans, then fall back to default sans-serif
+    for font_name in ['DejaVu Sans', 'sans-serif']:
+        try:
+            return FontProperties(family=font_name, size=size)
+        except:
+            continue
+    return FontProperties(family='sans-serif', size=size)
+
+def estimate_text_height(text, font_prop, width):
+    # Estimate text height based on font properties and width
+    return _estimate_text_height(text, font_prop.get_size_in_points(), width)
+
+@lru_cache(maxsize=None)
+def _estimate_text_height(text, font_size, width):
+    char_width = font_size * 0.6  # Rough estimate of character width
+    chars_per_line = max(1, int(width / char_width))
+    lines = -(-len(text) // chars_per_line)
+    return lines * font_size * 1.2  # 1.2 for line spacing
+
+def wrap_text(text, max_width, font_prop):
+    """Wrap text to fit within a given width."""
+    words = text.split()
+    lines = []
+    current_line = words[0]
+
+    for word in words[1:]:
+        test_line = current_line + " " + word
+        if estimate_text_height(test_line, font_prop, max_width) <= font_prop.get_size_in_points() * 1.2:
+            current_line = test_line
+        else:
+            lines.append(current_line)
+            current_line = word
+
+    lines.append(current_line)
+    return lines
+
+@lru_cache(maxsize=None)
+def fit_label(name, width, height):
+    """(font size, wrapped text) for name in a width x height block: the
+    biggest size whose text fits in 90% of the block, or the smallest."""
+    fontsize = MIN_FONTSIZE
+    for size in range(MAX_FONTSIZE, MIN_FONTSIZE - 1, -1):
+        if _estimate_text_height(name, size, width * 0.9) <= height * 0.9:
+            fontsize = size
+            break
+    return fontsize, '\n'.join(wrap_text(name, width * 0.9, get_font_property(fontsize)))
+
+def _arrow_segments(chosen_conns, head):
+    """A shaft and the two strokes of an open arrowhead head tiles long per
+    connection, as line segments."""
+    segments = []
+    for conn in chosen_conns:
+        start_x, start_y, end_x, end_y = conn['start_x'], conn['start_y'], conn['end_x'], conn['end_y']
+        segments.append(((start_x, start_y), (end_x, end_y)))
+        dx, dy = end_x - start_x, end_y - start_y
+        length = (dx * dx + dy * dy) ** 0.5
+        if length == 0:
+            continue
+        # back along the shaft, and out to either side at half that
+        back_x, back_y = dx / length * head, dy / length * head
+        for side in (1, -1):
+            segments.append(((end_x - back_x - side * back_y / 2, end_y - back_y + side * back_x / 2),
+                             (end_x, end_y)))
+    return segments
+
+def draw_layout(fig, blocks, chosen_conns, optimal_positions, grid_size, total_distance):
+    """Draw the layout on fig, a matplotlib Figure."""
+    ax = fig.add_subplot()
+    ax.set_xlim(0, grid_size[0])
+    ax.set_ylim(0, grid_size[1])
+    ax.invert_yaxis()
+
+    ax.set_xticks(range(0, grid_size[0] + 1, 16))
+    ax.set_yticks(range(0, grid_size[1] + 1, 16))
+    ax.grid(which='both', color='lightgray', linestyle='-', linewidth=0.5, alpha=0.5)
+    ax.set_axisbelow(True)
+
+    rects = []
+    for name, block_info in blocks.items():
+        width, height = block_size(block_info)
+        x, y, is_rotated = optimal_positions[name]
+        if is_rotated:
+            width, height = height, width
+        rects.append(patches.Rectangle((x, y), width, height))
+        fontsize, label = fit_label(name, width, height)
+        ax.text(x + width/2, y + height/2, label, ha='center', va='center',
+                fontproperties=get_font_property(fontsize), wrap=True)
+    ax.add_collection(PatchCollection(rects, facecolor='none', edgecolor='blue'))
+
+    # an arrowhead about as big as matplotlib's '->' on a 12 inch figure
+    head = max(grid_size) / 150
+    ax.add_collection(LineCollection(_arrow_segments(chosen_conns, head), colors='#FF9999', linewidths=1))
+
+    watermark_text = f"github.com/kevinburke/factorio-layout-optimizer\ndistance: {total_distance}"
+    ax.text(0.99, 0.01, watermark_text,
+            horizontalalignment='right',
+            verticalalignment='bottom',
+            transform=ax.transAxes,
+            fontsize=8, alpha=0.7)
+    fig.tight_layout()
+
+def visualize_layout(blocks, chosen_conns, optimal_positions, grid_size, total_distance, out=None):
+    """Show the layout in a window, or with out, write it to that file (PNG,
+    SVG or anything else savefig takes, by its extension) instead."""
+    if out is not None:
+        fig = Figure(figsize=(12, 12))
+        draw_layout(fig, blocks, chosen_conns, optimal_positions, grid_size, total_distance)
+        fig.savefig(out)
+        return
+    # imported here because pyplot picks a GUI backend
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(12, 12))
+    draw_layout(fig, blocks, chosen_conns, optimal_positions, grid_size, total_distance)
+    plt.show()
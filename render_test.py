@@ -0,0 +1,29 @@
+from render import _arrow_segments, fit_label, visualize_layout
+
+blocks = {"Iron Smelting": (6, 3), "Green Circuit Assembly": (4, 4), "Chest": (1, 1)}
+positions = {"Iron Smelting": (0, 0, False), "Green Circuit Assembly": (8, 0, True), "Chest": (0, 6, False)}
+connections = [{"start_x": 6, "start_y": 1, "end_x": 8, "end_y": 2},
+               {"start_x": 3, "start_y": 3, "end_x": 0, "end_y": 6}]
+
+
+def test_writes_png_and_svg(tmp_path):
+    visualize_layout(blocks, connections, positions, (16, 8), 42, out=tmp_path / "layout.png")
+    visualize_layout(blocks, connections, positions, (16, 8), 42, out=tmp_path / "layout.svg")
+    assert (tmp_path / "layout.png").read_bytes()[:8] == b"\x89PNG\r\n\x1a\n"
+    svg = (tmp_path / "layout.svg").read_text()
+    assert "<svg" in svg and "42" in svg
+
+
+def test_arrow_segments():
+    # a shaft, then two head strokes ending at the tip
+    segments = _arrow_segments([{"start_x": 0, "start_y": 0, "end_x": 10, "end_y": 0}], 2)
+    assert segments == [((0, 0), (10, 0)), ((8, 1), (10, 0)), ((8, -1), (10, 0))]
+    # no head on a connection that goes nowhere
+    assert len(_arrow_segments([{"start_x": 1, "start_y": 1, "end_x": 1, "end_y": 1}], 2)) == 1
+
+
+def test_fit_label_is_cached():
+    fit_label.cache_clear()
+    first = fit_label("Green Circuit Assembly", 4, 4)
+    assert fit_label("Green Circuit Assembly", 4, 4) is first
+    assert fit_label.cache_info().hits == 1
@@ -0,0 +1,121 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+
+
+class BuildReport:
+    """Per-phase timings and model sizes for one optimize_factory_layout call.
+
+    Call begin() once the model exists, then mark(phase, model) at the end of
+    each phase; everything added to the model since the previous mark is
+    attributed to that phase. end_build() stops the optional profilers so the
+    solve itself doesn't end up in the build profile.
+    """
+
+    def __init__(self, profile=False, trace_memory=False, profile_limit=30):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_limit = profile_limit
+        self.phases = []
+        self.extra = {}
+        self.__profiler = None
+        self.__started_tracemalloc = False
+        self.__last_time = None
+        self.__num_vars = 0
+        self.__num_constraints = 0
+        self.__cprofile = None
+        self.__tracemalloc = None
+
+    def reset(self):
+        """Forget everything recorded so far, to report on another model."""
+        self.__init__(self.profile, self.trace_memory, self.profile_limit)
+
+    def begin(self, model):
+        self.__last_time = time.perf_counter()
+        self.__num_vars = len(model.Proto().variables)
+        self.__num_constraints = len(model.Proto().constraints)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__started_tracemalloc = True
+        if self.profile:
+            self.__profiler = cProfile.Profile()
+            self.__profiler.enable()
+
+    def mark(self, phase, model):
+        now = time.perf_counter()
+        proto = model.Proto()
+        int_vars = bool_vars = constants = 0
+        for i in range(self.__num_vars, len(proto.variables)):
+            domain = proto.variables[i].domain
+            if len(domain) == 2 and domain[0] == domain[1]:
+                constants += 1
+            elif len(domain) == 2 and domain[0] == 0 and domain[1] == 1:
+                bool_vars += 1
+            else:
+                int_vars += 1
+        constraint_types = Counter(
+            proto.constraints[i].WhichOneof("constraint")
+            for i in range(self.__num_constraints, len(proto.constraints))
+        )
+        self.phases.append({
+            "phase": phase,
+            "seconds": now - self.__last_time,
+            "int_vars": int_vars,
+            "bool_vars": bool_vars,
+            "constants": constants,
+            "constraints": sum(constraint_types.values()),
+            "constraint_types": dict(sorted(constraint_types.items())),
+        })
+        self.__num_vars = len(proto.variables)
+        self.__num_constraints = len(proto.constraints)
+        self.__last_time = time.perf_counter()
+
+    def end_build(self):
+        if self.__profiler is not None:
+            self.__profiler.disable()
+            out = io.StringIO()
+            stats = pstats.Stats(self.__profiler, stream=out)
+            stats.sort_stats("cumulative").print_stats(self.profile_limit)
+            self.__cprofile = out.getvalue()
+            self.__profiler = None
+        if self.__started_tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.__started_tracemalloc = False
+            self.__tracemalloc = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [
+                    {"where": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:self.profile_limit]
+                ],
+            }
+
+    def build_seconds(self):
+        return sum(p["seconds"] for p in self.phases if p["phase"] not in ("solve", "extraction"))
+
+    def to_dict(self):
+        totals = Counter()
+        for phase in self.phases:
+            for key in ("seconds", "int_vars", "bool_vars", "constants", "constraints"):
+                totals[key] += phase[key]
+        report = {
+            "phases": self.phases,
+            "totals": dict(totals),
+            "build_seconds": self.build_seconds(),
+        }
+        report.update(self.extra)
+        if self.__cprofile is not None:
+            report["cprofile"] = self.__cprofile
+        if self.__tracemalloc is not None:
+            report["tracemalloc"] = self.__tracemalloc
+        return report
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
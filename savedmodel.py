@@ -0,0 +1,202 @@
+"""Models optimize_factory_layout built, on disk, to solve again without
+building them again.
+
+A saved model is a zip of the CP-SAT model proto and a JSON mapping from
+the spec to it: the indices of every block's position and rotation
+variables, of the objective, and of every connection's port choice. The
+spec itself comes along in canonical form, so a saved model can be solved
+and checked on a machine that doesn't have the spec module.
+
+    python main.py --fast --save-model base.model
+    python main.py solve-model base.model --time 60 --seed 7 --out layout.json
+"""
+
+import argparse
+import json
+import time
+import zipfile
+
+from ortools.sat.python import cp_model
+
+from main import ConnectionIndex, complete_hint, get_chosen_connections, get_chosen_ports, solve_model
+from report import BuildReport
+from spec import Block, Connection, OneOf
+from store import canonical_spec
+from symmetry import canonical_hints
+
+# 2: the symmetry classes and unrotated blocks came along
+FORMAT = 2
+
+
+def _pos(pos):
+    return {"one_of": list(pos.conns)} if isinstance(pos, OneOf) else pos
+
+
+def save_model(path, model, blocks, connections, grid_size, positions, rotations, total_weighted_distance,
+               connection_details, obstacles=None, classes=None, unrotated=None):
+    """Write model, with the variables optimize_factory_layout kept track of
+    while building it, to path. classes and unrotated are the symmetry
+    classes and rotation symmetric blocks it ordered or kept unrotated."""
+    mapping = {
+        "format": FORMAT,
+        "spec": canonical_spec(blocks, connections, grid_size),
+        # the canonical spec sorts them; the model has them in this order
+        "connection_order": [[name1, name2, _pos(pos1), _pos(pos2), weight]
+                             for name1, name2, pos1, pos2, weight in ConnectionIndex(blocks, connections).connections],
+        "obstacles": [list(rect) for rect in obstacles or []],
+        # hints have to be relabeled the same way to agree with the model
+        "symmetry_classes": [list(names) for names in classes or []],
+        "unrotated": list(unrotated or []),
+        "blocks": {name: [x.Index(), y.Index(), rotations[name][0].Index(), rotations[name][1].Index()]
+                   for name, (x, y) in positions.items()},
+        "objective": total_weighted_distance.Index(),
+        # combination literal, source, target, start x, start y, end x, end
+        # y, source port, target port, weight
+        "connections": [[d[0].Index(), d[1], d[2], d[3].Index(), d[4].Index(), d[5].Index(), d[6].Index(),
+                         d[7], d[8], d[9]] for d in connection_details],
+    }
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("model.pb", model.Proto().SerializeToString())
+        archive.writestr("mapping.json", json.dumps(mapping))
+
+
+def spec_from_canonical(spec):
+    """(blocks, connections, grid size) back from store.canonical_spec."""
+    blocks = {}
+    for name, entry in spec["blocks"].items():
+        if "fixed" in entry:
+            blocks[name] = Block(entry["width"], entry["height"], entry.get("weight", 1), *entry["fixed"],
+                                 rotated=entry.get("rotated", False))
+        elif "weight" in entry:
+            blocks[name] = Block(entry["width"], entry["height"], entry["weight"])
+        else:
+            blocks[name] = (entry["width"], entry["height"])
+    connections = []
+    for name1, name2, pos1, pos2, weight in spec["connections"]:
+        pos1, pos2 = (OneOf(*pos["one_of"]) if isinstance(pos, dict) else pos for pos in (pos1, pos2))
+        connection = Connection(name1, name2, pos1, pos2)
+        # already scaled
+        connection.weight = weight
+        connections.append(connection)
+    return blocks, connections, tuple(spec["grid_size"])
+
+
+class SavedModel:
+    """A model read back by load_model: the CpModel, the spec it was built
+    from, and its variables in the forms solve_model takes."""
+
+    def __init__(self, proto, mapping):
+        if mapping["format"] != FORMAT:
+            raise ValueError(f"saved model format {mapping['format']}, expected {FORMAT}")
+        self.proto = proto
+        self.mapping = mapping
+        self.blocks, self.connections, self.grid_size = spec_from_canonical(
+            {**mapping["spec"], "connections": mapping["connection_order"]})
+        self.obstacles = [tuple(rect) for rect in mapping["obstacles"]]
+        self.classes = mapping["symmetry_classes"]
+        self.unrotated = mapping["unrotated"]
+
+    def instantiate(self):
+        """A fresh CpModel, and its (positions, rotations, objective,
+        connection details) like optimize_factory_layout keeps."""
+        model = cp_model.CpModel()
+        model.Proto().CopyFrom(self.proto)
+        var = model.get_int_var_from_proto_index
+        positions = {name: (var(x), var(y)) for name, (x, y, _, _) in self.mapping["blocks"].items()}
+        rotations = {name: (model.get_bool_var_from_proto_index(no_rotation),
+                            model.get_bool_var_from_proto_index(rotated))
+                     for name, (_, _, no_rotation, rotated) in self.mapping["blocks"].items()}
+        connection_details = [(model.get_bool_var_from_proto_index(d[0]), d[1], d[2], var(d[3]), var(d[4]),
+                               var(d[5]), var(d[6]), d[7], d[8], d[9]) for d in self.mapping["connections"]]
+        return model, positions, rotations, var(self.mapping["objective"]), connection_details
+
+
+def load_model(path):
+    with zipfile.ZipFile(path) as archive:
+        proto = cp_model.cp_model_pb2.CpModelProto()
+        proto.ParseFromString(archive.read("model.pb"))
+        mapping = json.loads(archive.read("mapping.json"))
+    return SavedModel(proto, mapping)
+
+
+def solve_saved_model(saved, max_time, report=None, seed=None, hint_positions=None, hint_ports=None,
+                      objective_upper_bound=None, **kwargs):
+    """Solve a SavedModel like optimize_factory_layout would have, and
+    return what it returns.
+
+    hint_positions and hint_ports replace the hints saved with the model,
+    relabeled as optimize_factory_layout would to agree with its symmetry
+    constraints; objective_upper_bound tightens the one it was built with. kwargs go to
+    main.solve_model.
+    """
+    if report is None:
+        report = BuildReport()
+    started = time.perf_counter()
+    model, positions, rotations, total, connection_details = saved.instantiate()
+    report.begin(model)
+    if objective_upper_bound is not None:
+        model.Add(total <= objective_upper_bound)
+    hint_positions, hint_ports = canonical_hints(saved.classes, saved.unrotated, saved.grid_size, hint_positions,
+                                                 hint_ports)
+    if hint_positions:
+        layout_hints = []
+        for name, (x, y, is_rotated) in hint_positions.items():
+            if name in positions:
+                layout_hints += [(positions[name][0], x), (positions[name][1], y),
+                                 (rotations[name][1], int(bool(is_rotated)))]
+        for d in connection_details:
+            hinted = (hint_ports or {}).get((d[1], d[2]))
+            if hinted:
+                layout_hints.append((d[0], int((d[7], d[8]) == tuple(hinted))))
+        complete = complete_hint(model, layout_hints, min(2.0, max_time / 10))
+        if not complete:
+            model.clear_hints()
+            for var, value in layout_hints:
+                model.add_hint(var, value)
+        report.extra["hint"] = {"layout_hints": len(layout_hints), "completed": complete}
+    report.extra["load_seconds"] = time.perf_counter() - started
+    report.mark("load", model)
+    report.end_build()
+    return solve_model(model, positions, rotations, total, connection_details, max_time, report=report, seed=seed,
+                       verify=(saved.blocks, saved.connections, saved.grid_size, saved.obstacles), **kwargs)
+
+
+def solve_model_command(argv):
+    """python main.py solve-model PATH ...: solve a saved model and write the
+    layout as JSON."""
+    parser = argparse.ArgumentParser(prog="main.py solve-model", description="Solve a model saved with --save-model")
+    parser.add_argument("path", help="Saved model")
+    parser.add_argument("--time", type=float, default=60, help="Seconds to solve for")
+    parser.add_argument("--seed", type=int, help="CP-SAT random seed")
+    parser.add_argument("--workers", type=int, help="CP-SAT search workers (default: all cores)")
+    parser.add_argument("--hint", help="Layout JSON (as --out writes it) to start from instead of the saved hints")
+    parser.add_argument("--out", default="layout.json", help="Where to write the layout")
+    args = parser.parse_args(argv)
+
+    saved = load_model(args.path)
+    hint_positions = hint_ports = upper_bound = None
+    if args.hint:
+        with open(args.hint) as f:
+            hint = json.load(f)
+        hint_positions = hint["positions"]
+        hint_ports = {tuple(key.split("\t")): tuple(value) for key, value in hint["ports"].items()}
+        upper_bound = hint["distance"]
+    report = BuildReport()
+    solver, positions, distance, connection_details = solve_saved_model(
+        saved, args.time, report=report, seed=args.seed, hint_positions=hint_positions, hint_ports=hint_ports,
+        objective_upper_bound=upper_bound, num_workers=args.workers)
+    if positions is None:
+        print("No solution found.")
+        return 1
+    ports = get_chosen_ports(solver, connection_details)
+    with open(args.out, "w") as f:
+        json.dump({
+            "distance": distance,
+            "status": report.extra["solve"]["status"],
+            "positions": {name: [x, y, bool(r)] for name, (x, y, r) in positions.items()},
+            # JSON keys are strings: source and target joined by a tab
+            "ports": {f"{source}\t{target}": list(pair) for (source, target), pair in ports.items()},
+            "chosen_connections": get_chosen_connections(solver, connection_details),
+        }, f, indent=2)
+    print(f"Distance {distance}, written to {args.out}")
+    return 0
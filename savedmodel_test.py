@@ -0,0 +1,80 @@
+import json
+import pickle
+
+from main import get_chosen_ports, optimize_factory_layout
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+from report import BuildReport
+from savedmodel import load_model, solve_model_command, solve_saved_model, spec_from_canonical
+from spec import Block
+from store import canonical_spec
+
+
+def test_spec_from_canonical():
+    spec = canonical_spec(test_blocks, test_connections, test_grid_size)
+    assert canonical_spec(*spec_from_canonical(spec)) == spec
+
+
+def test_save_and_solve(tmp_path):
+    path = str(tmp_path / "test.model")
+    report = BuildReport()
+    solver, positions, distance, details = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, report=report, save_model=path)
+    assert report.extra["saved_model"] == path
+
+    saved = load_model(path)
+    # a loaded model can go to another process
+    saved = pickle.loads(pickle.dumps(saved))
+    report = BuildReport()
+    solver, loaded_positions, loaded_distance, loaded_details = solve_saved_model(saved, 10, report=report, seed=3)
+    assert loaded_distance == distance
+    assert report.extra["solve"]["status"] == "OPTIMAL"
+    assert report.extra["verify"]["problems"] == []
+    assert_valid_layout(test_blocks, loaded_positions, test_grid_size)
+    assert get_chosen_ports(solver, loaded_details)[("Coal Mine", "Iron Smelting")] == ("MM", "LM")
+
+    # hints and a bound from elsewhere replace the saved ones
+    ports = get_chosen_ports(solver, loaded_details)
+    _, hinted_positions, hinted_distance, _ = solve_saved_model(
+        saved, 10, hint_positions=loaded_positions, hint_ports=ports, objective_upper_bound=loaded_distance)
+    assert hinted_distance == distance
+
+
+def test_build_only(tmp_path):
+    path = str(tmp_path / "test.model")
+    assert optimize_factory_layout(test_blocks, test_connections, test_grid_size, 0, save_model=path,
+                                   build_only=True) == (None, None, None, None)
+    assert load_model(path).mapping["spec"] == canonical_spec(test_blocks, test_connections, test_grid_size)
+
+
+def test_solve_model_command(tmp_path):
+    path = str(tmp_path / "test.model")
+    out = str(tmp_path / "layout.json")
+    optimize_factory_layout(test_blocks, test_connections, test_grid_size, 0, save_model=path, build_only=True)
+    assert solve_model_command([path, "--time", "10", "--seed", "1", "--out", out]) == 0
+    with open(out) as f:
+        layout = json.load(f)
+    assert layout["status"] == "OPTIMAL"
+    assert layout["ports"]["Coal Mine\tIron Smelting"] == ["MM", "LM"]
+    # and again, starting from that layout
+    assert solve_model_command([path, "--time", "10", "--hint", out, "--out", out]) == 0
+
+
+def test_hint_with_identical_blocks_swapped(tmp_path):
+    # two furnaces the model orders by position: a hint that has them the
+    # other way round is relabeled, not rejected
+    blocks = {"Mine": Block(1, 1, fixed_x=0, fixed_y=0), "Furnace 1": (2, 3), "Furnace 2": (2, 3),
+              "Assembler": (3, 3)}
+    connections = [("Mine", "Furnace 1", "MM", "LM"), ("Mine", "Furnace 2", "MM", "LM"),
+                   ("Furnace 1", "Assembler", "RM", "MM"), ("Furnace 2", "Assembler", "RM", "MM")]
+    path = str(tmp_path / "test.model")
+    solver, positions, distance, details = optimize_factory_layout(blocks, connections, (10, 10), 10,
+                                                                   save_model=path)
+    swap = {"Furnace 1": "Furnace 2", "Furnace 2": "Furnace 1"}
+    swapped = {swap.get(name, name): position for name, position in positions.items()}
+    ports = {(swap.get(source, source), swap.get(target, target)): pair
+             for (source, target), pair in get_chosen_ports(solver, details).items()}
+    report = BuildReport()
+    _, _, hinted_distance, _ = solve_saved_model(load_model(path), 10, report=report, hint_positions=swapped,
+                                                 hint_ports=ports, objective_upper_bound=distance)
+    assert report.extra["hint"]["completed"]
+    assert hinted_distance == distance
@@ -0,0 +1,88 @@
+"""Sharing a time budget between solver configurations by how well they do.
+
+Splitting max_time evenly wastes most of it: a run that has plateaued keeps
+its share until max_time, and a configuration that's clearly behind gets as
+much as the one that's ahead. run_adaptive does successive halving instead.
+Every configuration gets a short first slice; after each round the better
+half carries on from its own best layout with a bigger slice, until one is
+left with the rest. Each slice ends early once it stops improving (see
+stopping.StopRules), and the time it didn't use goes back in the pool.
+"""
+
+import math
+import time
+
+from main import SOLVER_PROFILES, get_chosen_connections, get_chosen_ports, optimize_factory_layout
+from report import BuildReport
+from stopping import StopRules
+
+
+def _rank(arm):
+    # best layout first; between equals, one that was still improving when
+    # its slice ran out beats one that had plateaued
+    return (arm["distance"] is None, arm["distance"] or 0, arm["plateaued"])
+
+
+def run_adaptive(blocks, connections, grid_size, max_time, configs, stop_rules=None, first_share=0.5,
+                 hint_positions=None, hint_ports=None, objective_upper_bound=None, obstacles=None, progress=None):
+    """Solve with each of configs (dicts like portfolio.portfolio_configs
+    makes: seed, overlap, profile, num_workers) one after another, giving
+    more of max_time to whichever are ahead.
+
+    first_share of max_time is split evenly for the first round. stop_rules'
+    gap or target ends the whole schedule once any solve reaches it; its
+    no_improvement (a quarter of the slice if unset) ends just that slice.
+    Returns (best result, all results) like portfolio.run_portfolio, with a
+    result per slice. progress (a progress.ProgressLog) gets every slice's
+    records, tagged with its configuration.
+    """
+    stop_rules = stop_rules or StopRules()
+    started = time.monotonic()
+    arms = [{"config": config, "distance": None, "positions": hint_positions, "ports": hint_ports,
+             "upper_bound": objective_upper_bound, "plateaued": False} for config in configs]
+    results = []
+    best = None
+    slice_time = max_time * first_share / len(arms)
+    finished = False
+    while arms and not finished:
+        for arm in arms:
+            remaining = max_time - (time.monotonic() - started)
+            if remaining < 1:
+                finished = True
+                break
+            config = arm["config"]
+            budget = min(slice_time, remaining)
+            rules = StopRules(stop_rules.no_improvement or budget / 4, stop_rules.gap, stop_rules.target)
+            print(f"adaptive: {config['overlap']}/{config['profile']} seed {config['seed']} for {budget:.1f}s")
+            report = BuildReport()
+            solver, positions, distance, connection_details = optimize_factory_layout(
+                blocks, connections, grid_size, budget, allow_rotation=True, overlap=config["overlap"],
+                report=report, seed=config["seed"], hint_positions=arm["positions"], hint_ports=arm["ports"],
+                objective_upper_bound=arm["upper_bound"], num_workers=config["num_workers"],
+                solver_params=SOLVER_PROFILES[config["profile"]], log_search=False, obstacles=obstacles,
+                stop_rules=rules, progress=progress.tagged(worker=config["worker"], overlap=config["overlap"],
+                                                           profile=config["profile"]) if progress else None)
+            solve = report.extra["solve"]
+            result = {"config": config, "positions": positions, "distance": distance, "ports": None,
+                      "chosen_connections": None, "report": report.to_dict()}
+            results.append(result)
+            arm["plateaued"] = solve["stop_reason"] == "no_improvement"
+            if positions is not None:
+                result["ports"] = get_chosen_ports(solver, connection_details)
+                result["chosen_connections"] = get_chosen_connections(solver, connection_details)
+                arm.update(distance=distance, positions=positions, ports=result["ports"], upper_bound=distance)
+                if best is None or distance < best["distance"]:
+                    best = result
+            if solve["status"] == "OPTIMAL" or solve["stop_reason"] in ("gap", "target"):
+                finished = True
+                break
+
+        if len(arms) == 1 and arms[0]["plateaued"]:
+            # the last one standing had everything that was left and
+            # stopped improving: the rest of the budget is better spent
+            # elsewhere
+            break
+        remaining = max_time - (time.monotonic() - started)
+        arms = sorted(arms, key=_rank)[:math.ceil(len(arms) / 2)]
+        slice_time = remaining if len(arms) == 1 else remaining / 2 / len(arms)
+    return best, results
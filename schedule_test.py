@@ -0,0 +1,25 @@
+from factorio import blocks, connections, grid_size
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+from portfolio import portfolio_configs
+from schedule import run_adaptive
+from stopping import StopRules
+
+
+def test_run_adaptive_stops_at_optimum():
+    best, results = run_adaptive(test_blocks, test_connections, test_grid_size, 20, portfolio_configs(3, cores=1))
+    assert best is not None
+    assert_valid_layout(test_blocks, best["positions"], test_grid_size)
+    # the first configuration proves optimality, so nothing else runs
+    assert len(results) == 1
+    assert results[0]["report"]["solve"]["status"] == "OPTIMAL"
+
+
+def test_run_adaptive_halves():
+    configs = portfolio_configs(2, cores=1)
+    best, results = run_adaptive(blocks, connections, grid_size, 12, configs, StopRules(no_improvement=1))
+    assert best["distance"] == min(r["distance"] for r in results if r["distance"] is not None)
+    assert [r["config"]["worker"] for r in results[:2]] == [0, 1]
+    # after the first round only the better configuration carries on
+    leader = min(results[:2], key=lambda r: r["distance"])["config"]["worker"]
+    assert all(r["config"]["worker"] == leader for r in results[2:])
+    assert sum(r["report"]["solve"]["wall_time"] for r in results) <= 12
@@ -0,0 +1,77 @@
+"""The pieces a spec like factorio.py is built from.
+
+These live apart from the specs themselves so a spec module can be reloaded
+(see incremental.watch) without minting new Block/Connection/OneOf classes
+that the rest of the code wouldn't recognize.
+"""
+
+import importlib
+import importlib.util
+import os
+
+class Block:
+    def __init__(self, width, height, weight=1, fixed_x=None, fixed_y=None, rotated=False):
+        self.width = width
+        self.height = height
+        self.weight = weight
+        self.fixed_x = fixed_x
+        self.fixed_y = fixed_y
+        # only meaningful for fixed blocks: pin the block turned 90 degrees
+        # clockwise, so its footprint is height x width
+        self.rotated = rotated
+
+    def fixed_position(self):
+        return self.fixed_x is not None and self.fixed_y is not None
+
+class Connection:
+    def __init__(self, source, target, source_pos, target_pos, weight=1):
+        self.source = source
+        self.target = target
+        self.source_pos = source_pos
+        self.target_pos = target_pos
+        self.weight = int(weight * 10)
+
+class OneOf:
+    def __init__(self, *args):
+        self.conns = args
+
+def block_size(block_info):
+    """Return (width, height) for either a Block or a plain (width, height)."""
+    if isinstance(block_info, Block):
+        return block_info.width, block_info.height
+    return block_info
+
+def is_fixed(block_info):
+    return isinstance(block_info, Block) and block_info.fixed_position()
+
+def unpack_connection(conn):
+    """Return (source, target, source_pos, target_pos, weight) for either a
+    Connection or a plain tuple."""
+    if isinstance(conn, Connection):
+        return conn.source, conn.target, conn.source_pos, conn.target_pos, conn.weight
+    name1, name2, pos1, pos2 = conn
+    return name1, name2, pos1, pos2, 1  # Default weight for tuple connections
+
+# the specs in factorio.py, by the name --spec takes: the module and its
+# blocks dict; they share its connections and grid_size
+SPECS = {
+    "base": ("factorio", "blocks"),
+    "rocket": ("factorio", "rocket_blocks"),
+    "everything": ("factorio", "everything_blocks"),
+}
+
+def load_spec(name):
+    """(blocks, connections, grid size) for name: one of SPECS, the name of a
+    module with blocks, connections and grid_size (like generate.py writes),
+    or the path of a .py file with them. Only the spec asked for is built."""
+    module_name, attribute = SPECS.get(name, (name, "blocks"))
+    if module_name.endswith(".py"):
+        module_spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(module_name))[0],
+                                                             module_name)
+        if module_spec is None:
+            raise ValueError(f"can't load a spec from {module_name}")
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_name)
+    return getattr(module, attribute), module.connections, tuple(module.grid_size)
@@ -0,0 +1,113 @@
+import math
+import time
+
+from main import get_chosen_connections, get_chosen_ports, optimize_factory_layout
+from spec import Block, Connection, block_size, is_fixed, unpack_connection
+
+
+def midpoint_connections(connections):
+    """connections with every port, OneOf or not, replaced by the block's
+    middle."""
+    result = []
+    for conn in connections:
+        name1, name2, _, _, weight = unpack_connection(conn)
+        conn = Connection(name1, name2, "MM", "MM")
+        # already scaled by unpack_connection
+        conn.weight = weight
+        result.append(conn)
+    return result
+
+
+def coarse_spec(blocks, grid_size, scale):
+    """blocks and grid_size shrunk by scale, rounding sizes up so a coarse
+    layout that fits still fits at full resolution. Fixed blocks cover every
+    cell they touch."""
+    coarse = {}
+    for name, block_info in blocks.items():
+        width, height = block_size(block_info)
+        weight = block_info.weight if isinstance(block_info, Block) else 1
+        if is_fixed(block_info):
+            if block_info.rotated:
+                width, height = height, width
+            x, y = block_info.fixed_x // scale, block_info.fixed_y // scale
+            coarse[name] = Block(math.ceil((block_info.fixed_x + width) / scale) - x,
+                                 math.ceil((block_info.fixed_y + height) / scale) - y, weight, fixed_x=x, fixed_y=y)
+        else:
+            coarse[name] = Block(math.ceil(width / scale), math.ceil(height / scale), weight)
+    return coarse, (grid_size[0] // scale, grid_size[1] // scale)
+
+
+def coarse_rects(rects, scale):
+    """(x, y, width, height) rectangles scaled down to cover every cell
+    they touch."""
+    result = []
+    for x, y, width, height in rects:
+        cell_x, cell_y = x // scale, y // scale
+        result.append((cell_x, cell_y, math.ceil((x + width) / scale) - cell_x, math.ceil((y + height) / scale) - cell_y))
+    return result
+
+
+def window(layout, slack):
+    """position_bounds keeping every block within slack tiles of layout."""
+    return {name: (x - slack, x + slack, y - slack, y + slack) for name, (x, y, _) in layout.items()}
+
+
+def staged_solve(blocks, connections, grid_size, max_time, scale=4, slack=None, obstacles=None, **kwargs):
+    """Solve in three stages, each hinting the next:
+
+    1. a grid scale times coarser, no rotation, midpoint ports only
+    2. full resolution with rotation, still midpoint ports, every block
+       within slack tiles (scale by default) of where stage 1 put it
+    3. the real ports, again within slack tiles of stage 2
+
+    A stage that finds nothing inside its window is retried without one.
+    The budget is split 20/30/50, and no stage or retry runs past max_time
+    (give or take a second). Returns a dict with the positions,
+    distance, ports and chosen connections of the last stage, plus each
+    stage's objective in "history", or None if a stage found nothing.
+    """
+    if slack is None:
+        slack = scale
+    started = time.monotonic()
+    midpoints = midpoint_connections(connections)
+    history = []
+
+    coarse_blocks, coarse_grid = coarse_spec(blocks, grid_size, scale)
+    _, coarse_layout, distance, _ = optimize_factory_layout(
+        coarse_blocks, midpoints, coarse_grid, max_time * 0.2, allow_rotation=False, log_search=False,
+        obstacles=coarse_rects(obstacles or [], scale), **kwargs)
+    if coarse_layout is None:
+        print(f"No layout on the {coarse_grid[0]}x{coarse_grid[1]} coarse grid")
+        return None
+    history.append(("coarse", distance))
+    layout = {name: (x * scale, y * scale, False) for name, (x, y, _) in coarse_layout.items()}
+
+    stages = [("rotation", midpoints, max_time * 0.3), ("ports", connections, max_time * 0.5)]
+    for stage, stage_connections, stage_time in stages:
+        # a failed window has usually used up its time, so the retry (and
+        # the stages after it) only get what's left of max_time
+        def remaining():
+            return max(1, min(stage_time, max_time - (time.monotonic() - started)))
+
+        result = optimize_factory_layout(blocks, stage_connections, grid_size, remaining(), hint_positions=layout,
+                                         position_bounds=window(layout, slack), log_search=False,
+                                         obstacles=obstacles, **kwargs)
+        if result[1] is None:
+            print(f"No layout within {slack} tiles of the previous stage, retrying the {stage} stage unbounded")
+            result = optimize_factory_layout(blocks, stage_connections, grid_size, remaining(),
+                                             hint_positions=layout, log_search=False, obstacles=obstacles,
+                                             **kwargs)
+        solver, layout, distance, details = result
+        if layout is None:
+            print(f"No layout in the {stage} stage")
+            return None
+        history.append((stage, distance))
+        print(f"{stage} stage: distance {distance}")
+
+    return {
+        "positions": layout,
+        "distance": distance,
+        "ports": get_chosen_ports(solver, details),
+        "chosen_connections": get_chosen_connections(solver, details),
+        "history": history,
+    }
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from main_test import assert_valid_layout, test_blocks, test_connections, test_grid_size
+from spec import Block
+import staged
+from staged import coarse_spec, staged_solve
+
+
+def test_coarse_spec():
+    blocks = {"Mine": Block(3, 1, fixed_x=3, fixed_y=2, rotated=True), "Smelting": (6, 3)}
+    coarse, grid = coarse_spec(blocks, (17, 16), 4)
+    assert grid == (4, 4)
+    # the rotated mine covers x 3..4, y 2..5: two cells tall
+    mine = coarse["Mine"]
+    assert (mine.fixed_x, mine.fixed_y, mine.width, mine.height) == (0, 0, 1, 2)
+    assert (coarse["Smelting"].width, coarse["Smelting"].height) == (2, 1)
+
+
+def test_staged_solve():
+    best = staged_solve(test_blocks, test_connections, test_grid_size, 6, scale=2, num_workers=1)
+    assert best is not None
+    assert [stage for stage, _ in best["history"]] == ["coarse", "rotation", "ports"]
+    assert_valid_layout(test_blocks, best["positions"], test_grid_size)
+    assert best["positions"]["Coal Mine"] == (0, 0, False)
+
+
+def test_staged_solve_stays_in_budget(monkeypatch):
+    # every window too tight: each retry only gets what's left of max_time,
+    # on a clock that moves by a solve's whole budget
+    clock = [0]
+    budgets = []
+    def windows_fail(blocks, connections, grid_size, max_time, position_bounds=None, **kwargs):
+        budgets.append(max_time)
+        clock[0] += max_time
+        if position_bounds is not None or len(budgets) == 5:
+            return None, None, None, None
+        return None, {name: (0, 0, False) for name in blocks}, 0, []
+    monkeypatch.setattr(staged, "optimize_factory_layout", windows_fail)
+    monkeypatch.setattr(staged, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    assert staged.staged_solve(test_blocks, test_connections, test_grid_size, 100) is None
+    # coarse, rotation and its retry, ports and its retry
+    assert budgets == [20, 30, 30, 20, 1]
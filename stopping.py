@@ -0,0 +1,70 @@
+"""Stopping a solve before max_time once more time isn't worth it.
+
+CP-SAT on its own only stops at max_time_in_seconds or at a proof of
+optimality, but most runs stop improving long before either. A StopRules is
+checked from the solution callback at every improving solution, and a
+watchdog thread covers the no-improvement rule, which has to fire while no
+solutions are coming in.
+"""
+
+import threading
+
+
+class StopRules:
+    """When to stop a solve early.
+
+    no_improvement: seconds without a better solution, counted from the
+    last one (the rule isn't armed until there is a first). gap: relative
+    gap (objective - bound) / objective at or below which to stop. target:
+    objective at or below which to stop. Any of them may be None.
+    """
+
+    def __init__(self, no_improvement=None, gap=None, target=None):
+        self.no_improvement = no_improvement
+        self.gap = gap
+        self.target = target
+
+    def __bool__(self):
+        return any(rule is not None for rule in (self.no_improvement, self.gap, self.target))
+
+    def to_dict(self):
+        return {"no_improvement": self.no_improvement, "gap": self.gap, "target": self.target}
+
+    def check(self, objective, bound):
+        """Why to stop at a solution with this objective and best bound, or
+        None to carry on."""
+        if self.target is not None and objective <= self.target:
+            return "target"
+        if self.gap is not None and objective > 0 and (objective - bound) / objective <= self.gap:
+            return "gap"
+        return None
+
+
+class Watchdog:
+    """Calls stop() once no_improvement seconds pass without a call to
+    improved(). Not armed until the first improved()."""
+
+    def __init__(self, no_improvement, stop):
+        self.__no_improvement = no_improvement
+        self.__stop = stop
+        self.__timer = None
+        self.__lock = threading.Lock()
+        self.fired = False
+
+    def __fire(self):
+        self.fired = True
+        self.__stop()
+
+    def improved(self):
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+            self.__timer = threading.Timer(self.__no_improvement, self.__fire)
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def cancel(self):
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
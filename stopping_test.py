@@ -0,0 +1,51 @@
+import threading
+
+from factorio import blocks, connections, grid_size
+from main import optimize_factory_layout
+from main_test import test_blocks, test_connections, test_grid_size
+from report import BuildReport
+from stopping import StopRules, Watchdog
+
+
+def test_stop_rules():
+    assert not StopRules()
+    assert StopRules().check(100, 0) is None
+    assert StopRules(target=100).check(100, 0) == "target"
+    assert StopRules(target=99).check(100, 0) is None
+    assert StopRules(gap=0.1).check(100, 90) == "gap"
+    assert StopRules(gap=0.1).check(100, 89) is None
+
+
+def test_watchdog():
+    stopped = threading.Event()
+    watchdog = Watchdog(0.05, stopped.set)
+    assert not stopped.wait(0.1), "fired before the first improvement"
+    watchdog.improved()
+    assert stopped.wait(1)
+    assert watchdog.fired
+
+    stopped.clear()
+    watchdog = Watchdog(0.05, stopped.set)
+    watchdog.improved()
+    watchdog.cancel()
+    assert not stopped.wait(0.1)
+
+
+def test_stop_at_target():
+    report = BuildReport()
+    _, positions, distance, _ = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, report=report, construct_time=0,
+        stop_rules=StopRules(target=10 ** 6))
+    assert positions is not None
+    assert report.extra["solve"]["stop_reason"] == "target"
+    assert report.extra["solve"]["solutions"] == 1
+
+
+def test_stop_without_improvement():
+    report = BuildReport()
+    _, positions, _, _ = optimize_factory_layout(
+        blocks, connections, grid_size, 60, report=report, num_workers=1, log_search=False,
+        stop_rules=StopRules(no_improvement=1))
+    assert positions is not None
+    assert report.extra["solve"]["stop_reason"] == "no_improvement"
+    assert report.extra["solve"]["wall_time"] < 30
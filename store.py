@@ -0,0 +1,214 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from spec import Block, OneOf, block_size, unpack_connection
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS specs (
+    hash TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spec_hash TEXT NOT NULL REFERENCES specs(hash),
+    started REAL NOT NULL,
+    params TEXT NOT NULL,
+    seed INTEGER,
+    status TEXT,
+    objective INTEGER,
+    bound REAL,
+    layout TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_spec ON runs(spec_hash, objective);
+CREATE TABLE IF NOT EXISTS progress (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    wall_time REAL NOT NULL,
+    objective REAL NOT NULL,
+    bound REAL NOT NULL
+);
+"""
+
+
+def _canonical_pos(pos):
+    if isinstance(pos, OneOf):
+        return {"one_of": list(pos.conns)}
+    return pos
+
+
+def canonical_spec(blocks, connections, grid_size, obstacles=None):
+    """A JSON-friendly form of a spec that doesn't depend on dict or list
+    order, or on whether blocks and connections were written as tuples.
+    obstacles, (x, y, width, height) rectangles from a --mask, are part of
+    it when there are any."""
+    canonical_blocks = {}
+    for name, block_info in blocks.items():
+        width, height = block_size(block_info)
+        entry = {"width": width, "height": height}
+        if isinstance(block_info, Block):
+            entry["weight"] = block_info.weight
+            if block_info.fixed_position():
+                entry["fixed"] = [block_info.fixed_x, block_info.fixed_y]
+                if block_info.rotated:
+                    entry["rotated"] = True
+        canonical_blocks[name] = entry
+
+    canonical_connections = []
+    for conn in connections:
+        name1, name2, pos1, pos2, weight = unpack_connection(conn)
+        # connections to blocks outside the spec never make it into the model
+        if name1 not in blocks or name2 not in blocks:
+            continue
+        canonical_connections.append([name1, name2, _canonical_pos(pos1), _canonical_pos(pos2), weight])
+    canonical_connections.sort(key=lambda c: json.dumps(c, sort_keys=True))
+
+    spec = {
+        "grid_size": list(grid_size),
+        "blocks": dict(sorted(canonical_blocks.items())),
+        "connections": canonical_connections,
+    }
+    # left out when empty, so specs stored before masks existed keep their
+    # hash
+    if obstacles:
+        spec["obstacles"] = sorted(list(rect) for rect in obstacles)
+    return spec
+
+
+def spec_hash(blocks, connections, grid_size, obstacles=None):
+    spec = canonical_spec(blocks, connections, grid_size, obstacles)
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def _footprint(entry, position):
+    x, y, is_rotated = position
+    width, height = entry["width"], entry["height"]
+    return (x, y, height, width) if is_rotated else (x, y, width, height)
+
+
+def _overlaps(rect, other):
+    x, y, width, height = rect
+    ox, oy, owidth, oheight = other
+    return x < ox + owidth and ox < x + width and y < oy + oheight and oy < y + height
+
+
+def block_similarity(spec1, spec2):
+    """Fraction of blocks (by name, size and fixed position) two canonical
+    specs have in common. Specs on different grids never match."""
+    if spec1["grid_size"] != spec2["grid_size"]:
+        return 0.0
+    blocks1 = {(name, json.dumps(b, sort_keys=True)) for name, b in spec1["blocks"].items()}
+    blocks2 = {(name, json.dumps(b, sort_keys=True)) for name, b in spec2["blocks"].items()}
+    if not blocks1 and not blocks2:
+        return 1.0
+    return len(blocks1 & blocks2) / len(blocks1 | blocks2)
+
+
+class ResultsStore:
+    """Every solve we've run, keyed by a hash of the spec it solved.
+
+    The best layout for a spec (or, failing that, for the most similar spec
+    we've seen) is what warm_start hands back to seed the next solve.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def record_run(self, blocks, connections, grid_size, params, report, layout, obstacles=None):
+        """Store one optimize_factory_layout call. report is the dict from
+        BuildReport.to_dict(), layout the returned best_positions, obstacles
+        the ones it was solved with."""
+        spec = canonical_spec(blocks, connections, grid_size, obstacles)
+        digest = spec_hash(blocks, connections, grid_size, obstacles)
+        solve = report.get("solve", {})
+        objective = solve.get("objective")
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO specs (hash, spec, created) VALUES (?, ?, ?)",
+                (digest, json.dumps(spec, sort_keys=True), time.time()))
+            cursor = self.conn.execute(
+                "INSERT INTO runs (spec_hash, started, params, seed, status, objective, bound, layout) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, time.time(), json.dumps(params, sort_keys=True), solve.get("seed"),
+                 solve.get("status"), None if objective is None else int(objective),
+                 solve.get("best_bound"), None if layout is None else json.dumps(layout)))
+            run_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO progress (run_id, wall_time, objective, bound) VALUES (?, ?, ?, ?)",
+                [(run_id, wall_time, obj, bound) for wall_time, obj, bound in solve.get("history", [])])
+        return run_id
+
+    def best_run(self, digest):
+        """(objective, layout) of the best run for a spec hash, or None."""
+        row = self.conn.execute(
+            "SELECT objective, layout FROM runs WHERE spec_hash = ? AND layout IS NOT NULL "
+            "ORDER BY objective ASC LIMIT 1", (digest,)).fetchone()
+        if row is None:
+            return None
+        return row[0], _load_layout(row[1])
+
+    def progress(self, run_id):
+        return self.conn.execute(
+            "SELECT wall_time, objective, bound FROM progress WHERE run_id = ? ORDER BY wall_time",
+            (run_id,)).fetchall()
+
+    def closest_run(self, blocks, connections, grid_size, min_similarity=0.8, obstacles=None):
+        """The best stored run for this spec, or for the most similar spec
+        with a layout if there's no exact match.
+
+        Returns (canonical spec it solved, objective, layout, exact), or None
+        if nothing is at least min_similarity alike.
+        """
+        digest = spec_hash(blocks, connections, grid_size, obstacles)
+        spec = canonical_spec(blocks, connections, grid_size, obstacles)
+        best = self.best_run(digest)
+        if best is not None:
+            return spec, best[0], best[1], True
+
+        closest = None
+        closest_similarity = min_similarity
+        rows = self.conn.execute(
+            "SELECT hash, spec FROM specs WHERE hash IN (SELECT spec_hash FROM runs WHERE layout IS NOT NULL)")
+        for other_hash, other_spec in rows:
+            other_spec = json.loads(other_spec)
+            similarity = block_similarity(spec, other_spec)
+            if similarity >= closest_similarity:
+                closest, closest_similarity = (other_hash, other_spec), similarity
+        if closest is None:
+            return None
+        objective, layout = self.best_run(closest[0])
+        return closest[1], objective, layout, False
+
+    def warm_start(self, blocks, connections, grid_size, min_similarity=0.8, obstacles=None):
+        """Return (hint_positions, objective_upper_bound) for a spec solved
+        with obstacles.
+
+        An exact match, obstacles included, gives back its best layout and
+        objective. Otherwise the best layout of the most similar spec is
+        trimmed to the blocks that didn't change and don't cover one of
+        obstacles, and there's no upper bound since its objective says
+        nothing about this spec. (None, None) if nothing is close.
+        """
+        closest = self.closest_run(blocks, connections, grid_size, min_similarity, obstacles)
+        if closest is None:
+            return None, None
+        other_spec, objective, layout, exact = closest
+        if exact:
+            return layout, objective
+        spec = canonical_spec(blocks, connections, grid_size, obstacles)
+        layout = {
+            name: position for name, position in layout.items()
+            if name in spec["blocks"] and other_spec["blocks"].get(name) == spec["blocks"][name]
+            and not any(_overlaps(_footprint(spec["blocks"][name], position), rect) for rect in obstacles or [])
+        }
+        return layout, None
+
+
+def _load_layout(text):
+    return {name: (x, y, bool(is_rotated)) for name, (x, y, is_rotated) in json.loads(text).items()}
@@ -0,0 +1,49 @@
+from main import optimize_factory_layout
+from main_test import test_blocks, test_connections, test_grid_size
+from report import BuildReport
+from store import ResultsStore, spec_hash
+
+
+def test_spec_hash_ignores_order():
+    reordered_blocks = dict(reversed(list(test_blocks.items())))
+    reordered_connections = list(reversed(test_connections))
+    assert spec_hash(test_blocks, test_connections, test_grid_size) == \
+        spec_hash(reordered_blocks, reordered_connections, test_grid_size)
+
+    resized = dict(test_blocks, **{"Red Science": (3, 3)})
+    assert spec_hash(test_blocks, test_connections, test_grid_size) != \
+        spec_hash(resized, test_connections, test_grid_size)
+
+
+def test_warm_start_from_store():
+    store = ResultsStore(":memory:")
+    assert store.warm_start(test_blocks, test_connections, test_grid_size) == (None, None)
+
+    report = BuildReport()
+    _, positions, distance, _ = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, report=report)
+    run_id = store.record_run(test_blocks, test_connections, test_grid_size, {"max_time": 10}, report.to_dict(), positions)
+    assert len(store.progress(run_id)) >= 1
+
+    layout, bound = store.warm_start(test_blocks, test_connections, test_grid_size)
+    assert layout == positions
+    assert bound == distance
+
+    # a warm-started solve can't do worse than the stored layout
+    _, _, warm_distance, _ = optimize_factory_layout(
+        test_blocks, test_connections, test_grid_size, 10, hint_positions=layout, objective_upper_bound=bound)
+    assert warm_distance <= distance
+
+    # one block added: reuse the rest of the layout, but not the bound
+    grown = dict(test_blocks, **{"Lab": (2, 2)})
+    layout, bound = store.warm_start(grown, test_connections, test_grid_size, min_similarity=0.5)
+    assert layout == positions
+    assert bound is None
+
+    # the same spec with a mask: not the same run, so no bound, and the
+    # stored positions the mask now covers are dropped
+    name = next(name for name in positions if name != "Coal Mine")
+    x, y, _ = positions[name]
+    layout, bound = store.warm_start(test_blocks, test_connections, test_grid_size, obstacles=[(x, y, 1, 1)])
+    assert bound is None
+    assert name not in layout and len(layout) == len(positions) - 1
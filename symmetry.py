@@ -0,0 +1,84 @@
+"""Interchangeable blocks, and how to order them so the solver only looks
+at one of every set of layouts that just swap them around."""
+
+from spec import Block, OneOf, block_size, is_fixed
+
+
+def _port_key(pos):
+    return tuple(pos.conns) if isinstance(pos, OneOf) else (pos,)
+
+
+def _signature(name, block_info, index, position_bounds):
+    width, height = block_size(block_info)
+    weight = block_info.weight if isinstance(block_info, Block) else 1
+    ends = []
+    for name1, name2, pos1, pos2, conn_weight in index.connections:
+        if name1 == name:
+            ends.append(("source", _port_key(pos1), name2, _port_key(pos2), conn_weight))
+        if name2 == name:
+            ends.append(("target", _port_key(pos2), name1, _port_key(pos1), conn_weight))
+    bounds = tuple(position_bounds[name]) if position_bounds and name in position_bounds else None
+    return width, height, weight, bounds, tuple(sorted(ends))
+
+
+def symmetry_classes(blocks, index, position_bounds=None):
+    """Groups of two or more movable blocks that can trade places without
+    changing the objective: same size, weight and position bounds, and
+    the same connections (ports, weights and blocks at the other end).
+
+    index is a main.ConnectionIndex for blocks. Classes come back in spec
+    order, as do the names in each.
+    """
+    classes = {}
+    for name, block_info in blocks.items():
+        if is_fixed(block_info):
+            continue
+        classes.setdefault(_signature(name, block_info, index, position_bounds), []).append(name)
+    return [names for names in classes.values() if len(names) > 1]
+
+
+def rotation_symmetric(blocks, index):
+    """Movable blocks that look the same rotated: square, and only ever
+    connected at their middle."""
+    symmetric = []
+    for name, block_info in blocks.items():
+        width, height = block_size(block_info)
+        if is_fixed(block_info) or width != height:
+            continue
+        ports = [pos1 for name1, _, pos1, _, _ in index.connections if name1 == name]
+        ports += [pos2 for _, name2, _, pos2, _ in index.connections if name2 == name]
+        if all(pos == "MM" for pos in ports):
+            symmetric.append(name)
+    return symmetric
+
+
+def position_key(x, y, grid_size):
+    """Orders top left corners by x, then y."""
+    return x * (grid_size[1] + 1) + y
+
+
+def canonical_hints(classes, unrotated, grid_size, hint_positions, hint_ports=None):
+    """hint_positions and hint_ports with the blocks of each class relabeled
+    so their hinted positions are in the order the symmetry constraints
+    require, and the blocks in unrotated not rotated. Returns
+    (hint_positions, hint_ports)."""
+    if not hint_positions:
+        return hint_positions, hint_ports
+    hint_positions = {
+        name: (x, y, False) if name in unrotated else (x, y, is_rotated)
+        for name, (x, y, is_rotated) in hint_positions.items()
+    }
+    renamed = {}
+    for names in classes:
+        hinted = [name for name in names if name in hint_positions]
+        ordered = sorted(hinted, key=lambda name: position_key(*hint_positions[name][:2], grid_size))
+        # the block that was hinted at the ith smallest position becomes the
+        # ith block of the class
+        renamed.update(zip(ordered, hinted))
+    if not renamed:
+        return hint_positions, hint_ports
+    positions = {renamed.get(name, name): position for name, position in hint_positions.items()}
+    ports = None
+    if hint_ports is not None:
+        ports = {(renamed.get(src, src), renamed.get(tgt, tgt)): value for (src, tgt), value in hint_ports.items()}
+    return positions, ports
@@ -0,0 +1,54 @@
+from main import ConnectionIndex, optimize_factory_layout
+from main_test import assert_valid_layout
+from report import BuildReport
+from spec import Block, Connection
+from symmetry import canonical_hints, position_key, rotation_symmetric, symmetry_classes
+
+blocks = {
+    "Iron Mine": Block(1, 1, fixed_x=0, fixed_y=0),
+    "Smelting 1": (6, 3),
+    "Smelting 2": (6, 3),
+    "Smelting 3": (6, 3),
+    "Gears": (4, 4),
+    "Chest": (2, 2),
+}
+connections = [
+    ("Iron Mine", "Smelting 1", "MM", "LM"),
+    ("Iron Mine", "Smelting 2", "MM", "LM"),
+    ("Iron Mine", "Smelting 3", "MM", "LM"),
+    ("Smelting 1", "Gears", "RM", "TM"),
+    ("Smelting 2", "Gears", "RM", "TM"),
+    # heavier, so it's not interchangeable with the other two
+    Connection("Smelting 3", "Gears", "RM", "TM", 2),
+    ("Gears", "Chest", "BM", "MM"),
+]
+grid_size = (16, 16)
+
+
+def test_symmetry_classes():
+    index = ConnectionIndex(blocks, connections)
+    assert symmetry_classes(blocks, index) == [["Smelting 1", "Smelting 2"]]
+    # blocks held to different windows can't swap
+    assert symmetry_classes(blocks, index, {"Smelting 1": (0, 4, 0, 4)}) == []
+    assert rotation_symmetric(blocks, index) == ["Chest"]
+
+
+def test_canonical_hints():
+    hints = {"Smelting 1": (8, 0, False), "Smelting 2": (0, 4, True), "Chest": (3, 3, True)}
+    ports = {("Smelting 1", "Gears"): ("RM", "TM"), ("Smelting 2", "Gears"): ("LM", "TM")}
+    positions, ports = canonical_hints([["Smelting 1", "Smelting 2"]], ["Chest"], grid_size, hints, ports)
+    assert positions == {"Smelting 1": (0, 4, True), "Smelting 2": (8, 0, False), "Chest": (3, 3, False)}
+    assert ports == {("Smelting 2", "Gears"): ("RM", "TM"), ("Smelting 1", "Gears"): ("LM", "TM")}
+
+
+def test_symmetry_breaking():
+    # hinted the wrong way round; the hints get relabeled to fit
+    hints = {"Smelting 1": (8, 0, False), "Smelting 2": (0, 4, False)}
+    report = BuildReport()
+    _, positions, _, _ = optimize_factory_layout(blocks, connections, grid_size, 10, report=report,
+                                                 hint_positions=hints, num_workers=1)
+    assert report.to_dict()["symmetry"] == {"classes": 1, "blocks": 2, "unrotated": 1}
+    assert report.to_dict()["hint"]["completed"]
+    assert_valid_layout(blocks, positions, grid_size)
+    assert position_key(*positions["Smelting 1"][:2], grid_size) < position_key(*positions["Smelting 2"][:2], grid_size)
+    assert not positions["Chest"][2]